@@ -0,0 +1,72 @@
+###
+# Opt-in ASGI serving mode, for servers such as uvicorn. Every request is served by the
+# connexion (WSGI) app, so that the ASGI mode goes through the same spec validation,
+# authentication, unit of work and event writer as the WSGI server and only the server in
+# front of the app changes.
+#
+# asgiref's WsgiToAsgi runs the WSGI app with a thread sensitive sync_to_async, i.e. every
+# request on the same thread. The requests are instead run on a pool of ASGI_THREADS
+# threads, like the worker threads of waitress, so that they are served concurrently.
+###
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+ASGI_THREADS = 8
+
+# The WSGI app runner of asgiref, without its sync_to_async wrapper
+_run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+
+class AsgiApp:
+    """
+    ASGI application serving every request with the WSGI app.
+
+    Usage
+    ```
+    application = AsgiApp(connexion_app)
+    ```
+    """
+
+    def __init__(self, wsgi_app, threads: int = ASGI_THREADS):
+        """
+        :param wsgi_app: WSGI application serving the requests
+        :param threads: Number of requests served concurrently
+        """
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="qtime-asgi"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await _lifespan(receive, send)
+            self.executor.shutdown(wait=False)
+            return
+        await _PooledWsgiInstance(self.wsgi_app, self.executor)(scope, receive, send)
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    """asgiref's handler of a request, running the WSGI app on a thread pool"""
+
+    def __init__(self, wsgi_app, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_app)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(
+            _run_wsgi_app, thread_sensitive=False, executor=self.executor
+        )(self, body)
+
+
+async def _lifespan(receive, send):
+    # The background services are started by the entry point before the server starts
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
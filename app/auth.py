@@ -1,11 +1,12 @@
 from firebase_admin import auth
-from firebase_admin._user_mgt import UserRecord
 from werkzeug.exceptions import Unauthorized
 from typing import Dict, Any
 from functools import wraps
 
 from app.user.user import User
 from app.user.service import find_user
+from app.user.cache import user_cache
+from app.token_cache import id_token_cache
 from app.user.errors import UserNotFoundError
 
 
@@ -29,8 +30,7 @@ def with_auth_user(func):
     @wraps(func)
     def wrapper(*args, token_info: Dict[str, Any], **kwargs):
         try:
-            firebase_user_record: UserRecord = auth.get_user(token_info["uid"])
-            user: User = find_user(firebase_user_record.email)
+            user: User = _find_auth_user(token_info)
             kwargs["user"] = user
             kwargs["token_info"] = token_info
         except ValueError as e:
@@ -47,9 +47,31 @@ def with_auth_user(func):
     return wrapper
 
 
+def _find_auth_user(token_info: Dict[str, Any]) -> User:
+    """
+    Find the user of a decoded token through the user cache. Firebase Auth is asked for
+    the user of the uid, which checks that it still exists, at most once per uid within
+    the TTL of the user cache. A user deleted from Firebase Auth is rejected once
+    that check is due again, a user whose account was deleted is rejected right away as
+    its document is gone.
+
+    :param token_info: Claims of the token
+    :raises ValueError: If the uid is invalid
+    :raises auth.UserNotFoundError: If the user does not exist in Firebase Auth
+    :raises UserNotFoundError: If the user does not exist in the database
+    """
+    uid = token_info["uid"]
+    email = user_cache().email_of(uid)
+    if not email:
+        email = auth.get_user(uid).email
+        user_cache().remember_email(uid, email)
+    return find_user(email)
+
+
 def validate_token(token: str) -> Dict[str, Any]:
     """
-    Validate and decode a JWT token using Firebase
+    Validate and decode a JWT token using Firebase. Tokens verified before are served
+    from the ID token cache until they expire.
 
     :param token: JWT token passed as a Bearer token in the Authorization header
     :return: Dictionary of value pairs from the decoded JWT
@@ -57,8 +79,12 @@ def validate_token(token: str) -> Dict[str, Any]:
     :raises Unauthorized: If the token is invalid, expired, revoked, or the certificate cannot be fetched
     :raises ValueError: If the token is not a string or empty
     """
+    # Malformed tokens are left to verify_id_token to reject
+    claims = id_token_cache().get(token) if isinstance(token, str) else None
+    if claims is not None:
+        return claims
     try:
-        return auth.verify_id_token(token)
+        claims = auth.verify_id_token(token)
     except (
         auth.InvalidIdTokenError,
         auth.ExpiredIdTokenError,
@@ -66,3 +92,5 @@ def validate_token(token: str) -> Dict[str, Any]:
         auth.CertificateFetchError,
     ) as e:
         raise Unauthorized(f"Invalid token. {str(e)}") from e
+    id_token_cache().put(token, claims)
+    return claims
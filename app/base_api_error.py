@@ -14,3 +14,13 @@ class BaseApiError(Exception):
 class MissingQueryParameterError(BaseApiError):
     def __init__(self, parameter_name):
         super().__init__(f"Missing query parameter: {parameter_name}", 400)
+
+
+class UpstreamTimeoutError(BaseApiError):
+    def __init__(self, message):
+        super().__init__(f"Upstream request timed out: {message}", 504)
+
+
+class InvalidCursorError(BaseApiError):
+    def __init__(self, message):
+        super().__init__(f"Invalid cursor: {message}", 400)
@@ -0,0 +1,120 @@
+###
+# Bounded thread pool used to run independent blocking calls (mostly Firestore reads)
+# concurrently so that the latency of a request is the slowest call instead of the sum.
+#
+# A timeout is a single deadline for every call of a run_concurrently, so that it bounds the
+# time the request waits. Python threads cannot be interrupted: a call that already started
+# when the deadline passes keeps its pool worker until it returns. Those calls are counted
+# in stats() so that a pool held up by a slow upstream shows.
+###
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from app.base_api_error import UpstreamTimeoutError
+
+MAX_WORKERS = 16
+DEFAULT_TIMEOUT_SECONDS = 10.0
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="qtime-io")
+_worker_state = threading.local()
+_stats_lock = threading.Lock()
+_timeouts = 0
+_abandoned = 0
+_abandoned_running = 0
+
+logger = logging.getLogger(__name__)
+
+
+def run_concurrently(
+    *calls: Callable[[], Any], timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS
+) -> List[Any]:
+    """
+    Run independent calls concurrently on the shared bounded thread pool.
+
+    Usage
+    ```
+    poi, histogram = run_concurrently(
+        lambda: get_details_for_POI(poi_id),
+        lambda: histogram_for_POI(poi_id),
+    )
+    ```
+
+    If a call raises, the exception of the first failing call (in argument order) is
+    re-raised unchanged so that API errors such as POINotFoundError keep their status code.
+    Calls made from inside a pool worker run inline to avoid exhausting the pool.
+
+    :param calls: Functions without arguments to call
+    :param timeout: Deadline in seconds for all the calls to finish, shared by the calls
+        and counted from their submission, None to wait without limit (Optional)
+    :return: The results of the calls in argument order
+    :raises UpstreamTimeoutError: If the calls do not all finish before the deadline. The
+        calls that have not started yet are cancelled, the calls already running are left
+        to finish in the background
+    """
+    if len(calls) <= 1 or getattr(_worker_state, "active", False):
+        return [call() for call in calls]
+
+    futures = [_executor.submit(_run_in_worker, call) for call in calls]
+    # Wait for every call so that the first error in argument order is raised
+    _, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        _abandon(not_done)
+        raise UpstreamTimeoutError(
+            f"{len(not_done)} of {len(futures)} calls did not complete within "
+            f"{timeout} seconds"
+        )
+
+    for future in futures:
+        error = future.exception()
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
+
+
+def stats() -> Dict[str, Any]:
+    """Counters describing the state of the shared thread pool"""
+    with _stats_lock:
+        return {
+            "max_workers": MAX_WORKERS,
+            "timeouts": _timeouts,
+            "abandoned": _abandoned,
+            "abandoned_running": _abandoned_running,
+        }
+
+
+def _abandon(futures):
+    """
+    Cancel the calls of a run_concurrently that timed out. The calls that already started
+    cannot be cancelled, they are counted as running until they return.
+    """
+    global _timeouts, _abandoned, _abandoned_running
+    running = [future for future in futures if not future.cancel()]
+    with _stats_lock:
+        _timeouts += 1
+        _abandoned += len(running)
+        _abandoned_running += len(running)
+        holding = _abandoned_running
+    if running:
+        logger.warning(
+            f"{len(running)} calls are still running after their deadline, "
+            f"{holding} abandoned calls hold workers of the pool"
+        )
+    for future in running:
+        future.add_done_callback(_abandoned_call_done)
+
+
+def _abandoned_call_done(future: Future):
+    global _abandoned_running
+    with _stats_lock:
+        _abandoned_running -= 1
+
+
+def _run_in_worker(call: Callable[[], Any]) -> Any:
+    _worker_state.active = True
+    try:
+        return call()
+    finally:
+        _worker_state.active = False
@@ -0,0 +1,45 @@
+###
+# Opaque cursors used for keyset pagination. A cursor holds the sort key of the last item
+# of a page, the next page starts right after it.
+###
+
+import base64
+import binascii
+import json
+from typing import Any, List
+
+from app.base_api_error import InvalidCursorError
+
+# Response header holding the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(kind: str, key: List[Any]) -> str:
+    """
+    Encode the sort key of the last item of a page into an opaque cursor.
+
+    :param kind: Name of the ordering the key belongs to (e.g. "distance")
+    :param key: JSON serializable sort key of the item
+    :return: URL safe cursor
+    """
+    payload = json.dumps([kind, *key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> List[Any]:
+    """
+    Decode a cursor made by encode_cursor.
+
+    :param cursor: Cursor received from the client
+    :param kind: Name of the ordering the cursor is expected to belong to
+    :return: The sort key in the cursor
+    :raises InvalidCursorError: If the cursor is malformed or belongs to another ordering
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursorError(str(e)) from e
+    if not isinstance(payload, list) or not payload or payload[0] != kind:
+        raise InvalidCursorError(f"Cursor does not belong to the {kind} ordering")
+    return payload[1:]
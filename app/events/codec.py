@@ -0,0 +1,132 @@
+###
+# Compact binary encoding of events, used to spool and export events. An event is encoded
+# as a msgpack array [type code, user, payload fields, created] instead of the map of the
+# Firestore document, with the payload fields in a fixed order given by a dispatch table.
+###
+
+import io
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List
+
+import msgpack
+
+from .event import (
+    Event,
+    EventType,
+    WaitTimeSubmitPayload,
+    WaitTimeConfirmPayload,
+    RewardPointsAddPayload,
+    RewardSource,
+)
+
+# Codes are part of the encoding, never reuse or renumber them
+_TYPE_CODES: Dict[EventType, int] = {
+    EventType.ACCOUNT_SIGNUP: 0,
+    EventType.ACCOUNT_DELETION: 1,
+    EventType.WAITTIME_SUBMIT: 2,
+    EventType.WAITTIME_CONFIRM: 3,
+    EventType.REWARD_POINTS_ADD: 4,
+    EventType.REWARD_REDEMPTION: 5,
+}
+_SOURCE_CODES: Dict[RewardSource, int] = {
+    RewardSource.REFERRAL_BONUS: 0,
+    RewardSource.REFERRED_BONUS: 1,
+    RewardSource.WAITTIME_CONFIRM: 2,
+    RewardSource.WAITTIME_SUBMIT: 3,
+}
+_SOURCES_BY_CODE: List[RewardSource] = sorted(
+    _SOURCE_CODES, key=lambda s: _SOURCE_CODES[s]
+)
+
+# Encoder of the payload fields of each event type with a payload
+_PAYLOAD_ENCODERS: Dict[EventType, Callable[[Any], List[Any]]] = {
+    EventType.WAITTIME_SUBMIT: lambda p: [p.estimate_submitted, p.poi_id],
+    EventType.WAITTIME_CONFIRM: lambda p: [p.poi_id],
+    EventType.REWARD_POINTS_ADD: lambda p: [
+        _SOURCE_CODES[p.source],
+        p.points_change,
+    ],
+}
+
+
+def _decoder(event_type: EventType, decode_payload: Callable[[List[Any]], Any]):
+    return lambda f: Event(
+        event_type, f[1], decode_payload(f[2]) if f[2] is not None else None, f[3]
+    )
+
+
+# Decoder of the whole event for each type code
+_DECODERS: List[Callable[[List[Any]], Event]] = [
+    _decoder(EventType.ACCOUNT_SIGNUP, lambda _: None),
+    _decoder(EventType.ACCOUNT_DELETION, lambda _: None),
+    _decoder(EventType.WAITTIME_SUBMIT, lambda p: WaitTimeSubmitPayload(p[0], p[1])),
+    _decoder(EventType.WAITTIME_CONFIRM, lambda p: WaitTimeConfirmPayload(p[0])),
+    _decoder(
+        EventType.REWARD_POINTS_ADD,
+        lambda p: RewardPointsAddPayload(_SOURCES_BY_CODE[p[0]], p[1]),
+    ),
+    _decoder(EventType.REWARD_REDEMPTION, lambda _: None),
+]
+
+
+def encode_event(event: Event) -> List[Any]:
+    """
+    Encode an event into a msgpack serializable array. Naive datetimes are taken as UTC.
+
+    :param event: Event to encode
+    :return: The fields of the event
+    :raises ValueError: If the event was created with a server timestamp
+    """
+    if not isinstance(event.created, datetime):
+        raise ValueError("Cannot encode an event without a creation datetime")
+    created = event.created
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    encode_payload = _PAYLOAD_ENCODERS.get(event.type)
+    return [
+        _TYPE_CODES[event.type],
+        event.user,
+        (
+            encode_payload(event.payload)
+            if encode_payload and event.payload is not None
+            else None
+        ),
+        created,
+    ]
+
+
+def decode_event(fields: List[Any]) -> Event:
+    """
+    Decode an event encoded by encode_event.
+
+    :param fields: The fields of the event
+    :return: The event, created is a UTC datetime
+    """
+    return _DECODERS[fields[0]](fields)
+
+
+def pack_event(event: Event) -> bytes:
+    """Serialize an event to msgpack"""
+    return msgpack.packb(encode_event(event), datetime=True)
+
+
+def unpack_event(data: bytes) -> Event:
+    """Deserialize an event serialized by pack_event"""
+    return decode_event(msgpack.unpackb(data, timestamp=3))
+
+
+def pack_events(events: Iterable[Event]) -> bytes:
+    """
+    Serialize events to a stream of msgpack arrays that can be appended to, e.g. for
+    exports.
+    """
+    packer = msgpack.Packer(datetime=True)
+    return b"".join(packer.pack(encode_event(event)) for event in events)
+
+
+def unpack_events(data: bytes) -> List[Event]:
+    """Deserialize events serialized by pack_events"""
+    return [
+        decode_event(fields)
+        for fields in msgpack.Unpacker(io.BytesIO(data), timestamp=3)
+    ]
@@ -1,6 +1,6 @@
 from enum import Enum
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional, Tuple
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 
 from app.common import SimpleMap
@@ -37,6 +37,10 @@ class WaitTimeSubmitPayload(SimpleMap):
         self.estimate_submitted = estimate_submitted
         self.poi_id = poi_id
 
+    @staticmethod
+    def from_dict(dict: Dict[str, Any]) -> "WaitTimeSubmitPayload":
+        return WaitTimeSubmitPayload(dict["estimate_submitted"], dict["poi_id"])
+
 
 class WaitTimeConfirmPayload(SimpleMap):
     """Payload for the wait time confirmation event"""
@@ -47,6 +51,10 @@ class WaitTimeConfirmPayload(SimpleMap):
         """
         self.poi_id = poi_id
 
+    @staticmethod
+    def from_dict(dict: Dict[str, Any]) -> "WaitTimeConfirmPayload":
+        return WaitTimeConfirmPayload(dict["poi_id"])
+
 
 class RewardPointsAddPayload:
     def __init__(self, source: RewardSource, points_change: int):
@@ -84,26 +92,52 @@ class RewardRedemptionPayload:
     pass
 
 
+# Decoder of the payload of each event type, events without a payload are missing
+_PAYLOAD_DECODERS: Dict[EventType, Callable[[Dict[str, Any]], Any]] = {
+    EventType.WAITTIME_SUBMIT: WaitTimeSubmitPayload.from_dict,
+    EventType.WAITTIME_CONFIRM: WaitTimeConfirmPayload.from_dict,
+    EventType.REWARD_POINTS_ADD: RewardPointsAddPayload.from_dict,
+}
+
+
 class Event:
+    """
+    Tracking Event used for logging of user actions in the app. Events are immutable.
+    """
+
+    __slots__ = ("type", "user", "payload", "created", "_key")
+    type: EventType
+    user: str
+    payload: Any
+    created: Any
+    _key: Optional[Tuple[Any, ...]]
+
     def __init__(
         self,
         type: EventType,
         user: str,
         payload: Any = None,
-        created: datetime = datetime.now(timezone.utc),
+        created: Any = None,
     ):
         """
-        Tracking Event used for logging of user actions in the app.
-
         :param type: Event type
         :param user: The id of the user that caused the event
         :param payload: Additional data associated with the event
-        :param created: Datetime event was created
+        :param created: Datetime event was created, or a Firestore server timestamp.
+            Defaults to now
         """
-        self.type = type
-        self.user = user
-        self.payload = payload
-        self.created = created
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "user", user)
+        object.__setattr__(self, "payload", payload)
+        object.__setattr__(
+            self,
+            "created",
+            created if created is not None else datetime.now(timezone.utc),
+        )
+        object.__setattr__(self, "_key", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Event is immutable, cannot set {name}")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -117,28 +151,37 @@ class Event:
     def from_dict(dict: Dict[str, Any]) -> "Event":
         """Parse a dict into an Event object"""
         event_type = EventType(dict["type"])
+        decode_payload = _PAYLOAD_DECODERS.get(event_type)
+        created = dict["created"]
+        if type(created) is DatetimeWithNanoseconds:
+            created = datetime.fromtimestamp(created.timestamp())
+
+        return Event(
+            event_type,
+            dict["user"],
+            decode_payload(dict["payload"]) if decode_payload else None,
+            created,
+        )
 
-        if event_type == EventType.WAITTIME_SUBMIT:
-            payload = WaitTimeSubmitPayload.from_dict(dict["payload"])
-        elif event_type == EventType.WAITTIME_CONFIRM:
-            payload = WaitTimeConfirmPayload.from_dict(dict["payload"])
-        elif event_type == EventType.REWARD_POINTS_ADD:
-            payload = RewardPointsAddPayload.from_dict(dict["payload"])
-        else:  # (EventType.ACCOUNT_SIGNUP, EventType.ACCOUNT_DELETION)
-            payload = None
-
-        if type(dict["created"]) == DatetimeWithNanoseconds:
-            created = datetime.fromtimestamp(dict["created"].timestamp())
-        else:
-            created = dict["created"]
-
-        return Event(event_type, dict["user"], payload, created)
+    def _identity(self) -> Tuple[Any, ...]:
+        """Fields compared by __eq__ and __hash__, computed once as events are immutable"""
+        key = self._key
+        if key is None:
+            payload = self.payload.to_dict() if self.payload is not None else None
+            key = (
+                self.type,
+                self.user,
+                tuple(sorted(payload.items())) if payload is not None else None,
+                self.created,
+            )
+            object.__setattr__(self, "_key", key)
+        return key
 
     def __eq__(self, other: object) -> bool:
-        return isinstance(other, Event) and self.to_dict() == other.to_dict()
+        return isinstance(other, Event) and self._identity() == other._identity()
 
     def __hash__(self):
-        return hash((self.type, self.user, self.payload, self.created))
+        return hash(self._identity())
 
     def __repr__(self):
         return f"Event(type={self.type}, user={self.user}, payload={self.payload}, created={self.created})"
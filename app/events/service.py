@@ -1,8 +1,16 @@
-from typing import Iterator, Optional
+import uuid
+from typing import List, Optional, Tuple
 from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from datetime import datetime, timezone
 
+from app.base_api_error import InvalidCursorError
+from app.cursor import encode_cursor, decode_cursor
 from app.firebase import firestore_db, EVENTS_COLLECTION
+from app.unit_of_work import add_document, set_document
+from app.rewards.ledger import record_reward
+from .writer import event_writer
+from .spool import event_spool
 from app.user.user import User
 from .event import (
     Event,
@@ -15,6 +23,9 @@ from .event import (
 from app.locations.poi import POI
 
 
+REWARD_EVENTS_ORDERING = "reward_events"
+
+
 def generate_account_signup_event(user: User):
     """
     Generate an event for when a user signs up for the first time.
@@ -101,15 +112,19 @@ def generate_referral_event(
 def find_all_reward_events_for_user(
     user_email: str,
     limit: int,
+    cursor: Optional[str] = None,
     before_datetime: Optional[datetime] = None,
-) -> Iterator[Event]:
+) -> Tuple[List[Event], Optional[str]]:
     """
-    Find all reward events for a user. Reward events are returned in reverse chronological order.
+    Find a page of reward events for a user. Reward events are returned in reverse chronological order,
+    events created at the same time are ordered by document ID.
 
     :param user_email: Email of user to find reward events for
     :param limit: Maximum number of reward events to return
-    :param before_datetime: Datetime to start searching for reward events before
-    :return: List of reward events for the user
+    :param cursor: Cursor of the page to return, as returned with the previous page (Optional)
+    :param before_datetime: Datetime to start searching for reward events before, ignored with a cursor (Optional)
+    :return: The page of reward events and the cursor of the next page, or None if it is the last page
+    :raises InvalidCursorError: If the cursor is malformed
     """
     query = (
         firestore_db()
@@ -117,41 +132,95 @@ def find_all_reward_events_for_user(
         .where("user", "==", user_email)
         .where("type", "==", EventType.REWARD_POINTS_ADD.value)
         .order_by("created", direction=firestore.Query.DESCENDING)
+        .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
     )
 
-    if before_datetime:
+    if cursor:
+        created, event_id = _reward_events_cursor_key(cursor)
+        query = query.start_after({"created": created, "__name__": event_id})
+    elif before_datetime:
         query = query.start_after({"created": before_datetime.astimezone(timezone.utc)})
 
-    return map(
-        lambda d: Event.from_dict(d.to_dict()),
-        query.limit(limit).stream(),
+    # One more event tells whether there is a next page
+    snapshots = list(query.limit(limit + 1).stream())
+    events = [Event.from_dict(snapshot.to_dict()) for snapshot in snapshots[:limit]]
+    if len(snapshots) <= limit:
+        return events, None
+    # Event.from_dict rounds the creation datetime, the cursor needs the stored one
+    last = snapshots[limit - 1]
+    return events, reward_events_cursor(last.get("created"), last.id)
+
+
+def reward_events_cursor(created: datetime, event_id: str) -> str:
+    """
+    Cursor of the page of reward events following an event
+
+    :param created: Creation datetime of the last event of the page
+    :param event_id: Document ID of the last event of the page
+    """
+    return encode_cursor(
+        REWARD_EVENTS_ORDERING,
+        [created.astimezone(timezone.utc).isoformat(), event_id],
     )
 
 
+def _reward_events_cursor_key(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode the (created, document ID) key of a reward events cursor.
+
+    :raises InvalidCursorError: If the cursor is malformed
+    """
+    key = decode_cursor(cursor, REWARD_EVENTS_ORDERING)
+    try:
+        created, event_id = key
+        return datetime.fromisoformat(created), str(event_id)
+    except (TypeError, ValueError):
+        raise InvalidCursorError("Malformed reward events cursor")
+
+
 def _generate_reward_point_change_event(
     email: str, source: RewardSource, points_change: int
 ):
     """
-    Generate a general point change event.
+    Generate a general point change event and add the change to the reward ledger of the
+    user. The ID and creation datetime of the event are set here so that the ledger entry
+    matches the event, see reward_events_cursor.
 
     :param email: Email of the user who's points are being added
     :param source: Source of the reward points being added
     :param points_change: Number of points being added or subtracted
     """
-    _save_to_events_collection(
-        Event(
-            EventType.REWARD_POINTS_ADD,
-            email,
-            payload=RewardPointsAddPayload(source, points_change),
-            created=firestore.SERVER_TIMESTAMP,
-        )
+    event = Event(
+        EventType.REWARD_POINTS_ADD,
+        email,
+        payload=RewardPointsAddPayload(source, points_change),
     )
+    event_id = new_event_id()
+    _save_to_events_collection(event, event_id)
+    record_reward(email, source, points_change, event.created, event_id)
+
 
+def new_event_id() -> str:
+    """Generate the document ID of an event"""
+    return uuid.uuid4().hex
 
-def _save_to_events_collection(event: Event):
+
+def _save_to_events_collection(event: Event, event_id: Optional[str] = None):
     """
-    Save an event to the events collection in Firestore.
+    Save an event to the events collection in Firestore. The event is written in the
+    background if the event spool or the event writer is running.
 
     :param event: Event to save
-    """
-    firestore_db().collection(EVENTS_COLLECTION).add(event.to_dict())
+    :param event_id: ID of the event document, generated when not specified
+    """
+    if event_spool().is_running():
+        event_spool().write(event, event_id)
+        return
+    if event_writer().is_running():
+        event_writer().write(event.to_dict(), event_id)
+        return
+    events = firestore_db().collection(EVENTS_COLLECTION)
+    if event_id is None:
+        add_document(events, event.to_dict())
+    else:
+        set_document(events.document(event_id), event.to_dict())
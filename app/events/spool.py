@@ -0,0 +1,313 @@
+###
+# Crash safe local spool (outbox) for events. Events are appended to a local segment log
+# and shipped to Firestore in the background, so a request only waits for a local append
+# and events survive restarts and Firestore outages.
+#
+# Records are msgpack encoded [id, event] arrays, with the event in the compact encoding
+# of app.events.codec, appended to segment files named after their sequence number.
+# Appends are flushed to the OS right away, which survives a crash of the process, and
+# fsynced in batches every SPOOL_FSYNC_INTERVAL_SECONDS. Sealed segments are replayed with
+# the record id as the document id, so a segment replayed again after a crash overwrites
+# the same documents, and deleted once acknowledged. A segment that cannot be read or
+# that Firestore rejects is renamed with QUARANTINE_SUFFIX and left for inspection, so
+# that it does not hold back the segments after it.
+###
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+import msgpack
+from google.api_core.exceptions import InvalidArgument
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+from app.firebase import firestore_db, EVENTS_COLLECTION
+from app.unit_of_work import after_commit, MAX_BATCH_WRITES
+from .codec import encode_event, decode_event
+from .event import Event
+
+SPOOL_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+SPOOL_FSYNC_INTERVAL_SECONDS = 0.1
+SPOOL_REPLAY_INTERVAL_SECONDS = 1.0
+SEGMENT_SUFFIX = ".seg"
+QUARANTINE_SUFFIX = ".bad"
+
+logger = logging.getLogger(__name__)
+
+
+class EventSpool:
+    def __init__(
+        self,
+        segment_max_bytes: int = SPOOL_SEGMENT_MAX_BYTES,
+        fsync_interval_seconds: float = SPOOL_FSYNC_INTERVAL_SECONDS,
+        replay_interval_seconds: float = SPOOL_REPLAY_INTERVAL_SECONDS,
+    ):
+        """
+        :param segment_max_bytes: Size after which the active segment is sealed
+        :param fsync_interval_seconds: Maximum time an append waits to be fsynced
+        :param replay_interval_seconds: Maximum time an event waits to be shipped when
+            Firestore is reachable
+        """
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.replay_interval_seconds = replay_interval_seconds
+        self.directory: Optional[str] = None
+        self.appended = 0
+        self.replayed = 0
+        self.replay_failures = 0
+        self.quarantined = 0
+        self.fsyncs = 0
+        self.last_replay_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._segment: Optional[IO[bytes]] = None
+        self._segment_seq = 0
+        self._unsynced = False
+
+    def start(self, directory: str):
+        """
+        Open a new segment in the directory and start shipping the segments to Firestore,
+        including the segments left by a previous process.
+
+        :param directory: Directory holding the segments
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(directory, exist_ok=True)
+            self.directory = directory
+            segments = self._segments()
+            self._open_segment(segments[-1][0] + 1 if segments else 1)
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="qtime-event-spool", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the replayer, seal the active segment and make a last attempt to ship it.
+        Segments that could not be shipped are replayed by the next process.
+
+        :param timeout: Maximum time in seconds to wait for the replayer (Optional)
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        with self._lock:
+            sealed = self._seal_segment()
+        self._close_segment(sealed)
+        self.replay()
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def write(self, event: Event, record_id: Optional[str] = None):
+        """
+        Append an event to the spool. Inside a unit of work the event is only appended
+        once the unit of work is committed.
+
+        :param event: Event to append
+        :param record_id: ID of the event document, generated when not specified
+        """
+        after_commit(lambda: self.append(event, record_id))
+
+    def append(self, event: Event, record_id: Optional[str] = None) -> str:
+        """
+        Append an event to the active segment.
+
+        :param event: Event to append. A server timestamp is replaced with the time of the
+            append as the event may be shipped much later
+        :param record_id: ID of the event document, generated when not specified
+        :return: ID of the event document
+        """
+        record_id = record_id or uuid.uuid4().hex
+        if event.created is SERVER_TIMESTAMP:
+            event = Event(event.type, event.user, event.payload)
+        record = msgpack.packb([record_id, encode_event(event)], datetime=True)
+        sealed = None
+        with self._lock:
+            spooled = self._segment is not None
+            if self._segment is not None:
+                self._segment.write(record)
+                self._segment.flush()
+                self._unsynced = True
+                self.appended += 1
+                if self._segment.tell() >= self.segment_max_bytes:
+                    sealed = self._seal_segment()
+                    self._open_segment(self._segment_seq + 1)
+        self._close_segment(sealed)
+        if not spooled:
+            # The spool was stopped while the event was produced
+            _events_collection().document(record_id).set(event.to_dict())
+        return record_id
+
+    def replay(self) -> int:
+        """
+        Ship the sealed segments to Firestore, oldest first, and delete them once they are
+        acknowledged. A segment that cannot be read or that Firestore rejects is
+        quarantined and the replay moves on to the next segment. Any other failure, such
+        as Firestore being unreachable, stops the replay and the segment is retried on
+        the next run.
+
+        :return: Number of events shipped
+        """
+        start = time.monotonic()
+        shipped = 0
+        for seq, path in self._segments():
+            if seq == self._segment_seq and self._segment is not None:
+                break
+            try:
+                records = _read_segment(path)
+            except Exception:
+                logger.exception(f"Failed to read the event segment {path}")
+                self._quarantine(path)
+                continue
+            try:
+                for i in range(0, len(records), MAX_BATCH_WRITES):
+                    batch = firestore_db().batch()
+                    for record_id, event in records[i : i + MAX_BATCH_WRITES]:
+                        batch.set(_events_collection().document(record_id), event)
+                    batch.commit()
+                os.remove(path)
+            except InvalidArgument:
+                logger.exception(f"Firestore rejected the event segment {path}")
+                self._quarantine(path)
+                continue
+            except Exception:
+                logger.exception(f"Failed to replay the event segment {path}")
+                self.replay_failures += 1
+                break
+            shipped += len(records)
+        self.replayed += shipped
+        self.last_replay_seconds = time.monotonic() - start
+        return shipped
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the spool"""
+        segments = self._segments() if self.directory else []
+        return {
+            "running": self.is_running(),
+            "segments": len(segments),
+            "spooled_bytes": sum(os.path.getsize(path) for _, path in segments),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "replay_failures": self.replay_failures,
+            "quarantined": self.quarantined,
+            "fsyncs": self.fsyncs,
+            "last_replay_seconds": self.last_replay_seconds,
+        }
+
+    def _run(self):
+        next_replay = time.monotonic()
+        while not self._stopping.wait(self.fsync_interval_seconds):
+            sealed = None
+            with self._lock:
+                if (
+                    time.monotonic() >= next_replay
+                    and self._segment is not None
+                    and self._segment.tell() > 0
+                ):
+                    sealed = self._seal_segment()
+                    self._open_segment(self._segment_seq + 1)
+                unsynced = self._unsynced_fd()
+            # Fsync without the lock, so that appends do not wait for the disk
+            self._close_segment(sealed)
+            if unsynced is not None:
+                try:
+                    self._fsync(unsynced)
+                finally:
+                    os.close(unsynced)
+            if time.monotonic() >= next_replay:
+                self.replay()
+                next_replay = time.monotonic() + self.replay_interval_seconds
+
+    def _unsynced_fd(self) -> Optional[int]:
+        """
+        Duplicate of the file descriptor of the active segment when it has appends that
+        are not fsynced yet, which stays valid if the segment is sealed meanwhile. Must be
+        called with the lock held, the caller closes the descriptor.
+        """
+        if self._segment is None or not self._unsynced:
+            return None
+        self._unsynced = False
+        return os.dup(self._segment.fileno())
+
+    def _fsync(self, fd: int):
+        os.fsync(fd)
+        with self._lock:
+            self.fsyncs += 1
+
+    def _seal_segment(self) -> Optional[IO[bytes]]:
+        """
+        Detach the active segment, to be closed with _close_segment once the lock is
+        released. Must be called with the lock held.
+        """
+        segment, self._segment = self._segment, None
+        self._unsynced = False
+        return segment
+
+    def _close_segment(self, segment: Optional[IO[bytes]]):
+        """Fsync and close a sealed segment. Must be called without the lock held."""
+        if segment is not None:
+            try:
+                self._fsync(segment.fileno())
+            finally:
+                segment.close()
+
+    def _quarantine(self, path: str):
+        """Set a segment aside so that it is not replayed again"""
+        os.replace(path, path + QUARANTINE_SUFFIX)
+        self.quarantined += 1
+
+    def _open_segment(self, seq: int):
+        """Must be called with the lock held."""
+        self._segment_seq = seq
+        self._segment = open(self._segment_path(seq), "ab")
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory or "", f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """Sequence number and path of every segment, oldest first"""
+        seqs = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory or "")
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        return [(seq, self._segment_path(seq)) for seq in seqs]
+
+
+def _read_segment(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Read the records of a segment. A record torn by a crash in the middle of an append
+    ends the segment.
+    """
+    records = []
+    with open(path, "rb") as segment:
+        unpacker = msgpack.Unpacker(segment, timestamp=3)
+        try:
+            for record in unpacker:
+                records.append((record[0], decode_event(record[1]).to_dict()))
+        except (ValueError, msgpack.UnpackException):
+            logger.warning(f"Ignoring the torn end of the event segment {path}")
+    return records
+
+
+_spool = EventSpool()
+
+
+def event_spool() -> EventSpool:
+    """Process-wide event spool"""
+    return _spool
+
+
+def _events_collection():
+    return firestore_db().collection(EVENTS_COLLECTION)
@@ -0,0 +1,233 @@
+###
+# Background writer for the events collection. Events are append-only, nothing reads them
+# back while handling a request, so the request thread only puts them in a bounded queue
+# and a flusher thread commits them to Firestore in batches.
+#
+# Every queued event gets its document ID when it is queued, so a batch whose commit failed
+# is retried with backoff: a retry sets the same documents and never duplicates an event,
+# even if the failed commit was applied.
+#
+# The writer is started with the background services. When it is not running (e.g. in
+# tests or scripts) the events service writes events synchronously.
+###
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.firebase import firestore_db, EVENTS_COLLECTION
+from app.unit_of_work import after_commit, MAX_BATCH_WRITES
+
+EVENT_BATCH_SIZE = MAX_BATCH_WRITES
+EVENT_FLUSH_INTERVAL_SECONDS = 1.0
+EVENT_QUEUE_SIZE = 10_000
+# Commits of a batch tried before its events are counted as failed
+EVENT_WRITE_ATTEMPTS = 5
+# Wait before the first retry of a batch, doubled after every failed retry
+EVENT_RETRY_BACKOFF_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class EventWriter:
+    def __init__(
+        self,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_interval_seconds: float = EVENT_FLUSH_INTERVAL_SECONDS,
+        max_queue_size: int = EVENT_QUEUE_SIZE,
+        write_attempts: int = EVENT_WRITE_ATTEMPTS,
+        retry_backoff_seconds: float = EVENT_RETRY_BACKOFF_SECONDS,
+    ):
+        """
+        :param batch_size: Maximum number of events committed in one batch
+        :param flush_interval_seconds: Maximum time an event waits in the queue before
+            its batch is committed
+        :param max_queue_size: Maximum number of events waiting to be written. Events
+            are written synchronously while the queue is full
+        :param write_attempts: Commits of a batch tried before its events are dropped
+        :param retry_backoff_seconds: Wait before the first retry of a batch, doubled
+            after every failed retry
+        """
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.write_attempts = write_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.overflows = 0
+        self.flushes = 0
+        self.last_flush_seconds: Optional[float] = None
+        self.max_flush_seconds = 0.0
+        # Queued (document ID, event) pairs
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(
+            max_queue_size
+        )
+        self._lock = threading.Lock()
+        # Guards the counters, updated by the request threads and the flusher thread
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the flusher thread."""
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="qtime-event-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the flusher thread once every queued event is written. Events written after
+        the writer is stopped are written synchronously.
+
+        :param timeout: Maximum time in seconds to wait for the queue to drain (Optional)
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+        # Events queued while the writer was stopping
+        while not self._queue.empty():
+            self._flush(self._next_batch())
+
+    def write(self, event: Dict[str, Any], document_id: Optional[str] = None):
+        """
+        Queue an event to be written to the events collection. Inside a unit of work the
+        event is only queued once the unit of work is committed.
+
+        :param event: Dictionary of the event
+        :param document_id: ID of the event document, generated when not specified
+        """
+        after_commit(lambda: self._enqueue(event, document_id))
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the writer"""
+        with self._stats_lock:
+            return {
+                "running": self.is_running(),
+                "queue_depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "retries": self.retries,
+                "overflows": self.overflows,
+                "flushes": self.flushes,
+                "last_flush_seconds": self.last_flush_seconds,
+                "max_flush_seconds": self.max_flush_seconds,
+            }
+
+    def _enqueue(self, event: Dict[str, Any], document_id: Optional[str]):
+        if not self.is_running():
+            _write_event(event, document_id)
+            return
+        try:
+            self._queue.put_nowait((document_id or uuid.uuid4().hex, event))
+            with self._stats_lock:
+                self.enqueued += 1
+        except queue.Full:
+            # Apply back pressure instead of dropping the event
+            with self._stats_lock:
+                self.overflows += 1
+            _write_event(event, document_id)
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            events = self._next_batch()
+            if events:
+                self._flush(events)
+
+    def _next_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Wait for the first event, then collect events until the batch is full or the first
+        event has waited for the flush interval.
+        """
+        try:
+            events = [self._queue.get(timeout=self.flush_interval_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval_seconds
+        while len(events) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self._stopping.is_set():
+                remaining = 0
+            try:
+                events.append(
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return events
+
+    def _flush(self, events: List[Tuple[str, Dict[str, Any]]]):
+        start = time.monotonic()
+        written = self._commit(events)
+        elapsed = time.monotonic() - start
+        with self._stats_lock:
+            if written:
+                self.written += len(events)
+            else:
+                self.failed += len(events)
+            self.flushes += 1
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def _commit(self, events: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        Commit a batch of events, retried with backoff.
+
+        :return: True if the batch was committed, False if every attempt failed
+        """
+        backoff = self.retry_backoff_seconds
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                batch = firestore_db().batch()
+                for document_id, event in events:
+                    batch.set(_events_collection().document(document_id), event)
+                batch.commit()
+                return True
+            except Exception:
+                if attempt == self.write_attempts:
+                    logger.exception(f"Failed to write {len(events)} events")
+                    return False
+                logger.warning(
+                    f"Failed to write {len(events)} events, retrying in {backoff}s",
+                    exc_info=True,
+                )
+            with self._stats_lock:
+                self.retries += 1
+            time.sleep(backoff)
+            backoff *= 2
+        return False
+
+
+_writer = EventWriter()
+
+
+def event_writer() -> EventWriter:
+    """Process-wide event writer"""
+    return _writer
+
+
+def _write_event(event: Dict[str, Any], document_id: Optional[str]):
+    if document_id is None:
+        _events_collection().add(event)
+    else:
+        _events_collection().document(document_id).set(event)
+
+
+def _events_collection():
+    return firestore_db().collection(EVENTS_COLLECTION)
@@ -7,6 +7,9 @@ LOCATION_COLLECTION = "location"
 POI_COLLECTION = "POI"
 POI_PROPOSAL_COLLECTION = "POI_proposal"
 HISTOGRAM_COLLECTION = "histogram"
+CURRENT_ESTIMATE_COLLECTION = "current_estimate"
+REWARD_LEDGER_COLLECTION = "reward_ledger"
+DELETION_JOBS_COLLECTION = "deletion_jobs"
 
 
 def firestore_db():
@@ -1,5 +1,33 @@
 from flask import jsonify
+from app.locations.catalog import poi_catalog
+from app.locations.service import histogram_estimate_writer
+from app.events.writer import event_writer
+from app.events.spool import event_spool
+from app.token_cache import id_token_cache
+from app.user.cache import user_cache
+from app.rewards.referral_pool import referral_code_pool
+from app.user.deletion import account_deletion_worker
+from app.sharded_counter import counter_cache
+from app import concurrency
 
 
 def get_server_health():
     return jsonify({"status": "up"})
+
+
+def get_server_stats():
+    """Counters of the caches and background services of this instance"""
+    return jsonify(
+        {
+            "poi_catalog": poi_catalog().stats(),
+            "histogram_estimate_writer": histogram_estimate_writer().stats(),
+            "event_writer": event_writer().stats(),
+            "event_spool": event_spool().stats(),
+            "id_token_cache": id_token_cache().stats(),
+            "user_cache": user_cache().stats(),
+            "referral_code_pool": referral_code_pool().stats(),
+            "account_deletion_worker": account_deletion_worker().stats(),
+            "counter_cache": counter_cache().stats(),
+            "concurrency": concurrency.stats(),
+        }
+    )
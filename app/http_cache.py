@@ -0,0 +1,83 @@
+###
+# Conditional GET support. The ETag of a response is a hash of the revision of the data it
+# is built from and of the request URL, so it is the same in every process serving the API
+# and it is known before the endpoint runs. Polling clients whose If-None-Match matches
+# get a 304 Not Modified without the endpoint reading Firestore or building the payload.
+#
+# The cursor of the next page is not known before the endpoint runs, so it is appended to
+# the ETag and given back in the X-Next-Cursor header of the 304.
+###
+
+import hashlib
+from functools import wraps
+from typing import Callable
+
+from flask import make_response, request
+
+from app.cursor import NEXT_CURSOR_HEADER
+
+# Separates the hash from the cursor in an ETag, cursors are URL safe base64
+CURSOR_SEPARATOR = "."
+
+
+def with_conditional_get(max_age: Callable[[], int], revision: Callable[[], str]):
+    """
+    Decorator adding a weak ETag and a Cache-Control max-age to the successful responses
+    of an endpoint, and answering 304 Not Modified with an empty body, without calling the
+    endpoint, when the If-None-Match header of the request matches the current ETag.
+
+    Usage
+    ```
+    @with_auth_user
+    @with_conditional_get(places_max_age, places_revision)
+    def my_function(**kwargs):
+        ...
+    ```
+
+    :param max_age: Function returning the number of seconds the response can be reused
+        without revalidation
+    :param revision: Function returning a string that changes whenever the responses of
+        the endpoint change, for the same request URL
+    :return: Decorator
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            digest = build_etag(revision(), request.full_path)
+            for etag in request.if_none_match.as_set(include_weak=True):
+                etag_digest, _, cursor = etag.partition(CURSOR_SEPARATOR)
+                if etag_digest == digest:
+                    response = make_response("", 304)
+                    if cursor:
+                        response.headers[NEXT_CURSOR_HEADER] = cursor
+                    return _with_cache_headers(response, etag, max_age())
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            etag = f"{digest}{CURSOR_SEPARATOR}{cursor}" if cursor else digest
+            return _with_cache_headers(response, etag, max_age())
+
+        return wrapper
+
+    return decorator
+
+
+def build_etag(revision: str, url: str) -> str:
+    """
+    Build the ETag of a response, without the cursor of the next page.
+
+    :param revision: Revision of the data the response is built from
+    :param url: Path and query string of the request
+    :return: ETag value
+    """
+    return hashlib.sha1(f"{revision}\n{url}".encode("utf-8")).hexdigest()
+
+
+def _with_cache_headers(response, etag: str, max_age: int):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response
@@ -4,21 +4,30 @@ import math
 from random import random, randint
 
 from app.auth import with_auth_user
+from app.http_cache import with_conditional_get
+from app.cursor import NEXT_CURSOR_HEADER
 from app.user.user import User
 from app.base_api_error import MissingQueryParameterError
-from .poi import POIClassification, POI
+from .poi import POIClassification, POI, POISummary
 from .service import (
     list_POI,
     get_details_for_POI,
+    fetch_POI_details,
     new_POI_suggestion,
     get_distance_to_POI,
-    generate_histogram_for_POI,
-    fetch_latest_estimated_value,
+    estimates_max_age,
+    estimates_revision,
 )
+from .catalog import poi_catalog
+
+
+def _places_revision() -> str:
+    """Changes whenever the POI responses change, checked before reading Firestore"""
+    return f"{poi_catalog().revision()}:{estimates_revision()}"
 
 
 def _build_POI_api_model(
-    poi: POI, estimate: float, distance: float, last_updated: float
+    poi: POISummary, estimate: float, distance: float, last_updated: float
 ) -> Dict[str, Any]:
     """
     Build a model to be returned by the POI api. Extends the POI dictionary with additional fields.
@@ -61,15 +70,20 @@ def _build_POI_details_api_response(
 
 
 @with_auth_user
+@with_conditional_get(estimates_max_age, _places_revision)
 def get_all_POI(
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     sort: Optional[str] = None,
-    **kwargs
+    radius_m: Optional[float] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    **kwargs,
 ):
     """
     Return a list of all the tracked points of interests. Requires the geo coordinates of the user's location.
-    Allows filtering by POI class and sorting by distance or estimate.
+    Allows filtering by POI class and distance, sorting by distance or estimate and paginating with a limit and a cursor.
+    The cursor of the next page is returned in the X-Next-Cursor header.
     """
     if latitude is None:
         raise MissingQueryParameterError("latitude")
@@ -81,7 +95,14 @@ def get_all_POI(
     class_filter = kwargs.get("class", None)
     if class_filter:
         class_filter = POIClassification(class_filter)
-    list_all_poi = list_POI(user_location, classification=class_filter, sort_by=sort)
+    list_all_poi, next_cursor = list_POI(
+        user_location,
+        classification=class_filter,
+        sort_by=sort,
+        radius_m=radius_m,
+        limit=limit,
+        cursor=cursor,
+    )
     return (
         jsonify(
             [
@@ -90,15 +111,17 @@ def get_all_POI(
             ]
         ),
         200,
+        {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {},
     )
 
 
 @with_auth_user
+@with_conditional_get(estimates_max_age, _places_revision)
 def get_POI_details(
     poi_id: str,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
-    **kwargs
+    **kwargs,
 ):
     """
     Returns the details of a single point of interest.
@@ -113,23 +136,18 @@ def get_POI_details(
         raise MissingQueryParameterError("longitude")
     user_location = (latitude, longitude)
 
-    poi = get_details_for_POI(poi_id)
+    # The details, current estimate and histogram are fetched concurrently
+    poi, estimate, last_updated, histogram = fetch_POI_details(poi_id)
     distance = get_distance_to_POI(poi, user_location)
-    # TODO: Compute the estimate (time or capacity)
-    SAMPLE_ESTIMATE = fetch_latest_estimated_value(poi_id, poi.classification.value)
-    # TODO: Compute the last_updated value
-    SAMPLE_LAST_UPDATED = 3
-    # TODO: Compute the histogram values that match this format
-    SAMPLE_HISTOGRAM = generate_histogram_for_POI(poi_id)
 
     return (
         jsonify(
             _build_POI_details_api_response(
                 poi,
-                SAMPLE_ESTIMATE,
+                estimate,
                 distance,
-                SAMPLE_LAST_UPDATED,
-                SAMPLE_HISTOGRAM,
+                last_updated,
+                histogram,
             )
         ),
         200,
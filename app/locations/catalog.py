@@ -0,0 +1,221 @@
+###
+# In-process catalog of every POI. POIs almost never change so the whole collection is
+# kept in memory and kept coherent with a Firestore snapshot listener. If the listener is
+# not running the catalog falls back to reloading itself once its TTL has expired.
+#
+# The catalog holds a POISummary of every POI for lists, loaded with a projection of the
+# summary fields, and the full POI of the POIs whose details were requested.
+###
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.firebase import firestore_db, POI_COLLECTION
+from .poi import POI, POISummary
+from .geo_index import GeoGridIndex
+
+POI_CATALOG_TTL_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class POICatalog:
+    def __init__(self, ttl_seconds: float = POI_CATALOG_TTL_SECONDS):
+        """
+        :param ttl_seconds: Maximum age of the catalog before it is reloaded when the
+            snapshot listener is not active
+        """
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        # Incremented every time the contents of the catalog change
+        self.version = 0
+        self._lock = threading.RLock()
+        self._revision = ""
+        self._update_times: Dict[str, Any] = {}
+        self._by_id: Dict[str, POISummary] = {}
+        self._details: Dict[str, POI] = {}
+        self._geo_index = GeoGridIndex([])
+        self._loaded_at: Optional[float] = None
+        self._watch: Any = None
+
+    def start(self):
+        """Load the catalog and start listening for changes to the POI collection."""
+        self.reload()
+        with self._lock:
+            if self._watch is None:
+                self._watch = _poi_collection().on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        """Stop listening for changes to the POI collection."""
+        with self._lock:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+                self._watch = None
+
+    def reload(self):
+        """
+        Force a full reload of the catalog from Firestore. Only the summary fields are read,
+        the details of the POIs are read again when they are requested.
+        """
+        docs = list(_poi_collection().select(POISummary.FIELDS).stream())
+        summaries = [POISummary.from_dict(d.to_dict()) for d in docs]
+        with self._lock:
+            self.reloads += 1
+            self._replace(summaries, {}, {d.id: d.update_time for d in docs})
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop the contents of the catalog so that it is reloaded on next use."""
+        with self._lock:
+            self._by_id = {}
+            self._details = {}
+            self._update_times = {}
+            self._revision = ""
+            self._geo_index = GeoGridIndex([])
+            self._loaded_at = None
+
+    def get(self, poi_id: str) -> Optional[POI]:
+        """
+        Return the POI with the given id. Falls back to reading the POI document if the
+        details of the POI are not in the catalog yet, or in case the listener has not caught
+        up yet.
+
+        :param poi_id: ID of the POI
+        :return: The POI or None if it does not exist
+        """
+        self._ensure_fresh()
+        with self._lock:
+            poi = self._details.get(poi_id)
+            if poi is not None:
+                self.hits += 1
+                return poi
+            self.misses += 1
+
+        snapshot = _poi_collection().document(poi_id).get()
+        if not snapshot.exists:
+            return None
+        poi = POI.from_dict(snapshot.to_dict())
+        with self._lock:
+            self._details[poi_id] = poi
+            if poi_id not in self._by_id:
+                self._replace(
+                    [*self._by_id.values(), POISummary.from_poi(poi)],
+                    self._details,
+                    {**self._update_times, poi_id: snapshot.update_time},
+                )
+        return poi
+
+    def geo_index(self) -> GeoGridIndex:
+        """Spatial index over the coordinates of every POI in the catalog"""
+        fresh = self._ensure_fresh()
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return self._geo_index
+
+    def revision(self) -> str:
+        """
+        Hash of the IDs and update times of the POI documents in the catalog. Unlike the
+        version, it is the same in every process holding the same POIs.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return self._revision
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the catalog"""
+        with self._lock:
+            return {
+                "size": len(self._by_id),
+                "details": len(self._details),
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "listening": self._is_listening(),
+                "age_seconds": (
+                    time.monotonic() - self._loaded_at
+                    if self._loaded_at is not None
+                    else None
+                ),
+            }
+
+    def _ensure_fresh(self) -> bool:
+        """
+        Reload the catalog if it was never loaded, or if the listener is not active and
+        the TTL expired.
+
+        :return: True if the catalog was already fresh, False if it had to be reloaded
+        """
+        with self._lock:
+            fresh = self._loaded_at is not None and (
+                self._is_listening()
+                or time.monotonic() - self._loaded_at < self.ttl_seconds
+            )
+        if not fresh:
+            self.reload()
+        return fresh
+
+    def _is_listening(self) -> bool:
+        return self._watch is not None and self._watch.is_active
+
+    def _on_snapshot(self, docs, changes, read_time):
+        """
+        Snapshot listener callback. Receives every document in the collection, so the
+        details of every POI are kept. A document that cannot be parsed is logged and left
+        out of the catalog.
+        """
+        pois = []
+        update_times = {}
+        for doc in docs:
+            try:
+                pois.append(POI.from_dict(doc.to_dict()))
+                update_times[doc.id] = doc.update_time
+            except Exception:
+                logger.exception(f"Skipped the invalid POI document {doc.id}")
+        with self._lock:
+            self._replace(
+                [POISummary.from_poi(poi) for poi in pois],
+                {poi.id: poi for poi in pois},
+                update_times,
+            )
+
+    def _replace(
+        self,
+        summaries: List[POISummary],
+        details: Dict[str, POI],
+        update_times: Dict[str, Any],
+    ):
+        """
+        Rebuild the indexes of the catalog. Must be called with the lock held.
+
+        :param update_times: Update time of the document of each POI, keyed by POI ID
+        """
+        by_id = {poi.id: poi for poi in sorted(summaries, key=lambda p: p.id)}
+        self._by_id = by_id
+        self._details = details
+        self._update_times = update_times
+        self._revision = hashlib.sha1(
+            repr(sorted((id, str(t)) for id, t in update_times.items())).encode()
+        ).hexdigest()
+        self._geo_index = GeoGridIndex(by_id.values())
+        self.version += 1
+
+
+_catalog = POICatalog()
+
+
+def poi_catalog() -> POICatalog:
+    """Process-wide POI catalog"""
+    return _catalog
+
+
+def _poi_collection():
+    return firestore_db().collection(POI_COLLECTION)
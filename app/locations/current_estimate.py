@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, Optional
+import math
+
+from app.common import BadDataError
+
+
+class EstimateSource(Enum):
+    """
+    Where the current estimate of a POI comes from.
+    Histogram if it was taken from the weekly histogram for the hour.
+    Submissions if it was computed from the wait times submitted by users during the hour.
+    """
+
+    HISTOGRAM = "histogram"
+    SUBMISSIONS = "submissions"
+
+
+def estimate_bucket(hour_start: datetime) -> str:
+    """
+    Name of the hour bucket an estimate belongs to. A current estimate is only valid for
+    the bucket it was computed in. Buckets are absolute hours, so an estimate computed on
+    the same weekday and hour of a previous week is not current.
+
+    :param hour_start: Timezone aware start of the hour
+    """
+    return hour_start.astimezone(timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+class CurrentEstimate:
+    """
+    Materialized estimate of the wait time/occupancy of a POI for the current hour, stored
+    in the current_estimate/{poi_id} document.
+    """
+
+    def __init__(
+        self,
+        poi_id: str,
+        estimate: Optional[float],
+        source: EstimateSource,
+        bucket: str,
+        last_updated: datetime,
+        submission_count: int = 0,
+    ):
+        """
+        :param poi_id: ID of the POI
+        :param estimate: Estimate for the hour or None if there is no data for the hour
+        :param source: Where the estimate comes from
+        :param bucket: Hour bucket the estimate was computed for (see estimate_bucket)
+        :param last_updated: Time the data behind the estimate was last updated
+        :param submission_count: Number of submissions averaged in the estimate
+        """
+        self.poi_id = poi_id
+        self.estimate = estimate
+        self.source = (
+            source if type(source) is EstimateSource else EstimateSource(source)
+        )
+        self.bucket = bucket
+        self.last_updated = last_updated
+        self.submission_count = submission_count
+
+    def is_current(self, bucket: str) -> bool:
+        """True if the estimate was computed for the given hour bucket"""
+        return self.bucket == bucket
+
+    def minutes_since_update(self, now: datetime) -> int:
+        """
+        Number of whole minutes since the data behind the estimate was last updated.
+
+        :param now: Current time (timezone aware)
+        """
+        return max(0, math.floor((now - self.last_updated).total_seconds() / 60))
+
+    @staticmethod
+    def from_dict(dict: Dict[str, Any]) -> "CurrentEstimate":
+        """
+        Creates a CurrentEstimate object from a current_estimate document.
+
+        :param dict: Dictionary of the current estimate
+        """
+        try:
+            return CurrentEstimate(
+                poi_id=dict["poi_id"],
+                estimate=dict["estimate"],
+                source=EstimateSource(dict["source"]),
+                bucket=dict["bucket"],
+                last_updated=dict["last_updated"],
+                submission_count=dict.get("submission_count", 0),
+            )
+        except (KeyError, ValueError) as e:
+            raise BadDataError("Missing data from current estimate data: " + str(e))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Creates a dictionary from a CurrentEstimate object
+        """
+        return {
+            "poi_id": self.poi_id,
+            "estimate": self.estimate,
+            "source": self.source.value,
+            "bucket": self.bucket,
+            "last_updated": self.last_updated,
+            "submission_count": self.submission_count,
+        }
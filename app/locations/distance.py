@@ -0,0 +1,48 @@
+###
+# Vectorized great-circle distance computations backed by NumPy
+###
+
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from .poi import POISummary
+
+# Mean earth radius in meters. Matches the radius used by the haversine package.
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def haversine_distances(
+    origin: Tuple[float, float], coordinates: np.ndarray
+) -> np.ndarray:
+    """
+    Computes the distance in meters between one point and many points on the earth's
+    surface using the Haversine formula in a single vectorized call.
+
+    :param origin: A tuple of the latitude and longitude of the origin
+    :param coordinates: Array of shape (n, 2) of latitudes and longitudes in degrees
+    :return: Array of shape (n,) with the distance in meters to each point
+    """
+    if len(coordinates) == 0:
+        return np.empty(0, dtype=np.float64)
+    lat1, lng1 = np.radians(origin[0]), np.radians(origin[1])
+    points = np.radians(coordinates)
+    lat2, lng2 = points[:, 0], points[:, 1]
+
+    d = (
+        np.sin((lat2 - lat1) * 0.5) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(d))
+
+
+def coordinates_array(pois: Iterable[POISummary]) -> np.ndarray:
+    """
+    Build a contiguous (n, 2) array of the latitude and longitude of each POI.
+
+    :param pois: POIs to take the coordinates of
+    """
+    return np.array(
+        [(poi.location["latitude"], poi.location["longitude"]) for poi in pois],
+        dtype=np.float64,
+    ).reshape(-1, 2)
@@ -0,0 +1,224 @@
+###
+# Spatial index over POI coordinates used to answer nearest-POI and radius queries
+# without computing the distance to every POI in the catalog.
+#
+# POIs are bucketed into a uniform grid of latitude/longitude cells. Queries scan rings
+# of cells outwards from the cell containing the user's location and stop once no
+# unvisited cell can contain a closer POI than the ones already found.
+###
+
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .poi import POIClassification, POISummary
+from .distance import haversine_distances, coordinates_array
+
+# Size of a grid cell in degrees (roughly 550m of latitude)
+GRID_CELL_DEGREES = 0.005
+# Lower bound of the length of one degree of latitude in meters
+_METERS_PER_DEGREE = 110_574
+
+Cell = Tuple[int, int]
+
+
+class GeoGridIndex:
+    def __init__(
+        self, pois: Iterable[POISummary], cell_degrees: float = GRID_CELL_DEGREES
+    ):
+        """
+        :param pois: POIs to index
+        :param cell_degrees: Size of a grid cell in degrees
+        """
+        self.cell_degrees = cell_degrees
+        self._pois = sorted(pois, key=lambda p: p.id)
+        self._coordinates = coordinates_array(self._pois)
+        buckets: Dict[Cell, List[int]] = {}
+        for i, location in enumerate(self._coordinates):
+            buckets.setdefault(self._cell_of(location), []).append(i)
+        # Each cell holds the positions of its POIs in self._pois
+        self._cells: Dict[Cell, np.ndarray] = {
+            cell: np.array(positions) for cell, positions in buckets.items()
+        }
+        if self._cells:
+            rows = [row for row, _ in self._cells]
+            cols = [col for _, col in self._cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self) -> int:
+        return len(self._pois)
+
+    def distances_from(
+        self,
+        location: Tuple[float, float],
+        classification: Optional[POIClassification] = None,
+    ) -> List[Tuple[POISummary, float]]:
+        """
+        Compute the distance from a location to every POI in the index.
+
+        :param location: Tuple of the latitude and longitude to compute distances from
+        :param classification: Only return POIs of this classification (Optional)
+        :return: List of (POI, distance in meters) tuples ordered by POI id
+        """
+        return self._with_distances(
+            location, np.arange(len(self._pois)), None, classification
+        )
+
+    def nearest(
+        self,
+        location: Tuple[float, float],
+        limit: Optional[int] = None,
+        radius_m: Optional[float] = None,
+        classification: Optional[POIClassification] = None,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> List[Tuple[POISummary, float]]:
+        """
+        Find the POIs closest to a location, ordered by distance then id.
+
+        :param location: Tuple of the latitude and longitude to search from
+        :param limit: Maximum number of POIs to return (Optional)
+        :param radius_m: Only return POIs within this distance in meters (Optional)
+        :param classification: Only return POIs of this classification (Optional)
+        :param after: Only return POIs ordered after this (distance, id) key (Optional)
+        :return: List of (POI, distance in meters) tuples ordered by distance
+        """
+        if limit is not None and limit <= 0:
+            return []
+
+        found: List[Tuple[POISummary, float]] = []
+        for ring, positions in self._scan(location):
+            # Every POI in this ring or further away is at least this far away
+            min_distance = self._ring_min_distance(location, ring)
+            if radius_m is not None and min_distance > radius_m:
+                break
+            if limit is not None and len(found) >= limit:
+                kth = heapq.nsmallest(limit, found, key=_by_distance)[-1]
+                if kth[1] <= min_distance:
+                    break
+            found.extend(
+                x
+                for x in self._with_distances(
+                    location, positions, radius_m, classification
+                )
+                if after is None or _by_distance(x) > after
+            )
+
+        if limit is not None:
+            return heapq.nsmallest(limit, found, key=_by_distance)
+        return sorted(found, key=_by_distance)
+
+    def within(
+        self,
+        location: Tuple[float, float],
+        radius_m: float,
+        classification: Optional[POIClassification] = None,
+    ) -> List[Tuple[POISummary, float]]:
+        """
+        Find every POI within a radius of a location, ordered by id.
+
+        :param location: Tuple of the latitude and longitude to search from
+        :param radius_m: Distance in meters to search within
+        :param classification: Only return POIs of this classification (Optional)
+        :return: List of (POI, distance in meters) tuples ordered by POI id
+        """
+        return sorted(
+            self.nearest(location, radius_m=radius_m, classification=classification),
+            key=lambda x: x[0].id,
+        )
+
+    def _cell_of(self, location) -> Cell:
+        return (
+            math.floor(location[0] / self.cell_degrees),
+            math.floor(location[1] / self.cell_degrees),
+        )
+
+    def _scan(self, location: Tuple[float, float]):
+        """
+        Yield (ring, positions of the POIs in the ring) for the rings of cells around a
+        location, nearest ring first, until every occupied cell has been visited.
+        """
+        if not self._cells:
+            return
+        row, col = self._cell_of(location)
+        min_row, max_row, min_col, max_col = self._bounds
+        # Rings that do not reach the occupied cells are empty and can be skipped
+        first_ring = max(min_row - row, row - max_row, min_col - col, col - max_col, 0)
+        last_ring = max(
+            abs(row - min_row),
+            abs(row - max_row),
+            abs(col - min_col),
+            abs(col - max_col),
+        )
+        for ring in range(first_ring, last_ring + 1):
+            cells = [
+                self._cells[cell]
+                for cell in _ring_cells(row, col, ring, self._bounds)
+                if cell in self._cells
+            ]
+            yield ring, (np.concatenate(cells) if cells else np.empty(0, dtype=np.intp))
+
+    def _with_distances(
+        self,
+        location: Tuple[float, float],
+        positions: np.ndarray,
+        radius_m: Optional[float],
+        classification: Optional[POIClassification],
+    ) -> List[Tuple[POISummary, float]]:
+        """
+        Compute the distances to the POIs at the given positions in one vectorized call,
+        dropping the POIs outside of the radius or of another classification.
+        """
+        distances = haversine_distances(location, self._coordinates[positions])
+        results = []
+        for position, distance in zip(positions, distances.tolist()):
+            poi = self._pois[position]
+            if radius_m is not None and distance > radius_m:
+                continue
+            if classification is not None and poi.classification != classification:
+                continue
+            results.append((poi, distance))
+        return results
+
+    def _ring_min_distance(self, location: Tuple[float, float], ring: int) -> float:
+        """
+        Lower bound of the distance in meters between a location and any point in a ring
+        of cells. Points in ring r are at least r - 1 whole cells away along one axis.
+        """
+        if ring <= 1:
+            return 0.0
+        # Use the latitude furthest from the equator that the ring reaches so that the
+        # longitudinal cell width is never overestimated
+        latitude = min(89.0, abs(location[0]) + (ring + 1) * self.cell_degrees)
+        cell_m = (
+            self.cell_degrees * _METERS_PER_DEGREE * math.cos(math.radians(latitude))
+        )
+        return (ring - 1) * cell_m
+
+
+def _ring_cells(
+    row: int, col: int, ring: int, bounds: Tuple[int, int, int, int]
+) -> Iterable[Cell]:
+    """
+    Cells at exactly Chebyshev distance `ring` from (row, col), clipped to the bounds
+    (min_row, max_row, min_col, max_col).
+    """
+    min_row, max_row, min_col, max_col = bounds
+    if ring == 0:
+        yield (row, col)
+        return
+    cols = range(max(col - ring, min_col), min(col + ring, max_col) + 1)
+    for r in (row - ring, row + ring):
+        if min_row <= r <= max_row:
+            for c in cols:
+                yield (r, c)
+    rows = range(max(row - ring + 1, min_row), min(row + ring - 1, max_row) + 1)
+    for c in (col - ring, col + ring):
+        if min_col <= c <= max_col:
+            for r in rows:
+                yield (r, c)
+
+
+def _by_distance(x: Tuple[POISummary, float]) -> Tuple[float, str]:
+    return (x[1], x[0].id)
@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import math
+import numpy as np
 from app.common import BadDataError
 from app.locations.errors import POINotFoundError
 import json
@@ -87,39 +89,240 @@ class POI:
         return self.id == other.id
 
 
+class POISummary:
+    """
+    Slim view of a POI with only the fields returned by the POI list. POI lists are built
+    from summaries so that the other fields do not have to be read or deserialized.
+    """
+
+    # Fields of the POI document needed to build a summary
+    FIELDS = ["_id", "name", "type", "class", "location"]
+
+    __slots__ = ("id", "name", "poi_type", "classification", "location")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        poi_type: str,
+        classification: POIClassification,
+        location: Dict[str, Any],
+    ):
+        self.id = id
+        self.name = name
+        self.poi_type = poi_type
+        self.classification = POIClassification(classification)
+        self.location = location
+
+    @staticmethod
+    def from_dict(dict: Dict[str, Any]) -> "POISummary":
+        """
+        Creates a POISummary object from a dictionary with at least the summary FIELDS.
+
+        :param dict: Dictionary of the fields of a POI
+        """
+        try:
+            return POISummary(
+                id=dict["_id"],
+                name=dict["name"],
+                poi_type=dict["type"],
+                classification=dict["class"],
+                location=dict["location"],
+            )
+        except KeyError as e:
+            raise BadDataError("Missing data from poi data: " + str(e))
+
+    @staticmethod
+    def from_poi(poi: POI) -> "POISummary":
+        """
+        Creates a POISummary object from a full POI object.
+
+        :param poi: POI to summarize
+        """
+        return POISummary(
+            id=poi.id,
+            name=poi.name,
+            poi_type=poi.poi_type,
+            classification=poi.classification,
+            location=poi.location,
+        )
+
+    def __eq__(self, other):
+        """
+        Checks if two POI summaries are equal based on id
+        """
+        return self.id == other.id
+
+
+DAYS_OF_WEEK = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+HOURS_PER_DAY = 24
+
+
 class Histogram:
+    """
+    Weekly histogram of the wait time/occupancy of a POI. Estimates are stored in a fixed
+    7x24 array indexed by (day of week, hour) where NaN marks an hour without data.
+
+    Histograms are stored in Firestore in one of two layouts:
+    - Legacy: a histogram/{poi} document with the poi_name and class, plus one
+      histogram/{poi}/histogram_data/{day} document per day (see from_dict/to_dict)
+    - Consolidated: a single histogram/{poi} document with the whole week packed inside
+      (see from_consolidated_dict/to_consolidated_dict)
+    """
+
     def __init__(
         self,
         poi_name: str,
         classification: POIClassification,
-        histogram_data: Dict[Any, Any],
+        slots: Optional[np.ndarray] = None,
+        days: Optional[np.ndarray] = None,
     ) -> None:
+        """
+        :param poi_name: Name of the POI (also known as the POI id)
+        :param classification: Classification of the POI
+        :param slots: Array of shape (7, 24) of estimates, NaN when there is no data
+        :param days: Boolean array of shape (7,), True for the days that have data
+        """
         self.poi_name = poi_name
         self.classification = POIClassification(classification)
-        self.histogram_data = histogram_data
+        self.slots = (
+            slots
+            if slots is not None
+            else np.full((len(DAYS_OF_WEEK), HOURS_PER_DAY), np.nan)
+        )
+        self.days = days if days is not None else ~np.isnan(self.slots).all(axis=1)
+
+    def has_day(self, day: str) -> bool:
+        """True if the histogram has data for the day"""
+        return day in _DAY_INDEX and bool(self.days[_DAY_INDEX[day]])
+
+    def estimate_at(self, day: str, hour: int) -> Optional[Any]:
+        """
+        Returns the estimate for an hour of a day or None if there is no data.
+
+        :param day: Day of the week (e.g. "Monday")
+        :param hour: Hour of the day in 24hr format
+        """
+        if day not in _DAY_INDEX or not 0 <= hour < HOURS_PER_DAY:
+            return None
+        value = self.slots[_DAY_INDEX[day], hour]
+        return None if np.isnan(value) else _to_number(value)
+
+    def series(self, day: str) -> List[Dict[str, Any]]:
+        """
+        Returns the {"time", "estimate"} pairs of a day ordered by time.
+
+        :param day: Day of the week (e.g. "Monday")
+        """
+        if day not in _DAY_INDEX:
+            return []
+        row = self.slots[_DAY_INDEX[day]]
+        return [
+            {"time": hour, "estimate": _to_number(value)}
+            for hour, value in enumerate(row.tolist())
+            if not math.isnan(value)
+        ]
 
     @staticmethod
     def from_dict(dict: Dict[str, Any]) -> "Histogram":
         """
-        Creates a POI object from a dictionary.
+        Creates a Histogram object from a dictionary.
 
-        :param dict: Dictionary of the parameters corresponding to a POI
+        :param dict: Dictionary of the parameters corresponding to a Histogram, with the
+            histogram data keyed by day name and by hour as a string
         """
         try:
-            return Histogram(
+            histogram = Histogram(
                 poi_name=dict["poi_name"],
                 classification=dict["class"],
-                histogram_data=dict["histogram_data"],
             )
-        except KeyError as e:
+            for day, day_data in dict["histogram_data"].items():
+                histogram._set_day(day, day_data["hours"])
+            return histogram
+        except (KeyError, ValueError) as e:
             raise BadDataError("Missing data from histogram data: " + str(e))
 
     def to_dict(self) -> Dict[str, Any]:
         """
-        Creates a dictionary from a POI object
+        Creates a dictionary from a Histogram object in the format stored in Firestore
         """
         return {
             "poi_name": self.poi_name,
             "class": self.classification.value,
-            "histogram_data": self.histogram_data,
+            "histogram_data": {
+                day: {
+                    "day": day,
+                    "poi_name": self.poi_name,
+                    "hours": {
+                        str(point["time"]): point["estimate"]
+                        for point in self.series(day)
+                    },
+                }
+                for day in DAYS_OF_WEEK
+                if self.has_day(day)
+            },
         }
+
+    @staticmethod
+    def is_consolidated(dict: Dict[str, Any]) -> bool:
+        """True if a histogram document uses the consolidated single document layout"""
+        return "slots" in dict
+
+    @staticmethod
+    def from_consolidated_dict(dict: Dict[str, Any]) -> "Histogram":
+        """
+        Creates a Histogram object from a histogram document in the consolidated layout,
+        where the whole week is packed in a single document.
+
+        :param dict: Dictionary with the poi_name, class, days and slots of the histogram
+        """
+        try:
+            slots = np.array(
+                [np.nan if v is None else v for v in dict["slots"]], dtype=np.float64
+            ).reshape(len(DAYS_OF_WEEK), HOURS_PER_DAY)
+            days = np.array([day in dict["days"] for day in DAYS_OF_WEEK])
+            return Histogram(dict["poi_name"], dict["class"], slots, days)
+        except (KeyError, ValueError) as e:
+            raise BadDataError("Missing data from histogram data: " + str(e))
+
+    def to_consolidated_dict(self) -> Dict[str, Any]:
+        """
+        Creates a dictionary in the consolidated single document layout. The 7x24 slots
+        are flattened day by day with None for hours without data.
+        """
+        return {
+            "poi_name": self.poi_name,
+            "class": self.classification.value,
+            "days": [day for day in DAYS_OF_WEEK if self.has_day(day)],
+            "slots": [
+                None if math.isnan(value) else _to_number(value)
+                for value in self.slots.flatten().tolist()
+            ],
+        }
+
+    def _set_day(self, day: str, hours: Dict[str, Any]):
+        """Fill in the slots of a day from a dictionary of hour (as a string) to estimate"""
+        if day not in _DAY_INDEX:
+            raise ValueError(f"Unknown day {day}")
+        row = _DAY_INDEX[day]
+        for hour, estimate in hours.items():
+            if not 0 <= int(hour) < HOURS_PER_DAY:
+                raise ValueError(f"Invalid hour {hour}")
+            self.slots[row, int(hour)] = estimate
+        self.days[row] = True
+
+
+_DAY_INDEX = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+
+
+def _to_number(value: float) -> Any:
+    """Estimates are stored as floats, return whole numbers as ints"""
+    return int(value) if float(value).is_integer() else float(value)
@@ -1,21 +1,61 @@
 import haversine
+import heapq
 from typing import Dict, Tuple, Iterable, Optional, List, Any
 import math
 import pytz
+import logging
+import threading
+import time
 from random import random
 
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+
 from .poi_suggestion import POI_suggestion
-from .poi import POI, POIClassification, Histogram
+from .poi import POI, POIClassification, POISummary, Histogram
 from .errors import POINotFoundError, InvalidPOISuggestionError
+from .catalog import poi_catalog
+from .current_estimate import CurrentEstimate, EstimateSource, estimate_bucket
 from app import common
+from app.base_api_error import InvalidCursorError
+from app.cursor import encode_cursor, decode_cursor
+from app.concurrency import run_concurrently
+from app.sharded_counter import ShardedCounter
+from app.unit_of_work import set_document, after_commit, MAX_BATCH_WRITES
 from datetime import datetime, timezone
 from app.firebase import (
     firestore_db,
     POI_COLLECTION,
     POI_PROPOSAL_COLLECTION,
     HISTOGRAM_COLLECTION,
+    CURRENT_ESTIMATE_COLLECTION,
 )
 
+logger = logging.getLogger(__name__)
+
+# Errors of a histogram estimate write whose document changed since it was read
+ESTIMATE_WRITE_CONFLICTS = (AlreadyExists, FailedPrecondition, NotFound)
+
+# Maximum number of POIs returned by a single list request
+MAX_POI_LIST_LIMIT = 500
+
+# The estimates get a peak adjustment between these minutes of every hour (inclusive)
+PEAK_START_MINUTE = 20
+PEAK_END_MINUTE = 30
+
+# Submission stats of a POI for an hour, a sharded counter under its current estimate
+SUBMISSION_STATS_COLLECTION = "submission_stats"
+SUBMISSION_STATS_SHARDS = 10
+SUBMISSION_COUNT_FIELD = "count"
+SUBMISSION_SUM_FIELD = "sum"
+# Minimum time between two writes of the current estimate of a POI by a process
+CURRENT_ESTIMATE_WRITE_INTERVAL_SECONDS = 1.0
+
+# POI ID -> monotonic time the current estimate of the POI was last written
+_estimate_writes: Dict[str, float] = {}
+# POI ID -> (hour start, bucket, time) of the latest submission for a scheduled write
+_pending_estimate_writes: Dict[str, Tuple[datetime, str, datetime]] = {}
+_estimate_writes_lock = threading.Lock()
+
 
 def poi_collection():
     return firestore_db().collection(POI_COLLECTION)
@@ -29,60 +69,152 @@ def histogram_collection():
     return firestore_db().collection(HISTOGRAM_COLLECTION)
 
 
+def current_estimate_collection():
+    return firestore_db().collection(CURRENT_ESTIMATE_COLLECTION)
+
+
 def list_POI(
     user_location: Tuple[float, float],
     classification: Optional[POIClassification] = None,
     sort_by: Optional[str] = None,
-) -> List[Tuple[POI, float, float, float]]:
+    radius_m: Optional[float] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[POISummary, float, float, float]], Optional[str]]:
     """
-    Compute an iterable of (POI, estimate, distance, last_updated) computed from the POI collection in Firestore.
+    Compute a page of (POISummary, estimate, distance, last_updated) computed from the in-memory POI catalog.
+    POIs are ordered by distance, estimate or id, ties are broken by id so that pages are stable.
 
     :param clazz: The class of POI to filter by
     :param user_location: The user's location to use to sort POIs by proximity.
     :param sort_by: The field to sort the iterable by. Allowed values are "distance" and "estimate"
-    :return: An iterable of (POI, estimate, distance, last_updated) tuples
-    """
-    query = poi_collection()
-    if classification:
-        query = query.where("class", "==", classification.value)
-
-    def compute_query_results(d):
-        poi = d.to_dict()
-        # TODO: Compute the estimate (time or capacity) for each POI
-        SAMPLE_ESTIMATE = fetch_latest_estimated_value(poi["_id"], poi["class"])
-        # TODO: Compute the last_updated value for each POI
-        SAMPLE_LAST_UPDATED = 3
-        user_distance = _compute_geo_distance(
-            user_location,
-            (poi["location"]["latitude"], poi["location"]["longitude"]),
-        )
-        return (POI.from_dict(poi), SAMPLE_ESTIMATE, user_distance, SAMPLE_LAST_UPDATED)
+    :param radius_m: Only include POIs within this distance in meters of the user (Optional)
+    :param limit: Maximum number of POIs to return, at most MAX_POI_LIST_LIMIT (Optional)
+    :param cursor: Cursor of the page to return, as returned with the previous page (Optional)
+    :return: The page of (POISummary, estimate, distance, last_updated) tuples and the cursor of the next page, or None if it is the last page
+    :raises InvalidCursorError: If the cursor is malformed or was made for another sort
+    """
+    limit = min(limit or MAX_POI_LIST_LIMIT, MAX_POI_LIST_LIMIT)
+    ordering = sort_by or "id"
+    after = _cursor_key(cursor, ordering) if cursor else None
+
+    nearby = _select_nearby(
+        user_location, classification, sort_by, radius_m, limit, after
+    )
+    # Read every materialized estimate in a single multi-get rather than one read per POI
+    estimates = fetch_current_estimates([poi for poi, _ in nearby])
+    return _list_page(nearby, estimates, ordering, limit, after)
 
-    query_results = list(map(compute_query_results, query.stream()))
 
+def _select_nearby(
+    user_location: Tuple[float, float],
+    classification: Optional[POIClassification],
+    sort_by: Optional[str],
+    radius_m: Optional[float],
+    limit: int,
+    after: Optional[Tuple[Any, ...]],
+) -> List[Tuple[POISummary, float]]:
+    """
+    Select the candidate POIs of a list page and their distances. The spatial index only
+    visits the POIs near the user and computes distances in vectorized batches. One more POI
+    than the limit is selected to know if there is a next page.
+    """
     if sort_by == "distance":
-        query_results = sorted(
-            query_results,
-            key=lambda x: x[2],  # sort by distance
+        return (
+            poi_catalog()
+            .geo_index()
+            .nearest(user_location, limit + 1, radius_m, classification, after)
+        )
+    if radius_m is not None:
+        nearby = (
+            poi_catalog().geo_index().within(user_location, radius_m, classification)
+        )
+    else:
+        nearby = poi_catalog().geo_index().distances_from(user_location, classification)
+    if sort_by == "estimate":
+        return nearby
+    # Already ordered by id
+    return [x for x in nearby if after is None or (x[0].id,) > after][: limit + 1]
+
+
+def _list_page(
+    nearby: List[Tuple[POISummary, float]],
+    estimates: Dict[str, Tuple[float, int]],
+    ordering: str,
+    limit: int,
+    after: Optional[Tuple[Any, ...]],
+) -> Tuple[List[Tuple[POISummary, float, float, float]], Optional[str]]:
+    """
+    Build a list page from the candidate POIs and their estimates along with the cursor of
+    the next page.
+    """
+
+    def compute_query_results(poi: POISummary, user_distance: float):
+        estimate, last_updated = estimates[poi.id]
+        return (poi, estimate, user_distance, last_updated)
+
+    query_results = [compute_query_results(poi, distance) for poi, distance in nearby]
+
+    if ordering == "estimate":
+        # Partial selection of the page instead of sorting every POI by estimate
+        query_results = heapq.nsmallest(
+            limit + 1,
+            (
+                x
+                for x in query_results
+                if after is None or _list_sort_key(ordering, x) > after
+            ),
+            key=lambda x: _list_sort_key(ordering, x),
         )
-    elif sort_by == "estimate":
-        query_results = sorted(
-            query_results, key=lambda x: x[1]
-        )  # sort by estimate (time or capacity)
 
-    return query_results
+    if len(query_results) <= limit:
+        return query_results, None
+    query_results = query_results[:limit]
+    return query_results, encode_cursor(
+        ordering, list(_list_sort_key(ordering, query_results[-1]))
+    )
+
+
+def _list_sort_key(ordering: str, query_result: Tuple[POISummary, float, float, float]):
+    """Sort key of a (POISummary, estimate, distance, last_updated) tuple for an ordering"""
+    poi, estimate, distance, _ = query_result
+    if ordering == "distance":
+        return (distance, poi.id)
+    if ordering == "estimate":
+        return (estimate, poi.id)
+    return (poi.id,)
+
+
+def _cursor_key(cursor: str, ordering: str) -> Tuple[Any, ...]:
+    """
+    Decode the sort key of a POI list cursor.
+
+    :raises InvalidCursorError: If the cursor is malformed or was made for another ordering
+    """
+    key = decode_cursor(cursor, ordering)
+    if ordering == "id":
+        valid = len(key) == 1 and isinstance(key[0], str)
+    else:
+        valid = (
+            len(key) == 2
+            and isinstance(key[0], (int, float))
+            and isinstance(key[1], str)
+        )
+    if not valid:
+        raise InvalidCursorError(f"Malformed {ordering} cursor")
+    return tuple(key)
 
 
 def get_details_for_POI(poi_id: str) -> POI:
     """
-    Returns a POI object based on a given POI ID from the POI collction in Firestore.
+    Returns a POI object based on a given POI ID from the in-memory POI catalog.
 
     :param poi_id: ID of the POI
     """
-    poi_data = poi_collection().document(poi_id).get()
-    if not poi_data.exists:
+    poi = poi_catalog().get(poi_id)
+    if poi is None:
         raise POINotFoundError(poi_id)
-    return POI.from_dict(poi_data.to_dict())
+    return poi
 
 
 def new_POI_suggestion(poi_suggestion: Dict[str, str]) -> POI_suggestion:
@@ -166,115 +298,662 @@ def generate_histogram_for_POI(poi_name: str, day: str = "") -> List[Any]:
     :param poi_name: Name of the point of interest (also known as the POI id)
     :param day: Specific day to get the wait time/occupancy histogram from (Optional)
     """
-    histogram_instance = histogram_for_POI(poi_name)
-    histogram = histogram_instance.to_dict()
-    histogram_data = histogram["histogram_data"]
+    return _histogram_series(histogram_for_POI(poi_name), day)
 
-    est = pytz.timezone("US/Eastern")
-    if day == "":
-        day = datetime.now().astimezone(est).strftime("%A")
 
-    if day not in histogram_data:
-        return [{"time": 0, "estimate": 0}]
+def fetch_POI_details(poi_id: str, day: str = "") -> Tuple[POI, float, int, List[Any]]:
+    """
+    Returns the POI, its current estimated wait time/occupancy, the number of minutes since
+    the estimate was last updated and its histogram. The POI, its current estimate and its
+    histogram do not depend on each other so they are fetched concurrently.
 
-    return list(
-        sorted(
-            (
-                {"time": int(t), "estimate": histogram_data[day]["hours"][t]}
-                for t in histogram_data[day]["hours"]
+    :param poi_id: ID of the POI
+    :param day: Specific day to get the wait time/occupancy histogram from (Optional)
+    :raises POINotFoundError: If the POI or its histogram does not exist
+    """
+    now = datetime.now(timezone.utc)
+    estimate_day, current_hour, current_minute, hour_start = _current_hour_bucket(now)
+    bucket = estimate_bucket(hour_start)
+    poi, histogram, current_estimate_doc = run_concurrently(
+        lambda: get_details_for_POI(poi_id),
+        lambda: histogram_for_POI(poi_id),
+        lambda: current_estimate_collection().document(poi_id).get(),
+    )
+
+    current_estimate = _current_estimate_from_snapshot(current_estimate_doc, bucket)
+    if current_estimate is None:
+        # The hour rolled over, recompute from the histogram that was already fetched
+        current_estimate = _histogram_current_estimate(
+            poi_id,
+            histogram.estimate_at(estimate_day, current_hour),
+            bucket,
+            hour_start,
+        )
+        histogram_estimate_writer().submit(
+            {poi_id: (current_estimate_doc, current_estimate)}
+        )
+
+    return (
+        poi,
+        _current_estimate_value(
+            current_estimate, poi.classification.value, current_minute
+        ),
+        current_estimate.minutes_since_update(now),
+        _histogram_series(histogram, day),
+    )
+
+
+def fetch_current_estimates(
+    pois: List[POISummary], now: Optional[datetime] = None
+) -> Dict[str, Tuple[float, int]]:
+    """
+    Returns the current estimated wait time/occupancy of many POIs from their materialized
+    current_estimate documents, read with a single multi-get. Estimates computed for a
+    previous hour are recomputed from the histograms and written back in the background
+    (see HistogramEstimateWriter).
+
+    :param pois: POIs to get the estimate of
+    :param now: Current time (Optional)
+    :return: Dictionary mapping each POI id to its (estimate, minutes since last update)
+    """
+    now = now or datetime.now(timezone.utc)
+    day, current_hour, current_minute, hour_start = _current_hour_bucket(now)
+    bucket = estimate_bucket(hour_start)
+    pois_by_id = {poi.id: poi for poi in pois}
+    if not pois_by_id:
+        return {}
+
+    refs = [current_estimate_collection().document(poi_id) for poi_id in pois_by_id]
+    snapshots = {snapshot.id: snapshot for snapshot in firestore_db().get_all(refs)}
+    current_estimates = _current_estimates_from_snapshots(
+        snapshots.values(), pois_by_id, bucket
+    )
+
+    stale_poi_ids = [poi_id for poi_id in pois_by_id if poi_id not in current_estimates]
+    if stale_poi_ids:
+        hourly_estimates = _hourly_estimates(stale_poi_ids, day, current_hour)
+        for poi_id in stale_poi_ids:
+            current_estimates[poi_id] = _histogram_current_estimate(
+                poi_id, hourly_estimates[poi_id], bucket, hour_start
+            )
+        histogram_estimate_writer().submit(
+            {
+                poi_id: (snapshots.get(poi_id), current_estimates[poi_id])
+                for poi_id in stale_poi_ids
+            }
+        )
+
+    return _current_estimate_results(current_estimates, pois_by_id, current_minute, now)
+
+
+def _current_estimates_from_snapshots(
+    snapshots: Iterable[Any], pois_by_id: Dict[str, POISummary], bucket: str
+) -> Dict[str, CurrentEstimate]:
+    """
+    Returns the current estimates of the current hour bucket found in current_estimate
+    document snapshots, keyed by POI id.
+    """
+    current_estimates: Dict[str, CurrentEstimate] = {}
+    for snapshot in snapshots:
+        if snapshot.id not in pois_by_id:
+            continue
+        current_estimate = _current_estimate_from_snapshot(snapshot, bucket)
+        if current_estimate is not None:
+            current_estimates[snapshot.id] = current_estimate
+    return current_estimates
+
+
+def write_histogram_estimates(
+    writes: List[Tuple[str, Optional[Any], CurrentEstimate]]
+) -> bool:
+    """
+    Write back current estimates recomputed from the histograms in a single batch, best
+    effort. A write only goes through if the document did not change since it was read,
+    so that it never overwrites the estimate of a wait time submission made in between:
+    missing documents are created and the others are updated with a precondition on their
+    update time. A batch that fails is dropped, the next read of its stale estimates
+    recomputes them.
+
+    :param writes: (POI ID, current_estimate snapshot read or None, recomputed estimate)
+        of at most MAX_BATCH_WRITES estimates
+    :return: True if the batch was committed
+    """
+    try:
+        db = firestore_db()
+        batch = db.batch()
+        for poi_id, snapshot, current_estimate in writes:
+            _add_histogram_estimate_write(
+                db,
+                batch,
+                current_estimate_collection().document(poi_id),
+                snapshot,
+                current_estimate,
+            )
+        batch.commit()
+        return True
+    except ESTIMATE_WRITE_CONFLICTS:
+        # Another process or a submission wrote one of the estimates since it was read
+        logger.info(f"Dropped a batch of {len(writes)} histogram estimates")
+    except Exception:
+        logger.exception(f"Failed to write {len(writes)} histogram estimates")
+    return False
+
+
+def _add_histogram_estimate_write(
+    db, batch, ref, snapshot: Optional[Any], current_estimate: CurrentEstimate
+):
+    """Add the write of a histogram estimate to a batch"""
+    if snapshot is not None and snapshot.exists:
+        batch.update(
+            ref,
+            current_estimate.to_dict(),
+            option=db.write_option(last_update_time=snapshot.update_time),
+        )
+    else:
+        batch.create(ref, current_estimate.to_dict())
+
+
+class HistogramEstimateWriter:
+    """
+    Writes back the current estimates recomputed from the histograms in the background, so
+    that the first reads after the hour rolls over, which find every estimate stale, do not
+    wait on the writes. The latest estimate of every POI waits until the flusher thread
+    writes it in a batch of at most MAX_BATCH_WRITES (see write_histogram_estimates).
+
+    The writer is started with the background services. When it is not running (e.g. in
+    tests or scripts) the estimates are written synchronously.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        # POI ID -> (current_estimate snapshot read or None, recomputed estimate)
+        self._pending: Dict[str, Tuple[Optional[Any], CurrentEstimate]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the flusher thread."""
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="qtime-estimate-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread once the waiting estimates are written."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join()
+        self._flush()
+
+    def submit(self, estimates: Dict[str, Tuple[Optional[Any], CurrentEstimate]]):
+        """
+        Write back recomputed estimates. An estimate replaces the one of the same POI that
+        is still waiting.
+
+        :param estimates: POI ID -> (current_estimate snapshot read or None, recomputed
+            estimate) of every estimate to write
+        """
+        with self._lock:
+            self._pending.update(estimates)
+            self.submitted += len(estimates)
+        if self.is_running():
+            self._wakeup.set()
+        else:
+            self._flush()
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the writer"""
+        with self._lock:
+            return {
+                "running": self.is_running(),
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+            }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self._flush()
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                poi_ids = list(self._pending)[:MAX_BATCH_WRITES]
+                if not poi_ids:
+                    return
+                writes = [(poi_id, *self._pending.pop(poi_id)) for poi_id in poi_ids]
+            written = write_histogram_estimates(writes)
+            with self._lock:
+                if written:
+                    self.written += len(writes)
+                else:
+                    self.dropped += len(writes)
+
+
+_histogram_estimate_writer = HistogramEstimateWriter()
+
+
+def histogram_estimate_writer() -> HistogramEstimateWriter:
+    """Process-wide writer of the current estimates recomputed from the histograms"""
+    return _histogram_estimate_writer
+
+
+def _histogram_current_estimate(
+    poi_id: str, hourly_estimate: Optional[Any], bucket: str, hour_start: datetime
+) -> CurrentEstimate:
+    """Current estimate of a POI taken from its histogram at the start of the hour"""
+    return CurrentEstimate(
+        poi_id, hourly_estimate, EstimateSource.HISTOGRAM, bucket, hour_start
+    )
+
+
+def _current_estimate_results(
+    current_estimates: Dict[str, CurrentEstimate],
+    pois_by_id: Dict[str, POISummary],
+    current_minute: int,
+    now: datetime,
+) -> Dict[str, Tuple[float, int]]:
+    """Map each POI id to its (estimate, minutes since last update)"""
+    return {
+        poi_id: (
+            _current_estimate_value(
+                current_estimate,
+                pois_by_id[poi_id].classification.value,
+                current_minute,
             ),
-            key=lambda x: x["time"],
+            current_estimate.minutes_since_update(now),
         )
+        for poi_id, current_estimate in current_estimates.items()
+    }
+
+
+def record_wait_time_submission(
+    poi_id: str, time_estimate: float, now: Optional[datetime] = None
+) -> None:
+    """
+    Add a wait time submission to the submission stats of a POI and recompute its current
+    estimate, the average of the submissions made during the current hour. The stats are a
+    sharded counter so that a burst of submissions to a POI does not contend on a single
+    document, and the current estimate is rewritten at most once every
+    CURRENT_ESTIMATE_WRITE_INTERVAL_SECONDS per POI (see _claim_estimate_write).
+
+    :param poi_id: ID of the POI
+    :param time_estimate: Submitted wait time estimate
+    :param now: Time of the submission (Optional)
+    """
+    now = now or datetime.now(timezone.utc)
+    _, _, _, hour_start = _current_hour_bucket(now)
+    bucket = estimate_bucket(hour_start)
+    submission_counter(poi_id, hour_start).increment(
+        {SUBMISSION_COUNT_FIELD: 1, SUBMISSION_SUM_FIELD: time_estimate}
     )
+    after_commit(lambda: _submission_recorded(poi_id, hour_start, bucket, now))
 
 
-def fetch_latest_estimated_value(
-    poi_name: str,
-    classification: str,
-    day: str = "",
-    current_hour: int = 0,
-    current_minute: int = 0,
-) -> int:
+def submission_counter(poi_id: str, hour_start: datetime, collection=None):
     """
-    Returns the estimated wait time/occupancy of a specified POI
+    Sharded counter of the count and sum of the wait times submitted to a POI during an
+    hour, stored in current_estimate/{poi_id}/submission_stats/{hour}.
 
-    :param poi_name: Name of the point of interest (also known as the POI id)
-    :param day: Specific day to get the wait time/occupancy histogram from (Optional)
-    :param current_hour: The hours of the day in 24hr format (Optional)
-    :param current_minute: The minute of the day (Optional)
+    :param poi_id: ID of the POI
+    :param hour_start: Start of the hour in US/Eastern (see _current_hour_bucket)
+    :param collection: current_estimate collection of the client to use (Optional)
     """
-    wait_time_estimate = 0
-    # histogram_instance = histogram_for_POI(poi_name)
-    # histogram_dict = histogram_instance.to_dict()
-    # histogram_data = histogram_dict["histogram_data"]
+    collection = collection or current_estimate_collection()
+    return ShardedCounter(
+        collection.document(poi_id)
+        .collection(SUBMISSION_STATS_COLLECTION)
+        .document(estimate_bucket(hour_start)),
+        SUBMISSION_STATS_SHARDS,
+    )
 
-    est = pytz.timezone("US/Eastern")
-    now = datetime.now().astimezone(est)
 
-    if day == "":
-        day = now.strftime("%A")
+def _submission_recorded(poi_id: str, hour_start: datetime, bucket: str, now: datetime):
+    if _claim_estimate_write(poi_id, hour_start, bucket, now):
+        _write_current_estimate(poi_id, hour_start, bucket, now)
+
 
-    if current_hour == 0:
-        current_hour = int(now.strftime("%H"))
-    if current_minute == 0:
-        current_minute = int(now.strftime("%M"))
+def _write_current_estimate(
+    poi_id: str, hour_start: datetime, bucket: str, now: datetime
+):
+    """Materialize the current estimate of a POI from its submission stats"""
+    totals = submission_counter(poi_id, hour_start).totals(fresh=True)
+    set_document(
+        current_estimate_collection().document(poi_id),
+        _submissions_estimate(poi_id, totals, bucket, now).to_dict(),
+    )
 
+
+def _claim_estimate_write(
+    poi_id: str, hour_start: datetime, bucket: str, now: datetime
+) -> bool:
+    """
+    Returns True if the current estimate of a POI should be rewritten right away after a
+    submission. Otherwise the estimate was rewritten less than
+    CURRENT_ESTIMATE_WRITE_INTERVAL_SECONDS ago and a single trailing rewrite, which sees
+    every submission made until then, is scheduled at the end of the interval.
+    """
+    with _estimate_writes_lock:
+        if poi_id in _pending_estimate_writes:
+            _pending_estimate_writes[poi_id] = (hour_start, bucket, now)
+            return False
+        elapsed = time.monotonic() - _estimate_writes.get(poi_id, -math.inf)
+        if elapsed >= CURRENT_ESTIMATE_WRITE_INTERVAL_SECONDS:
+            _estimate_writes[poi_id] = time.monotonic()
+            return True
+        _pending_estimate_writes[poi_id] = (hour_start, bucket, now)
+    timer = threading.Timer(
+        CURRENT_ESTIMATE_WRITE_INTERVAL_SECONDS - elapsed,
+        _flush_estimate_write,
+        (poi_id,),
+    )
+    timer.daemon = True
+    timer.start()
+    return False
+
+
+def _flush_estimate_write(poi_id: str):
+    with _estimate_writes_lock:
+        hour_start, bucket, now = _pending_estimate_writes.pop(poi_id)
+        _estimate_writes[poi_id] = time.monotonic()
     try:
-        histogram_hourly_data = (
-            histogram_collection()
-            .document(poi_name)
-            .collection("histogram_data")
-            .document(day)
-            .get()
-            .to_dict()["hours"]
-        )
-    except Exception as e:
-        return wait_time_estimate
+        _write_current_estimate(poi_id, hour_start, bucket, now)
+    except Exception:
+        logger.exception(f"Failed to write the current estimate of {poi_id}")
+
 
-    # if day not in histogram_data:
-    #     return wait_time_estimate
+def estimates_max_age(now: Optional[datetime] = None) -> int:
+    """
+    Returns the number of seconds until the estimates change on their own, when the hour
+    bucket rolls over or when the peak adjustment starts or ends. Wait time submissions
+    can change them sooner.
+
+    :param now: Current time (Optional)
+    """
+    now = now or datetime.now(timezone.utc)
+    hour_start, window_end = _estimates_window(now)
+    seconds_left = (
+        window_end * 60 - (now - hour_start.astimezone(timezone.utc)).total_seconds()
+    )
+    return max(0, math.ceil(seconds_left))
 
-    # histogram_hourly_data = histogram_data[day]["hours"]
 
-    if str(current_hour) in histogram_hourly_data:
-        wait_time_estimate = histogram_hourly_data[str(current_hour)]
-    else:
-        return wait_time_estimate
+def estimates_revision(now: Optional[datetime] = None) -> str:
+    """
+    Returns the name of the window of time in which the estimates do not change on their
+    own (see estimates_max_age), the same in every process. Wait time submissions made
+    during the window are not reflected.
+
+    :param now: Current time (Optional)
+    """
+    hour_start, window_end = _estimates_window(now or datetime.now(timezone.utc))
+    return f"{estimate_bucket(hour_start)}:{window_end}"
+
+
+def _estimates_window(now: datetime) -> Tuple[datetime, int]:
+    """
+    Returns the start of the hour and the minute the current window of the estimates
+    ends at: the start or the end of the peak adjustment, or the end of the hour.
+    """
+    _, _, current_minute, hour_start = _current_hour_bucket(now)
+    if current_minute < PEAK_START_MINUTE:
+        return hour_start, PEAK_START_MINUTE
+    elif current_minute <= PEAK_END_MINUTE:
+        return hour_start, PEAK_END_MINUTE + 1
+    return hour_start, 60
+
+
+def _submissions_estimate(
+    poi_id: str, totals: Dict[str, float], bucket: str, now: datetime
+) -> CurrentEstimate:
+    """
+    Returns the current estimate of a POI computed from its submission stats for the hour.
+
+    :param totals: Totals of the submission counter of the hour (see submission_counter)
+    """
+    submission_count = int(totals.get(SUBMISSION_COUNT_FIELD, 0))
+    return CurrentEstimate(
+        poi_id,
+        totals.get(SUBMISSION_SUM_FIELD, 0) / submission_count
+        if submission_count
+        else None,
+        EstimateSource.SUBMISSIONS,
+        bucket,
+        now,
+        submission_count,
+    )
+
+
+def _current_estimate_from_snapshot(snapshot, bucket: str) -> Optional[CurrentEstimate]:
+    """
+    Returns the current estimate in a current_estimate document snapshot or None if it does
+    not exist, is missing data or was computed for another hour bucket.
+    """
+    if not snapshot.exists:
+        return None
+    try:
+        current_estimate = CurrentEstimate.from_dict(snapshot.to_dict())
+    except common.BadDataError:
+        return None
+    return current_estimate if current_estimate.is_current(bucket) else None
+
+
+def _current_estimate_value(
+    current_estimate: CurrentEstimate, classification: str, current_minute: int
+) -> float:
+    """
+    The estimate to return for a current estimate. Histogram estimates are adjusted for the
+    peak time of the hour, submission averages are rounded to whole numbers.
+    """
+    if current_estimate.estimate is None:
+        return 0
+    if current_estimate.source == EstimateSource.SUBMISSIONS:
+        return round(current_estimate.estimate)
+    return _apply_peak_adjustment(
+        current_estimate.estimate, classification, current_minute
+    )
+
+
+def _current_hour_bucket(now: datetime) -> Tuple[str, int, int, datetime]:
+    """
+    Returns the day, hour and minute of a time in US/Eastern along with the start of the
+    hour.
+
+    :param now: Timezone aware time
+    """
+    local_now = now.astimezone(pytz.timezone("US/Eastern"))
+    return (
+        local_now.strftime("%A"),
+        local_now.hour,
+        local_now.minute,
+        local_now.replace(minute=0, second=0, microsecond=0),
+    )
+
+
+def _histogram_series(histogram_instance: Histogram, day: str = "") -> List[Any]:
+    """
+    Build the list of {"time", "estimate"} pairs of a histogram for a day ordered by time.
+
+    :param histogram_instance: Histogram of the POI
+    :param day: Specific day to get the wait time/occupancy histogram from (Optional)
+    """
+    est = pytz.timezone("US/Eastern")
+    if day == "":
+        day = datetime.now().astimezone(est).strftime("%A")
+
+    if not histogram_instance.has_day(day):
+        return [{"time": 0, "estimate": 0}]
+
+    return histogram_instance.series(day)
+
+
+def _hourly_estimates(
+    poi_ids: List[str], day: str, current_hour: int
+) -> Dict[str, Optional[Any]]:
+    """
+    Returns the histogram estimate of many POIs for an hour of a day, or None for the POIs
+    without data for the hour. The histogram documents are fetched with a single
+    multi-get, plus a second multi-get for the POIs whose histogram still uses the legacy
+    layout.
+
+    :param poi_ids: IDs of the POIs
+    :param day: Day of the week (e.g. "Monday")
+    :param current_hour: The hours of the day in 24hr format
+    """
+    estimates: Dict[str, Optional[Any]] = {poi_id: None for poi_id in poi_ids}
+    if not estimates:
+        return estimates
+
+    refs = [histogram_collection().document(poi_id) for poi_id in estimates]
+    legacy_poi_ids = _read_consolidated_estimates(
+        firestore_db().get_all(refs), estimates, day, current_hour
+    )
+    if not legacy_poi_ids:
+        return estimates
+
+    # Legacy layout, read every histogram_data/{day} document in a second multi-get
+    refs = [_histogram_day_ref(poi_id, day) for poi_id in legacy_poi_ids]
+    _read_legacy_estimates(firestore_db().get_all(refs), estimates, current_hour)
+    return estimates
 
-    # poi_class = histogram_dict["class"]
+
+def _read_consolidated_estimates(
+    snapshots: Iterable[Any],
+    estimates: Dict[str, Optional[Any]],
+    day: str,
+    current_hour: int,
+) -> List[str]:
+    """
+    Fill in the estimates of the POIs with a consolidated histogram from histogram/{poi_id}
+    document snapshots, which hold the whole week.
+
+    :return: IDs of the POIs whose histogram still uses the legacy layout
+    """
+    legacy_poi_ids = []
+    for snapshot in snapshots:
+        poi_id = snapshot.id
+        if poi_id not in estimates:
+            continue
+        histogram_base_dict = snapshot.to_dict() if snapshot.exists else None
+        if histogram_base_dict and Histogram.is_consolidated(histogram_base_dict):
+            estimates[poi_id] = Histogram.from_consolidated_dict(
+                histogram_base_dict
+            ).estimate_at(day, current_hour)
+        else:
+            legacy_poi_ids.append(poi_id)
+    return legacy_poi_ids
+
+
+def _read_legacy_estimates(
+    snapshots: Iterable[Any], estimates: Dict[str, Optional[Any]], current_hour: int
+):
+    """Fill in estimates from histogram/{poi_id}/histogram_data/{day} document snapshots"""
+    for snapshot in snapshots:
+        poi_id = snapshot.reference.parent.parent.id
+        if poi_id not in estimates or not snapshot.exists:
+            continue
+        estimates[poi_id] = (
+            (snapshot.to_dict() or {}).get("hours", {}).get(str(current_hour))
+        )
+
+
+def _apply_peak_adjustment(
+    wait_time_estimate: Any, classification: str, current_minute: int
+) -> Any:
+    """
+    Adjust an hourly estimate for the peak time of the hour.
+
+    :param wait_time_estimate: Estimate for the hour from the histogram
+    :param classification: Classification of the POI ("queue" or "occupancy")
+    :param current_minute: The minute of the day
+    """
     # For wait time queue
     if classification == "queue":
         # Add 5 minutes to queue time during peak times
-        if current_minute >= 20 and current_minute <= 30:
+        if PEAK_START_MINUTE <= current_minute <= PEAK_END_MINUTE:
             wait_time_estimate += 5
     if classification == "occupancy":
         # Add 10% to occupancy during peak times
-        if current_minute >= 20 and current_minute <= 30:
+        if PEAK_START_MINUTE <= current_minute <= PEAK_END_MINUTE:
             wait_time_estimate += 10
 
     return wait_time_estimate
 
 
+def _histogram_day_ref(poi_id: str, day: str):
+    """
+    Reference to the histogram data document of a POI for a given day.
+
+    :param poi_id: ID of the POI
+    :param day: Day of the week (e.g. "Monday")
+    """
+    return _histogram_data_collection(poi_id).document(day)
+
+
+def _histogram_data_collection(poi_id: str):
+    """
+    Reference to the collection of histogram data documents of a POI, one per day.
+
+    :param poi_id: ID of the POI
+    """
+    return histogram_collection().document(poi_id).collection("histogram_data")
+
+
 # Create histogram object
 def histogram_for_POI(poi_id: str) -> Histogram:
     """
-    Returns the Histogram object of the wait time/occupancy for opening hours for a specified POI
+    Returns the Histogram object of the wait time/occupancy for opening hours for a specified POI.
+    Consolidated histograms cost a single read, legacy histograms also stream their
+    histogram_data subcollection.
 
     :param poi_name: Name of the point of interest (also known as the POI id)
     """
     # Getting information from histogram base collection
-    histogram_base_ref = histogram_collection().document(poi_id)
-    histogram_base_doc = histogram_base_ref.get()
+    histogram_base_doc = histogram_collection().document(poi_id).get()
+    if histogram_base_doc.exists and Histogram.is_consolidated(
+        histogram_base_doc.to_dict()
+    ):
+        return Histogram.from_consolidated_dict(histogram_base_doc.to_dict())
+
+    # Getting histogram data for each day for a poi
+    histogram_docs = (
+        _histogram_data_collection(poi_id).stream() if histogram_base_doc.exists else []
+    )
+    return _build_histogram(poi_id, histogram_base_doc, histogram_docs)
+
+
+def _build_histogram(poi_id: str, histogram_base_doc, histogram_docs) -> Histogram:
+    """
+    Build a Histogram object from the histogram base document of a POI and its histogram
+    data documents.
+
+    :param poi_id: ID of the POI
+    :param histogram_base_doc: Snapshot of the histogram/{poi_id} document
+    :param histogram_docs: Snapshots of the histogram/{poi_id}/histogram_data documents
+    :raises POINotFoundError: If the histogram base document does not exist
+    """
     if not histogram_base_doc.exists:
         raise POINotFoundError(poi_id)
     histogram_base_doc_dict = histogram_base_doc.to_dict()
     poi_name = histogram_base_doc_dict["poi_name"]
     class_type = histogram_base_doc_dict["class"]
 
-    # Getting histogram data for each day for a poi
-    histogram_docs = (
-        histogram_collection().document(poi_id).collection("histogram_data").stream()
-    )
     histogram_data_dict = {
         doc.to_dict()["day"]: doc.to_dict() for doc in histogram_docs
     }
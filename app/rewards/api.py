@@ -1,11 +1,17 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import re
 
 from app.common import SimpleMap, BadDataError
-from app.events.service import find_all_reward_events_for_user, generate_referral_event
+from app.events.service import (
+    find_all_reward_events_for_user,
+    generate_referral_event,
+    reward_events_cursor,
+)
 from app.auth import with_auth_user
+from app.unit_of_work import with_unit_of_work
 from app.events.event import Event
+from .ledger import LEDGER_RECENT_ENTRIES, LedgerEntry, RewardLedger, find_ledger
 from app.user.service import find_user_by_referral_code, find_user, update_user
 from app.user.errors import UserNotFoundError
 from app.user.user import User
@@ -25,8 +31,18 @@ class RewardEventApiResponse(SimpleMap):
             event.payload.source.value, event.payload.points_change, event.created
         )
 
+    @staticmethod
+    def from_entry(entry: LedgerEntry) -> "RewardEventApiResponse":
+        # Naive UTC like the datetimes of Event.from_dict
+        return RewardEventApiResponse(
+            entry.source.value,
+            entry.points_change,
+            entry.created.astimezone(timezone.utc).replace(tzinfo=None),
+        )
+
 
 @with_auth_user
+@with_unit_of_work
 def submit_referral_code(user: User, code: str, **kwargs):
     if not re.match(r"^[A-Z]{6}$", code):
         err_msg = "Invalid referral code format, must be 6 capital letters."
@@ -65,14 +81,20 @@ def submit_referral_code(user: User, code: str, **kwargs):
 
 @with_auth_user
 def list_reward_events(
-    user: User, before: Optional[str] = None, limit: int = 30, **kwargs
+    user: User,
+    before: Optional[str] = None,
+    limit: int = 30,
+    cursor: Optional[str] = None,
+    **kwargs,
 ):
     """
     API endpoint to list reward events for a user. Returns a list of reward events in reverse chronological order.
+    The cursor of the next page is returned in the X-Next-Cursor header.
 
     :param user: Firebase user record of the user to list reward events for
-    :param before: Optional datetime query param to start listing reward events before
+    :param before: Optional datetime query param to start listing reward events before, deprecated by cursor
     :param limit: Optional limit query param to limit the number of reward events returned
+    :param cursor: Optional cursor query param of the page to return, from the X-Next-Cursor header of the previous page
     :return: List of reward events for the user
     """
     if limit > 100:
@@ -85,7 +107,42 @@ def list_reward_events(
     except ValueError as e:
         return BadDataError(str(e)).build_error()
 
-    return [
-        RewardEventApiResponse.from_event(e).to_dict()
-        for e in find_all_reward_events_for_user(user.email, limit, before_datetime)
-    ], 200
+    page: Optional[Tuple[List[RewardEventApiResponse], Optional[str]]] = None
+    if before_datetime is None and cursor is None:
+        # The first page is served from the ledger when it holds the whole history
+        ledger = find_ledger(user.email)
+        if ledger is not None and ledger.complete:
+            page = _ledger_page(ledger, limit)
+
+    if page is None:
+        events, next_cursor = find_all_reward_events_for_user(
+            user.email, limit, cursor, before_datetime
+        )
+        page = [RewardEventApiResponse.from_event(e) for e in events], next_cursor
+
+    reward_events, next_cursor = page
+    return (
+        [reward_event.to_dict() for reward_event in reward_events],
+        200,
+        {"X-Next-Cursor": next_cursor} if next_cursor else {},
+    )
+
+
+def _ledger_page(
+    ledger: RewardLedger, limit: int
+) -> Optional[Tuple[List[RewardEventApiResponse], Optional[str]]]:
+    """
+    First page of reward events read from the recent entries of a complete ledger.
+
+    :return: The page and the cursor of the next page, or None if the page has no cursor
+        because its last entry predates the event IDs in the ledger
+    """
+    entries = ledger.recent[:limit]
+    # Fewer recent entries than the ledger keeps means it holds the whole history
+    if len(ledger.recent) <= limit and len(ledger.recent) < LEDGER_RECENT_ENTRIES:
+        next_cursor = None
+    elif entries[-1].event_id is not None:
+        next_cursor = reward_events_cursor(entries[-1].created, entries[-1].event_id)
+    else:
+        return None
+    return [RewardEventApiResponse.from_entry(entry) for entry in entries], next_cursor
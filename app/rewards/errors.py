@@ -11,3 +11,8 @@ class ReferralCodeNotFound(BaseApiError):
 class InvalidReferralOperation(BaseApiError):
     def __init__(self, message: str):
         super().__init__(f"Invalid referral operation. {message}", 400)
+
+
+class ReferralCodePoolExhaustedError(BaseApiError):
+    def __init__(self, message: str):
+        super().__init__(f"No referral code available. {message}", 503)
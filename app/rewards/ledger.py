@@ -0,0 +1,306 @@
+###
+# Materialized reward ledger. The reward_ledger/{email} document of a user holds their
+# balance, the total earned from each RewardSource and their most recent reward entries.
+# It is updated as reward events are written, so the balance and the first page of the
+# reward history cost a single document read instead of a query on the events collection.
+#
+# A reward updates the ledger without reading it: the totals are incremented and the entry
+# is appended to the recent entries with ArrayUnion, so concurrent rewards never overwrite
+# each other. The recent entries are ordered when the ledger is read, and trimmed by
+# find_ledger with ArrayRemove once they hold more than LEDGER_TRIM_ENTRIES, which leaves
+# the entries appended concurrently in place.
+#
+# reconcile_ledgers recomputes every ledger, and the balance of every user, from the
+# events collection. It backfills the ledgers of users created before the ledger existed.
+###
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.cloud.firestore import ArrayRemove, ArrayUnion, Increment
+
+from app.common import BadDataError
+from app.events.event import Event, EventType, RewardSource
+from app.firebase import (
+    firestore_db,
+    EVENTS_COLLECTION,
+    REWARD_LEDGER_COLLECTION,
+    USERS_COLLECTION,
+)
+from app.unit_of_work import set_document, delete_document, MAX_BATCH_WRITES
+
+# Matches the maximum page size of /user/rewards/events
+LEDGER_RECENT_ENTRIES = 100
+# Number of recent entries above which find_ledger trims them to LEDGER_RECENT_ENTRIES
+LEDGER_TRIM_ENTRIES = 2 * LEDGER_RECENT_ENTRIES
+
+
+class LedgerEntry:
+    """Reward points change of a user"""
+
+    def __init__(
+        self,
+        source: RewardSource,
+        points_change: int,
+        created: datetime,
+        event_id: Optional[str] = None,
+    ):
+        """
+        :param source: Source of the reward points
+        :param points_change: The +/- change in reward points
+        :param created: Datetime of the change
+        :param event_id: ID of the reward event document of the change, used to build
+            reward events cursors
+        """
+        self.source = source
+        self.points_change = points_change
+        self.created = created
+        self.event_id = event_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source.value,
+            "points_change": self.points_change,
+            "created": self.created,
+            "event_id": self.event_id,
+        }
+
+    @staticmethod
+    def from_dict(dict: Dict[str, Any]) -> "LedgerEntry":
+        return LedgerEntry(
+            RewardSource(dict["source"]),
+            dict["points_change"],
+            dict["created"],
+            dict.get("event_id"),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, LedgerEntry) and self.to_dict() == other.to_dict()
+
+
+class RewardLedger:
+    def __init__(
+        self,
+        email: str,
+        balance: int = 0,
+        sources: Optional[Dict[str, int]] = None,
+        recent: Optional[List[LedgerEntry]] = None,
+        complete: bool = False,
+    ):
+        """
+        :param email: Email of the user
+        :param balance: Sum of the reward points changes of the user
+        :param sources: Sum of the reward points changes of each RewardSource value
+        :param recent: Most recent entries, newest first (see newest_first)
+        :param complete: Whether the ledger holds the whole history of the user. Ledgers
+            created by an update for a user with prior history are incomplete until they
+            are reconciled
+        """
+        self.email = email
+        self.balance = balance
+        self.sources = sources or {}
+        self.recent = recent or []
+        self.complete = complete
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "balance": self.balance,
+            "sources": self.sources,
+            "recent": [entry.to_dict() for entry in self.recent],
+            "complete": self.complete,
+        }
+
+    @staticmethod
+    def from_dict(email: str, dict: Dict[str, Any]) -> "RewardLedger":
+        """
+        Creates a new RewardLedger from the dictionary of a ledger document
+
+        :raises BadDataError: If required data is missing from the dictionary
+        """
+        try:
+            return RewardLedger(
+                email,
+                dict["balance"],
+                dict.get("sources", {}),
+                newest_first(
+                    LedgerEntry.from_dict(entry) for entry in dict.get("recent", [])
+                ),
+                dict.get("complete", False),
+            )
+        except (KeyError, ValueError) as e:
+            raise BadDataError("Missing data from reward ledger data: " + str(e))
+
+    @staticmethod
+    def from_events(email: str, events: Iterable[Tuple[str, Event]]) -> "RewardLedger":
+        """
+        Compute the complete ledger of a user from their reward events
+
+        :param email: Email of the user
+        :param events: Document ID and event of every reward points add event of the user
+        """
+        ledger = RewardLedger(email, complete=True)
+        entries = []
+        for event_id, event in events:
+            payload = event.payload
+            ledger.balance += payload.points_change
+            source = payload.source.value
+            ledger.sources[source] = (
+                ledger.sources.get(source, 0) + payload.points_change
+            )
+            entries.append(
+                LedgerEntry(
+                    payload.source, payload.points_change, event.created, event_id
+                )
+            )
+        ledger.recent = newest_first(entries)[:LEDGER_RECENT_ENTRIES]
+        return ledger
+
+
+def newest_first(entries: Iterable[LedgerEntry]) -> List[LedgerEntry]:
+    """Sort ledger entries in the order of the reward events query, newest first"""
+    return sorted(
+        entries,
+        key=lambda entry: (_utc(entry.created), entry.event_id or ""),
+        reverse=True,
+    )
+
+
+def find_ledger(email: str) -> Optional[RewardLedger]:
+    """
+    Get the reward ledger of a user, with at most LEDGER_RECENT_ENTRIES recent entries.
+    The older entries are removed from the ledger document once there are more than
+    LEDGER_TRIM_ENTRIES.
+
+    :param email: Email of the user
+    :return: The ledger of the user or None if the user has no ledger yet
+    :raises BadDataError: If the ledger document is missing essential data
+    """
+    ledger_ref = ledger_collection().document(email)
+    snapshot = ledger_ref.get()
+    if not snapshot.exists:
+        return None
+    ledger = RewardLedger.from_dict(email, snapshot.to_dict())
+    if len(ledger.recent) > LEDGER_TRIM_ENTRIES:
+        old_entries = ledger.recent[LEDGER_RECENT_ENTRIES:]
+        ledger_ref.update(
+            {"recent": ArrayRemove([entry.to_dict() for entry in old_entries])}
+        )
+    ledger.recent = ledger.recent[:LEDGER_RECENT_ENTRIES]
+    return ledger
+
+
+def create_ledger(email: str):
+    """
+    Create the empty, complete, ledger of a new user
+
+    :param email: Email of the new user
+    """
+    set_document(
+        ledger_collection().document(email),
+        RewardLedger(email, complete=True).to_dict(),
+    )
+
+
+def delete_ledger(email: str):
+    """
+    Delete the ledger of a user
+
+    :param email: Email of the deleted user
+    """
+    delete_document(ledger_collection().document(email))
+
+
+def record_reward(
+    email: str,
+    source: RewardSource,
+    points_change: int,
+    created: Optional[datetime] = None,
+    event_id: Optional[str] = None,
+):
+    """
+    Add a reward points change to the ledger of a user, in the current unit of work if
+    there is one. The ledger is not read, see ledger_update.
+
+    :param email: Email of the user
+    :param source: Source of the reward points
+    :param points_change: The +/- change in reward points
+    :param created: Datetime of the change (Optional)
+    :param event_id: ID of the reward event document of the change (Optional)
+    """
+    set_document(
+        ledger_collection().document(email),
+        ledger_update(
+            LedgerEntry(
+                source,
+                points_change,
+                created or datetime.now(timezone.utc),
+                event_id,
+            )
+        ),
+        merge=True,
+    )
+
+
+def ledger_update(entry: LedgerEntry) -> Dict[str, Any]:
+    """
+    Fields to merge into a ledger document to add an entry. The totals are incremented
+    and the entry appended to the recent entries atomically, so that concurrent updates
+    all apply.
+
+    :param entry: Entry to add
+    """
+    return {
+        "balance": Increment(entry.points_change),
+        "sources": {entry.source.value: Increment(entry.points_change)},
+        "recent": ArrayUnion([entry.to_dict()]),
+    }
+
+
+def reconcile_ledgers() -> int:
+    """
+    Recompute the ledger and the reward point balance of every user from the reward
+    events. Ledgers are replaced, so it should not run while rewards are being given.
+
+    :return: Number of users reconciled
+    """
+    db = firestore_db()
+    events_by_user: Dict[str, List[Tuple[str, Event]]] = {}
+    reward_events = (
+        db.collection(EVENTS_COLLECTION)
+        .where("type", "==", EventType.REWARD_POINTS_ADD.value)
+        .stream()
+    )
+    for doc in reward_events:
+        event = Event.from_dict(doc.to_dict())
+        events_by_user.setdefault(event.user, []).append((doc.id, event))
+
+    batch = db.batch()
+    batch_writes = 0
+    users_reconciled = 0
+    # Only users that still exist, the events of deleted accounts are being deleted
+    for user_doc in db.collection(USERS_COLLECTION).select([]).stream():
+        ledger = RewardLedger.from_events(
+            user_doc.id, events_by_user.get(user_doc.id, [])
+        )
+        batch.set(ledger_collection().document(user_doc.id), ledger.to_dict())
+        batch.set(
+            user_doc.reference, {"reward_point_balance": ledger.balance}, merge=True
+        )
+        batch_writes += 2
+        users_reconciled += 1
+        if batch_writes >= MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+            batch_writes = 0
+    if batch_writes:
+        batch.commit()
+    return users_reconciled
+
+
+def ledger_collection():
+    return firestore_db().collection(REWARD_LEDGER_COLLECTION)
+
+
+def _utc(created: datetime) -> datetime:
+    """Event.from_dict returns naive datetimes for Firestore timestamps"""
+    return created if created.tzinfo else created.astimezone(timezone.utc)
@@ -0,0 +1,336 @@
+###
+# Pool of referral codes reserved ahead of signups. Every referral code has a
+# referral_codes/{code} document, so a code is reserved by creating its document in a
+# transaction that reads a batch of random candidates and creates the ones that are free.
+# A reserved code has no owner until save_referral_code assigns it to the new user, and
+# records when it was reserved.
+#
+# Each process keeps up to REFERRAL_CODE_POOL_SIZE reserved codes and a refiller thread
+# reserves more when fewer than REFERRAL_CODE_POOL_LOW_WATER remain, so that taking a code
+# for a signup never waits on Firestore. A process that was not started (e.g. scripts)
+# reserves codes on demand. The codes left in the pool are released when it stops, and a
+# code taken for a signup that fails is released by the signup.
+#
+# Reservations leaked anyway (e.g. by a process that died) are reclaimed once they are
+# older than REFERRAL_CODE_RESERVATION_TTL_SECONDS, by the refiller thread of every pool
+# and by the --backfill-referral-code-owners script. A pool only hands out codes reserved
+# less than half that long ago, so a code it takes is never being reclaimed.
+###
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from app.firebase import firestore_db, REFERRAL_CODES_COLLECTION
+from .errors import ReferralCodePoolExhaustedError
+
+REFERRAL_CODE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+REFERRAL_CODE_LENGTH = 6
+REFERRAL_CODE_POOL_SIZE = 50
+REFERRAL_CODE_POOL_LOW_WATER = 10
+# Reservation transactions tried before giving up on taking a code
+REFERRAL_CODE_RESERVE_ATTEMPTS = 5
+# Field of a referral_codes document holding the email of the user owning the code
+OWNER_FIELD = "owner"
+# Field of a referral_codes document holding the time an unowned code was reserved
+RESERVED_AT_FIELD = "reserved_at"
+# Age after which a reservation that was never assigned an owner is deleted
+REFERRAL_CODE_RESERVATION_TTL_SECONDS = 24 * 60 * 60
+# Time between two reclaims of the stale reservations by the refiller thread
+REFERRAL_CODE_RECLAIM_INTERVAL_SECONDS = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class ReferralCodePool:
+    def __init__(
+        self,
+        size: int = REFERRAL_CODE_POOL_SIZE,
+        low_water: int = REFERRAL_CODE_POOL_LOW_WATER,
+    ):
+        """
+        :param size: Number of codes reserved by a refill
+        :param low_water: Number of codes left below which the pool is refilled
+        """
+        self.size = size
+        self.low_water = low_water
+        self.taken = 0
+        self.reserved = 0
+        self.collisions = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.empty_takes = 0
+        self.expired = 0
+        self.released = 0
+        self.reclaimed = 0
+        self._lock = threading.Lock()
+        # Only one refill at a time, a concurrent caller waits for it
+        self._refill_lock = threading.Lock()
+        # (code, monotonic time the code was reserved), oldest first
+        self._codes: Deque[Tuple[str, float]] = deque()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Fill the pool and start refilling it in the background."""
+        self._refill_safely()
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="qtime-referral-pool", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop refilling the pool and release the codes left in it."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join()
+        self.release()
+
+    def take(self) -> str:
+        """
+        Take a reserved referral code, to be assigned to a user with save_referral_code.
+
+        :return: A referral code no other user has
+        :raises ReferralCodePoolExhaustedError: If the pool is empty and no code could be
+            reserved
+        """
+        for _ in range(REFERRAL_CODE_RESERVE_ATTEMPTS):
+            expired = self._drop_expired()
+            if expired:
+                _delete_codes(expired)
+            with self._lock:
+                if self._codes:
+                    code, _ = self._codes.popleft()
+                    self.taken += 1
+                    if len(self._codes) < self.low_water:
+                        self._wakeup.set()
+                    return code
+                self.empty_takes += 1
+            self.refill()
+        raise ReferralCodePoolExhaustedError("Try again later.")
+
+    def refill(self) -> int:
+        """
+        Reserve codes until the pool holds size codes.
+
+        :return: Number of codes reserved
+        """
+        with self._refill_lock:
+            with self._lock:
+                missing = self.size - len(self._codes)
+                pooled = {code for code, _ in self._codes}
+            if missing <= 0:
+                return 0
+            candidates: Set[str] = set()
+            while len(candidates) < missing:
+                code = _random_code()
+                if code not in pooled:
+                    candidates.add(code)
+            reserved_at = time.monotonic()
+            codes = _reserve_codes(
+                firestore_db().transaction(),
+                [_referral_code_ref(code) for code in sorted(candidates)],
+            )
+            with self._lock:
+                self._codes.extend((code, reserved_at) for code in codes)
+                self.reserved += len(codes)
+                self.collisions += len(candidates) - len(codes)
+                self.refills += 1
+            return len(codes)
+
+    def release(self):
+        """Delete the referral_codes documents of the codes left in the pool."""
+        with self._lock:
+            codes = [code for code, _ in self._codes]
+            self._codes.clear()
+        if codes:
+            _delete_codes(codes)
+
+    def release_code(self, code: str):
+        """
+        Release a code taken from the pool that was not assigned to a user, e.g. because
+        the signup failed. Its referral_codes document is deleted if it still has no owner.
+        Errors are logged, the code is then reclaimed once its reservation expires.
+
+        :param code: The referral code
+        """
+        try:
+            if _release_code(firestore_db().transaction(), _referral_code_ref(code)):
+                with self._lock:
+                    self.released += 1
+        except Exception:
+            logger.exception(f"Failed to release the referral code {code}")
+
+    def reclaim(self) -> int:
+        """
+        Delete the reservations older than REFERRAL_CODE_RESERVATION_TTL_SECONDS that were
+        never assigned to a user, see reclaim_stale_reservations.
+
+        :return: Number of reservations deleted
+        """
+        reclaimed = reclaim_stale_reservations()
+        with self._lock:
+            self.reclaimed += reclaimed
+        return reclaimed
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the pool"""
+        return {
+            "size": len(self._codes),
+            "taken": self.taken,
+            "reserved": self.reserved,
+            "collisions": self.collisions,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "empty_takes": self.empty_takes,
+            "expired": self.expired,
+            "released": self.released,
+            "reclaimed": self.reclaimed,
+        }
+
+    def _run(self):
+        next_reclaim = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(max(0.0, next_reclaim - time.monotonic()))
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            if time.monotonic() >= next_reclaim:
+                next_reclaim = time.monotonic() + REFERRAL_CODE_RECLAIM_INTERVAL_SECONDS
+                try:
+                    self.reclaim()
+                except Exception:
+                    logger.exception("Failed to reclaim the stale referral codes")
+            self._refill_safely()
+
+    def _drop_expired(self) -> List[str]:
+        """
+        Remove the codes reserved more than half of REFERRAL_CODE_RESERVATION_TTL_SECONDS
+        ago from the pool, so that a code is never handed out while it may be reclaimed.
+
+        :return: The removed codes
+        """
+        max_age = REFERRAL_CODE_RESERVATION_TTL_SECONDS / 2
+        expired = []
+        with self._lock:
+            while self._codes and time.monotonic() - self._codes[0][1] > max_age:
+                expired.append(self._codes.popleft()[0])
+            self.expired += len(expired)
+        return expired
+
+    def _refill_safely(self):
+        try:
+            self.refill()
+        except Exception:
+            logger.exception("Failed to refill the referral code pool")
+            self.refill_failures += 1
+
+
+@firestore.transactional
+def _reserve_codes(transaction, code_refs) -> List[str]:
+    """
+    Create the referral_codes documents of the candidate codes that do not exist yet.
+
+    :param code_refs: References of the referral_codes documents of the candidates
+    :return: The reserved codes
+    """
+    free = [
+        snapshot.reference
+        for snapshot in transaction.get_all(code_refs)
+        if not snapshot.exists
+    ]
+    for code_ref in free:
+        transaction.create(
+            code_ref, {OWNER_FIELD: None, RESERVED_AT_FIELD: firestore.SERVER_TIMESTAMP}
+        )
+    return [code_ref.id for code_ref in free]
+
+
+@firestore.transactional
+def _release_code(transaction, code_ref) -> bool:
+    """
+    Delete the referral_codes document of a reserved code if it still has no owner.
+
+    :param code_ref: Reference of the referral_codes document of the code
+    :return: True if the document was deleted
+    """
+    snapshot = code_ref.get(transaction=transaction)
+    if not snapshot.exists or (snapshot.to_dict() or {}).get(OWNER_FIELD) is not None:
+        return False
+    transaction.delete(code_ref)
+    return True
+
+
+def reclaim_stale_reservations(
+    ttl_seconds: float = REFERRAL_CODE_RESERVATION_TTL_SECONDS,
+) -> int:
+    """
+    Delete the referral_codes documents of the codes reserved more than ttl_seconds ago
+    that were never assigned to a user, e.g. the reservations of a process that died. A
+    code assigned to a user after it was read is not deleted.
+
+    :param ttl_seconds: Age after which an unowned reservation is deleted
+    :return: Number of reservations deleted
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+    stale = (
+        firestore_db()
+        .collection(REFERRAL_CODES_COLLECTION)
+        .where(RESERVED_AT_FIELD, "<", cutoff)
+        .stream()
+    )
+    reclaimed = 0
+    for snapshot in stale:
+        if (snapshot.to_dict() or {}).get(OWNER_FIELD) is not None:
+            continue
+        try:
+            snapshot.reference.delete(
+                option=firestore_db().write_option(
+                    last_update_time=snapshot.update_time
+                )
+            )
+            reclaimed += 1
+        except (FailedPrecondition, NotFound):
+            pass  # Assigned or released since it was read
+    return reclaimed
+
+
+def _delete_codes(codes: List[str]):
+    """Delete the referral_codes documents of reserved codes that are in no pool"""
+    try:
+        batch = firestore_db().batch()
+        for code in codes:
+            batch.delete(_referral_code_ref(code))
+        batch.commit()
+    except Exception:
+        logger.exception(f"Failed to release {len(codes)} pooled referral codes")
+
+
+def _random_code() -> str:
+    return "".join(random.choices(REFERRAL_CODE_CHARS, k=REFERRAL_CODE_LENGTH))
+
+
+def _referral_code_ref(code: str):
+    return firestore_db().collection(REFERRAL_CODES_COLLECTION).document(code)
+
+
+_pool = ReferralCodePool()
+
+
+def referral_code_pool() -> ReferralCodePool:
+    """Process-wide pool of reserved referral codes"""
+    return _pool
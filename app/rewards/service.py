@@ -1,58 +1,103 @@
-import random
+from typing import Optional
 
-from app.firebase import firestore_db, REFERRAL_CODES_COLLECTION
+from app.firebase import firestore_db, REFERRAL_CODES_COLLECTION, USERS_COLLECTION
+from app.unit_of_work import set_document, delete_document, MAX_BATCH_WRITES
+from .referral_pool import referral_code_pool, OWNER_FIELD
 
 
 def create_unique_referral_code() -> str:
     """
-    Create a unique 6 character referral code.
+    Create a unique 6 character referral code, taken from the pool of reserved codes.
 
     :return: A unique 6 character referral code.
+    :raises ReferralCodePoolExhaustedError: If no referral code could be reserved
     """
-    CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    code = _generate_unique_code(CHARS, 6)
-    while _referral_code_exists(code):
-        code = _generate_unique_code(CHARS, 6)
-    return code
+    return referral_code_pool().take()
 
 
-def save_referral_code(code: str):
+def release_referral_code(code: str):
     """
-    Add a new referral code to the referral codes collection
+    Release a referral code created with create_unique_referral_code that could not be
+    assigned to its user. Nothing is done if the code already has an owner.
 
-    :param code: The referral code to add
+    :param code: The referral code to release
     """
-    firestore_db().collection(REFERRAL_CODES_COLLECTION).document(code).set({})
+    referral_code_pool().release_code(code)
 
 
-def delete_referral_code(code: str):
+def save_referral_code(code: str, owner: str):
     """
-    Deletes a referral code from the referral codes collection
+    Assign a referral code to the user owning it
 
-    :param code: The referral code to delete
+    :param code: The referral code to assign
+    :param owner: Email of the user owning the referral code
     """
-    firestore_db().collection(REFERRAL_CODES_COLLECTION).document(code).delete()
+    set_document(referral_codes_collection().document(code), {OWNER_FIELD: owner})
 
 
-def _generate_unique_code(CHARS: str, length: int) -> str:
+def find_referral_code_owner(code: str) -> Optional[str]:
     """
-    Generate a unique code from a set of characters.
+    Find the user owning a referral code.
 
-    :param CHARS: String with the characters to generate the code from.
-    :param length: The length of the code to generate.
-    :return: A unique code of given length.
+    :param code: The referral code
+    :return: Email of the user owning the referral code, or None if no user owns it
     """
-    return "".join(random.choices(CHARS, k=length))
+    snapshot = referral_codes_collection().document(code).get()
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict() or {}
+    if OWNER_FIELD in data:
+        return data[OWNER_FIELD]
+    # Codes saved before their owner was stored, see backfill_referral_code_owners
+    users = (
+        firestore_db()
+        .collection(USERS_COLLECTION)
+        .where("referral_code", "==", code)
+        .limit(1)
+        .get()
+    )
+    return users[0].id if users else None
+
 
+def delete_referral_code(code: str):
+    """
+    Deletes a referral code from the referral codes collection
 
-def _referral_code_exists(code: str) -> bool:
+    :param code: The referral code to delete
     """
-    Check if a referral code exists in the database.
+    delete_document(referral_codes_collection().document(code))
 
-    :param code: The referral code to check.
-    :return: True if the referral code exists, False otherwise.
+
+def backfill_referral_code_owners() -> int:
     """
+    Store the owner of the referral code of every user in its referral_codes document.
 
-    return (
-        firestore_db().collection(REFERRAL_CODES_COLLECTION).document(code).get().exists
-    )
+    :return: Number of referral codes updated
+    """
+    db = firestore_db()
+    batch = db.batch()
+    batch_writes = 0
+    codes_updated = 0
+    users = db.collection(USERS_COLLECTION).select(["referral_code"]).stream()
+    for user_doc in users:
+        code = (user_doc.to_dict() or {}).get("referral_code")
+        if not code:
+            continue
+        batch.set(
+            referral_codes_collection().document(code),
+            {OWNER_FIELD: user_doc.id},
+            merge=True,
+        )
+        batch_writes += 1
+        codes_updated += 1
+        if batch_writes >= MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+            batch_writes = 0
+    if batch_writes:
+        batch.commit()
+    return codes_updated
+
+
+def referral_codes_collection():
+    return firestore_db().collection(REFERRAL_CODES_COLLECTION)
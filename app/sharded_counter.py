@@ -0,0 +1,240 @@
+###
+# Sharded counters. Firestore only sustains about one write per second to a single document,
+# so a counter incremented by many concurrent requests (e.g. the wait time submissions to a
+# popular POI at peak hour) is split over num_shards shard documents, stored in the shards
+# subcollection of the counter document. An increment goes to a random shard as an atomic
+# Increment, and the value of the counter is the sum of its shards.
+#
+# The sums read by a process are cached for COUNTER_CACHE_TTL_SECONDS, and the increments
+# made by the process are added to its cached sums once committed, so that a read right after
+# a write sees it. Increments made by other processes are seen once the cached sums expire.
+###
+
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from google.cloud.firestore import Increment
+
+from app.unit_of_work import set_document, delete_document, after_commit
+
+DEFAULT_NUM_SHARDS = 10
+COUNTER_CACHE_TTL_SECONDS = 5.0
+COUNTER_CACHE_MAX_SIZE = 10_000
+SHARDS_COLLECTION = "shards"
+
+Number = Union[int, float]
+
+
+class ShardedCounter:
+    """
+    Named values, e.g. {"count": 3, "sum": 27}, stored in the shards of a counter document.
+    The counter document itself is never written and does not need to exist.
+    """
+
+    def __init__(self, counter_ref, num_shards: int = DEFAULT_NUM_SHARDS):
+        """
+        :param counter_ref: Reference of the counter document
+        :param num_shards: Number of shards, fixed for the lifetime of the counter. A
+            shard takes about one write per second
+        """
+        self.counter_ref = counter_ref
+        self.num_shards = num_shards
+
+    def shard_ref(self, index: int):
+        """
+        Reference of a shard document.
+
+        :param index: Index of the shard, from 0 to num_shards - 1
+        """
+        return self.counter_ref.collection(SHARDS_COLLECTION).document(str(index))
+
+    def increment(self, deltas: Dict[str, Number]):
+        """
+        Add to the values of the counter, in the current unit of work if there is one.
+
+        :param deltas: Amount to add to each value
+        """
+        set_document(self._random_shard_ref(), _shard_update(deltas), merge=True)
+        after_commit(lambda: counter_cache().add(self._key(), deltas))
+
+    def totals(self, fresh: bool = False) -> Dict[str, Number]:
+        """
+        Values of the counter, the sums of the values of its shards.
+
+        :param fresh: Whether to read the shards even if the sums are cached
+        :return: Value of every field of the shards, values never incremented are missing
+        """
+        if not fresh:
+            cached = counter_cache().get(self._key())
+            if cached is not None:
+                return cached
+        version = counter_cache().version(self._key())
+        totals = _sum_shards(
+            shard.to_dict()
+            for shard in self.counter_ref.collection(SHARDS_COLLECTION).stream()
+        )
+        counter_cache().put(self._key(), totals, version)
+        return totals
+
+    def delete(self):
+        """Delete the shards of the counter, in the current unit of work if there is one."""
+        for index in range(self.num_shards):
+            delete_document(self.shard_ref(index))
+        after_commit(lambda: counter_cache().invalidate(self._key()))
+
+    def _random_shard_ref(self):
+        return self.shard_ref(random.randrange(self.num_shards))
+
+    def _key(self) -> str:
+        return self.counter_ref.path
+
+
+class CounterCache:
+    def __init__(
+        self,
+        max_size: int = COUNTER_CACHE_MAX_SIZE,
+        ttl_seconds: float = COUNTER_CACHE_TTL_SECONDS,
+    ):
+        """
+        :param max_size: Maximum number of cached counters
+        :param ttl_seconds: Time after which the shards of a cached counter are read again
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Counter path -> (sums, expiry), least recently used first
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Number], float]]" = (
+            OrderedDict()
+        )
+        # Counter path -> version of its last local increment or invalidation, oldest first
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Versions older than this one may have been dropped from _versions
+        self._forgotten_version = 0
+        self._version = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Number]]:
+        """
+        Get the cached sums of a counter.
+
+        :param key: Path of the counter document
+        :return: A copy of the sums, or None if they are not cached or have expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def version(self, key: str) -> int:
+        """
+        Version of a counter, to be taken before reading its shards and passed to put.
+
+        :param key: Path of the counter document
+        """
+        with self._lock:
+            return self._versions.get(key, self._forgotten_version)
+
+    def put(self, key: str, totals: Dict[str, Number], version: int):
+        """
+        Cache the sums read from the shards of a counter.
+
+        :param key: Path of the counter document
+        :param totals: Sums of the shards
+        :param version: Version of the counter before its shards were read. The sums are
+            not cached if the counter was incremented by this process since, as the read
+            may predate the increment
+        """
+        with self._lock:
+            if self._versions.get(key, self._forgotten_version) != version:
+                return
+            self._entries[key] = (dict(totals), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key: str, deltas: Dict[str, Number]):
+        """
+        Add a committed increment to the cached sums of a counter.
+
+        :param key: Path of the counter document
+        :param deltas: Amount added to each value
+        """
+        with self._lock:
+            self._bump(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                totals = dict(entry[0])
+                for name, delta in deltas.items():
+                    totals[name] = totals.get(name, 0) + delta
+                self._entries[key] = (totals, entry[1])
+
+    def invalidate(self, key: str):
+        """
+        Drop the cached sums of a counter.
+
+        :param key: Path of the counter document
+        """
+        with self._lock:
+            self._bump(key)
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached counter."""
+        with self._lock:
+            for key in list(self._entries):
+                self._bump(key)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+        }
+
+    def _bump(self, key: str):
+        """Must be called with the lock held."""
+        self._version += 1
+        self._versions[key] = self._version
+        self._versions.move_to_end(key)
+        # Keep the versions of the counters that may be cached or being read
+        while len(self._versions) > 2 * self.max_size:
+            _, version = self._versions.popitem(last=False)
+            self._forgotten_version = version
+
+
+def _shard_update(deltas: Dict[str, Number]) -> Dict[str, Any]:
+    return {name: Increment(delta) for name, delta in deltas.items()}
+
+
+def _sum_shards(shards) -> Dict[str, Number]:
+    totals: Dict[str, Number] = {}
+    for shard in shards:
+        for name, value in (shard or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+_cache = CounterCache()
+
+
+def counter_cache() -> CounterCache:
+    """Process-wide cache of the sums of the sharded counters"""
+    return _cache
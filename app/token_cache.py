@@ -0,0 +1,155 @@
+###
+# Cache of verified Firebase ID tokens. Clients send the same ID token with every request
+# until it expires, so the claims decoded by auth.verify_id_token are kept, keyed by a
+# digest of the token, until the exp claim of the token. The least recently used tokens are
+# evicted beyond TOKEN_CACHE_MAX_SIZE. Revoked tokens are not checked by validate_token, so
+# caching does not change which tokens are accepted.
+#
+# The public keys that sign the tokens are fetched by firebase_admin through an HTTP cache.
+# A refresher thread fetches them again every CERT_REFRESH_INTERVAL_SECONDS, well within
+# their max-age, so that verifying a new token never waits for a certificate fetch.
+###
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from firebase_admin import auth
+from firebase_admin._token_gen import ID_TOKEN_CERT_URI
+
+TOKEN_CACHE_MAX_SIZE = 10_000
+CERT_REFRESH_INTERVAL_SECONDS = 600.0
+
+logger = logging.getLogger(__name__)
+
+
+class IdTokenCache:
+    def __init__(
+        self,
+        max_size: int = TOKEN_CACHE_MAX_SIZE,
+        cert_refresh_interval_seconds: float = CERT_REFRESH_INTERVAL_SECONDS,
+    ):
+        """
+        :param max_size: Maximum number of cached tokens
+        :param cert_refresh_interval_seconds: Time between two fetches of the public keys
+        """
+        self.max_size = max_size
+        self.cert_refresh_interval_seconds = cert_refresh_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cert_refreshes = 0
+        self.cert_refresh_failures = 0
+        self._lock = threading.Lock()
+        # Token digest -> (claims, exp), least recently used first
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = (
+            OrderedDict()
+        )
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Fetch the public keys and start refreshing them in the background."""
+        self.refresh_certificates()
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="qtime-cert-refresher", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop refreshing the public keys."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the claims of a token verified before.
+
+        :param token: ID token
+        :return: The claims of the token, or None if it was not verified or has expired
+        """
+        digest = _digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        """
+        Cache the claims of a verified token until it expires.
+
+        :param token: ID token
+        :param claims: Claims returned by auth.verify_id_token
+        """
+        digest = _digest(token)
+        with self._lock:
+            self._entries[digest] = (claims, float(claims["exp"]))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def refresh_certificates(self):
+        """Fetch the public keys that sign the ID tokens into the HTTP cache of the verifier."""
+        try:
+            response = _certificate_request()(
+                ID_TOKEN_CERT_URI, headers={"Cache-Control": "no-cache"}
+            )
+            if response.status != 200:
+                raise ValueError(f"Unexpected status {response.status}")
+            self.cert_refreshes += 1
+        except Exception:
+            logger.exception("Failed to refresh the ID token certificates")
+            self.cert_refresh_failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "cert_refreshes": self.cert_refreshes,
+            "cert_refresh_failures": self.cert_refresh_failures,
+        }
+
+    def _run(self):
+        while not self._stopping.wait(self.cert_refresh_interval_seconds):
+            self.refresh_certificates()
+
+
+def _digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def _certificate_request():
+    """
+    HTTP transport used by auth.verify_id_token to fetch the public keys, which caches them
+    according to their Cache-Control header. firebase_admin has no public accessor for it.
+    """
+    return auth._get_client(None)._token_verifier.request
+
+
+_cache = IdTokenCache()
+
+
+def id_token_cache() -> IdTokenCache:
+    """Process-wide cache of the verified ID tokens"""
+    return _cache
@@ -0,0 +1,176 @@
+###
+# Request scoped unit of work. The Firestore writes made by the services while a unit of
+# work is active are collected in a single WriteBatch that is committed when the unit of
+# work ends, so the writes of a request cost one round trip and are applied atomically.
+# Outside of a unit of work the writes are sent immediately.
+###
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from google.cloud.firestore import WriteBatch
+
+from app.firebase import firestore_db
+
+# Firestore rejects batches of more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+class _UnitOfWork:
+    def __init__(self, batch: WriteBatch):
+        self.batch = batch
+        # Called once the batch is committed
+        self.callbacks: List[Callable[[], Any]] = []
+        # Called if the block raises or the batch fails to commit
+        self.failure_callbacks: List[Callable[[], Any]] = []
+
+
+_current: ContextVar[Optional[_UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Optional[WriteBatch]]:
+    """
+    Collect the writes made inside the block and commit them in one batch at the end of
+    the block. The writes are discarded if the block raises. A nested unit of work joins
+    the enclosing one.
+
+    Usage
+    ```
+    with unit_of_work():
+        update_user(user)
+        generate_referral_event(user, user_with_code, points)
+    ```
+
+    Reads inside the block do not see the pending writes.
+    """
+    current = _current.get()
+    if current is not None:
+        yield current.batch
+        return
+
+    current = _UnitOfWork(firestore_db().batch())
+    token = _current.set(current)
+    try:
+        try:
+            yield current.batch
+        finally:
+            _current.reset(token)
+        if len(current.batch) > 0:
+            current.batch.commit()
+    except Exception:
+        for callback in current.failure_callbacks:
+            callback()
+        raise
+    for callback in current.callbacks:
+        callback()
+
+
+def with_unit_of_work(func):
+    """
+    Decorator running an API endpoint in a unit of work, see unit_of_work.
+
+    Usage
+    ```
+    @with_auth_user
+    @with_unit_of_work
+    def my_function(user: User, **kwargs):
+        ...
+    ```
+
+    :param func: Function to decorate
+    :return: Decorated function
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with unit_of_work():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def set_document(document_ref, data: Dict[str, Any], merge: bool = False):
+    """
+    Set a document, in the current unit of work if there is one.
+
+    :param document_ref: Reference of the document to set
+    :param data: Fields of the document
+    :param merge: Whether to merge the fields into the existing document
+    """
+    batch = _pending_batch()
+    if batch is None:
+        document_ref.set(data, merge=merge)
+    else:
+        batch.set(document_ref, data, merge=merge)
+
+
+def add_document(collection_ref, data: Dict[str, Any]):
+    """
+    Add a document with a generated ID, in the current unit of work if there is one.
+
+    :param collection_ref: Reference of the collection to add the document to
+    :param data: Fields of the document
+    """
+    batch = _pending_batch()
+    if batch is None:
+        collection_ref.add(data)
+    else:
+        batch.set(collection_ref.document(), data)
+
+
+def delete_document(document_ref):
+    """
+    Delete a document, in the current unit of work if there is one.
+
+    :param document_ref: Reference of the document to delete
+    """
+    batch = _pending_batch()
+    if batch is None:
+        document_ref.delete()
+    else:
+        batch.delete(document_ref)
+
+
+def after_commit(callback: Callable[[], Any]):
+    """
+    Call a function once the current unit of work is committed, or immediately if there
+    is no unit of work. The function is not called if the unit of work fails.
+
+    :param callback: Function without arguments to call
+    """
+    current = _current.get()
+    if current is None:
+        callback()
+    else:
+        current.callbacks.append(callback)
+
+
+def on_failure(callback: Callable[[], Any]):
+    """
+    Call a function if the current unit of work fails, i.e. its block raises or its batch
+    fails to commit, to undo what was done outside of the batch. Without a unit of work the
+    writes are already sent and the function is not called. The function must not raise.
+
+    :param callback: Function without arguments to call
+    """
+    current = _current.get()
+    if current is not None:
+        current.failure_callbacks.append(callback)
+
+
+def _pending_batch() -> Optional[WriteBatch]:
+    """
+    Batch of the current unit of work
+
+    :raises ValueError: If the batch is full
+    """
+    current = _current.get()
+    batch = current.batch if current is not None else None
+    if batch is not None and len(batch) >= MAX_BATCH_WRITES:
+        raise ValueError(
+            f"A unit of work cannot contain more than {MAX_BATCH_WRITES} writes"
+        )
+    return batch
@@ -3,9 +3,12 @@ from .errors import UserNotFoundError, UserAlreadyExistsError
 from firebase_admin import auth
 from typing import Dict, Any
 from app.auth import with_auth_user
+from app.unit_of_work import with_unit_of_work
 from app.user.user import User
+from app.wait_time.service import uid_to_aid
 
 # Note: this endpoint will NOT use our middleware wrapper, since at this point we have no User record yet. We will default to the parameters connexion gives us
+@with_unit_of_work
 def new_user_signup(token_info: Dict[str, Any]):
     try:
         firebase_user_record: auth.UserRecord = auth.get_user(token_info["uid"])
@@ -19,6 +22,8 @@ def new_user_signup(token_info: Dict[str, Any]):
 
 
 @with_auth_user
-def delete_user_profile(user: User, **kwargs):
-    delete_user(user)
+@with_unit_of_work
+def delete_user_profile(user: User, token_info: Dict[str, Any], **kwargs):
+    # The data of the user keyed to it elsewhere is deleted in the background
+    delete_user(user, uid_to_aid(token_info["uid"]))
     return None, 204
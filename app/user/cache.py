@@ -0,0 +1,333 @@
+###
+# In-process cache of the user documents. Every authenticated request reads the document of
+# its user, and most flows write it back right after, so the user service reads through the
+# cache and writes through it: once a write is committed the cache holds the written
+# document and the next read of this process is served locally.
+#
+# Every write and invalidation of a user bumps its version. A document read from Firestore
+# is only cached if the version of its user has not changed since the read started, so a
+# read racing with a write never replaces the written document with the previous one.
+#
+# Writes made by other processes are picked up by a snapshot listener on the users updated
+# since the listener started (update_user sets updated_at), which drops the cached users
+# whose document changed. The listener is restarted every USER_LISTENER_WINDOW_SECONDS so
+# that the documents it tracks stay bounded. A deleted user document is not seen by that
+# query unless it was updated since the listener started, so the cache also listens to the
+# deletion_jobs collection, where delete_user records the deletion of every user in the same
+# batch, and drops the users whose deletion job is added. When the listeners are not running
+# (e.g. in tests or scripts) cached users expire after USER_CACHE_UNWATCHED_TTL_SECONDS.
+#
+# The cache holds at most max_size users, evicted with the configured EvictionPolicy. The
+# uid of the Firebase Auth users are mapped to their email for ttl_seconds, the time during
+# which the existence of the Firebase Auth user is not checked again.
+###
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from app.firebase import firestore_db, DELETION_JOBS_COLLECTION, USERS_COLLECTION
+from .user import User
+
+USER_CACHE_MAX_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 300.0
+USER_CACHE_UNWATCHED_TTL_SECONDS = 30.0
+USER_LISTENER_WINDOW_SECONDS = 3600.0
+# Changes made while the listener is restarted are replayed by the new listener
+USER_LISTENER_OVERLAP_SECONDS = 60.0
+# Field set by every write of a user document, watched by the listener
+UPDATED_AT_FIELD = "updated_at"
+
+logger = logging.getLogger(__name__)
+
+
+class EvictionPolicy(Enum):
+    # Evict the user read or written the longest time ago
+    LRU = "lru"
+    # Evict the user cached the longest time ago, reads do not reorder the cache
+    FIFO = "fifo"
+
+
+class UserCache:
+    def __init__(
+        self,
+        max_size: int = USER_CACHE_MAX_SIZE,
+        ttl_seconds: float = USER_CACHE_TTL_SECONDS,
+        eviction: EvictionPolicy = EvictionPolicy.LRU,
+        listener_window_seconds: float = USER_LISTENER_WINDOW_SECONDS,
+    ):
+        """
+        :param max_size: Maximum number of cached users
+        :param ttl_seconds: Time after which a cached user is read again while the listener
+            is running
+        :param eviction: Which user to evict when the cache is full
+        :param listener_window_seconds: Time between two restarts of the listener
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.eviction = eviction
+        self.listener_window_seconds = listener_window_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        self._lock = threading.RLock()
+        # email -> (user document, expiry), next to evict first
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # email -> version of its last write or invalidation, oldest first
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Versions older than this one may have been dropped from _versions
+        self._forgotten_version = 0
+        self._version = 0
+        # uid -> (email, expiry), seen the longest time ago first
+        self._emails: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._watch: Any = None
+        self._deletions_watch: Any = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start listening for the writes made to the users by other processes."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._listen(datetime.now(timezone.utc))
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="qtime-user-listener", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop listening for writes, cached users then expire after a short TTL."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._unlisten()
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+
+    def is_listening(self) -> bool:
+        return self._watch is not None
+
+    def get(self, email: str) -> Optional[User]:
+        """
+        Get a cached user.
+
+        :param email: Email of the user
+        :return: A copy of the cached user, which can be modified, or None if the user is
+            not cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[email]
+                self.misses += 1
+                return None
+            if self.eviction is EvictionPolicy.LRU:
+                self._entries.move_to_end(email)
+            self.hits += 1
+            data = entry[0]
+        return User.from_dict(email, copy.deepcopy(data))
+
+    def version(self, email: str) -> int:
+        """
+        Version of a user, to be taken before reading the user from Firestore and passed to
+        put.
+
+        :param email: Email of the user
+        """
+        with self._lock:
+            return self._versions.get(email, self._forgotten_version)
+
+    def put(self, user: User, version: int):
+        """
+        Cache a user read from Firestore.
+
+        :param user: User read from Firestore
+        :param version: Version of the user before it was read. The user is not cached if
+            it was written or invalidated since, as the read may predate the write
+        """
+        data = copy.deepcopy(user.to_dict())
+        with self._lock:
+            if self._versions.get(user.email, self._forgotten_version) != version:
+                return
+            self._store(user.email, data)
+
+    def write(self, email: str, data: Dict[str, Any]):
+        """
+        Cache the document of a user written by this process. Must be called once the
+        write is committed.
+
+        :param email: Email of the user
+        :param data: Fields of the written user document
+        """
+        data = copy.deepcopy(data)
+        data.pop(UPDATED_AT_FIELD, None)
+        with self._lock:
+            self._bump(email)
+            self._store(email, data)
+            self.writes += 1
+
+    def invalidate(self, email: str):
+        """
+        Drop a cached user.
+
+        :param email: Email of the user
+        """
+        with self._lock:
+            self._bump(email)
+            self._entries.pop(email, None)
+            self.invalidations += 1
+
+    def email_of(self, uid: str) -> Optional[str]:
+        """
+        Email of a Firebase Auth user seen less than ttl_seconds ago.
+
+        :param uid: Firebase Auth uid of the user
+        :return: The email, or None if the user must be looked up in Firebase Auth
+        """
+        with self._lock:
+            entry = self._emails.get(uid)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return entry[0]
+
+    def remember_email(self, uid: str, email: str):
+        """
+        Map a Firebase Auth uid to the email of the user for ttl_seconds.
+
+        :param uid: Firebase Auth uid of the user
+        :param email: Email of the user
+        """
+        with self._lock:
+            self._emails[uid] = (email, time.monotonic() + self.ttl_seconds)
+            self._emails.move_to_end(uid)
+            while len(self._emails) > self.max_size:
+                self._emails.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached user."""
+        with self._lock:
+            for email in list(self._entries):
+                self._bump(email)
+            self._entries.clear()
+            self._emails.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "listening": self.is_listening(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "writes": self.writes,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+        }
+
+    def _store(self, email: str, data: Dict[str, Any]):
+        """Must be called with the lock held."""
+        ttl = (
+            self.ttl_seconds
+            if self._watch is not None
+            else min(self.ttl_seconds, USER_CACHE_UNWATCHED_TTL_SECONDS)
+        )
+        self._entries[email] = (data, time.monotonic() + ttl)
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _bump(self, email: str):
+        """Must be called with the lock held."""
+        self._version += 1
+        self._versions[email] = self._version
+        self._versions.move_to_end(email)
+        # Keep the versions of the users that may be cached or being read
+        while len(self._versions) > 2 * self.max_size:
+            _, version = self._versions.popitem(last=False)
+            self._forgotten_version = version
+
+    def _run(self):
+        while not self._stopping.wait(self.listener_window_seconds):
+            with self._lock:
+                if self._thread is None:
+                    return
+                self._unlisten()
+                self._listen(
+                    datetime.now(timezone.utc)
+                    - timedelta(seconds=USER_LISTENER_OVERLAP_SECONDS)
+                )
+
+    def _listen(self, since: datetime):
+        """Must be called with the lock held."""
+        self._watch = (
+            _users_collection()
+            .where(UPDATED_AT_FIELD, ">", since)
+            .on_snapshot(self._on_snapshot)
+        )
+        # Only holds the pending deletion jobs
+        self._deletions_watch = _deletion_jobs_collection().on_snapshot(
+            self._on_deletions_snapshot
+        )
+
+    def _unlisten(self):
+        """Must be called with the lock held."""
+        for watch in (self._watch, self._deletions_watch):
+            if watch is not None:
+                watch.unsubscribe()
+        self._watch = None
+        self._deletions_watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                email = change.document.id
+                entry = self._entries.get(email)
+                if change.type.name != "REMOVED" and entry is not None:
+                    data = change.document.to_dict()
+                    data.pop(UPDATED_AT_FIELD, None)
+                    if data == entry[0]:
+                        continue  # Our own write, or already read
+                self._drop(email)
+
+    def _on_deletions_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                # The deletion job of a user, its ID is the email of the user
+                if change.type.name == "ADDED":
+                    self._drop(change.document.id)
+
+    def _drop(self, email: str):
+        """Drop a user changed by another process. Must be called with the lock held."""
+        self._bump(email)
+        if self._entries.pop(email, None) is not None:
+            self.remote_invalidations += 1
+
+
+_cache = UserCache()
+
+
+def user_cache() -> UserCache:
+    """Process-wide cache of the user documents"""
+    return _cache
+
+
+def _users_collection():
+    return firestore_db().collection(USERS_COLLECTION)
+
+
+def _deletion_jobs_collection():
+    return firestore_db().collection(DELETION_JOBS_COLLECTION)
@@ -0,0 +1,311 @@
+###
+# Cascading deletion of the data of deleted accounts. delete_user removes the user document,
+# its referral code, reward ledger and counters in the request, and records a deletion job in
+# deletion_jobs/{email}. The account deletion worker then deletes everything else keyed to
+# the user, one stage at a time:
+#   - events: the events of the user, except the account_deletion event kept as the record
+#     of the deletion
+#   - POI_proposal: the POI suggestions submitted by the user
+#   - location: the location document of the user
+# Documents created after the deletion (e.g. by a new account with the same email) are kept.
+#
+# A stage deletes its documents in pages of up to DELETION_PARALLEL_BATCHES batches of
+# MAX_BATCH_WRITES deletes, committed concurrently. After every page the job records its
+# stage and the ID of the last document it went through, so that a job interrupted by a
+# restart resumes where it stopped. The job document is deleted once every stage is done.
+#
+# The worker is started with the background services and resumes the pending jobs. When it
+# is not running (e.g. in tests or scripts) jobs run synchronously once the deletion of the
+# user is committed.
+###
+
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from app.concurrency import run_concurrently
+from app.events.event import EventType
+from app.common import BadDataError
+from app.firebase import (
+    firestore_db,
+    DELETION_JOBS_COLLECTION,
+    EVENTS_COLLECTION,
+    LOCATION_COLLECTION,
+    POI_PROPOSAL_COLLECTION,
+)
+from app.unit_of_work import set_document, after_commit, MAX_BATCH_WRITES
+
+DELETION_PARALLEL_BATCHES = 4
+
+# Stage -> (collection, field holding the email of the user, field holding the creation time)
+QUERY_STAGES: Dict[str, Tuple[str, str, str]] = {
+    "events": (EVENTS_COLLECTION, "user", "created"),
+    "POI_proposal": (POI_PROPOSAL_COLLECTION, "submitted_by", "submission_time"),
+}
+LOCATION_STAGE = "location"
+STAGES = (*QUERY_STAGES, LOCATION_STAGE)
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionJob:
+    """Deletion of the data of a deleted account, stored in deletion_jobs/{email}"""
+
+    def __init__(
+        self,
+        email: str,
+        aids: List[str],
+        requested_at: datetime,
+        stage: str = STAGES[0],
+        after: Optional[str] = None,
+        deleted: Optional[Dict[str, int]] = None,
+    ):
+        """
+        :param email: Email of the deleted user
+        :param aids: IDs of the location documents of the user
+        :param requested_at: Time the account was deleted
+        :param stage: Stage the job is at (see STAGES)
+        :param after: ID of the last document the stage went through, None to start the
+            stage from its first document
+        :param deleted: Number of documents deleted by each stage
+        """
+        self.email = email
+        self.aids = aids
+        self.requested_at = requested_at
+        self.stage = stage
+        self.after = after
+        self.deleted = deleted or {}
+
+    @staticmethod
+    def from_dict(email: str, dict: Dict[str, Any]) -> "DeletionJob":
+        """
+        Creates a DeletionJob object from a deletion_jobs document.
+
+        :param email: ID of the document
+        :param dict: Dictionary of the deletion job
+        """
+        try:
+            return DeletionJob(
+                email,
+                dict["aids"],
+                dict["requested_at"],
+                dict["stage"],
+                dict.get("after"),
+                dict.get("deleted"),
+            )
+        except KeyError as e:
+            raise BadDataError("Missing data from deletion job data: " + str(e))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "aids": self.aids,
+            "requested_at": self.requested_at,
+            "stage": self.stage,
+            "after": self.after,
+            "deleted": dict(self.deleted),
+        }
+
+
+def schedule_account_deletion(email: str, aid: Optional[str] = None):
+    """
+    Record the deletion job of a user, in the current unit of work if there is one, and
+    hand it to the account deletion worker once committed.
+
+    :param email: Email of the deleted user
+    :param aid: ID of the location document of the user (Optional)
+    """
+    job = DeletionJob(email, [aid] if aid else [], datetime.now(timezone.utc))
+    set_document(deletion_jobs_collection().document(email), job.to_dict())
+    after_commit(lambda: account_deletion_worker().submit(email))
+
+
+class AccountDeletionWorker:
+    def __init__(self, parallel_batches: int = DELETION_PARALLEL_BATCHES):
+        """
+        :param parallel_batches: Number of batches of deletes committed concurrently
+        """
+        self.parallel_batches = parallel_batches
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.documents_deleted = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the worker thread and resume the pending deletion jobs."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="qtime-account-deletion", daemon=True
+            )
+            self._thread.start()
+        for job_doc in deletion_jobs_collection().select([]).stream():
+            self._queue.put(job_doc.id)
+
+    def stop(self):
+        """Stop the worker. A running job stops at its next checkpoint."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._queue.put(None)
+            thread.join()
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, email: str):
+        """
+        Run the deletion job of a user, in the background if the worker is running.
+
+        :param email: Email of the deleted user
+        """
+        if self.is_running():
+            self._queue.put(email)
+        else:
+            self.run_job(email)
+
+    def run_job(self, email: str) -> bool:
+        """
+        Run the deletion job of a user from its last checkpoint.
+
+        :param email: Email of the deleted user
+        :return: True if the job is done, False if it was stopped before the end
+        """
+        job_ref = deletion_jobs_collection().document(email)
+        snapshot = job_ref.get()
+        if not snapshot.exists:
+            return True
+        job = DeletionJob.from_dict(email, snapshot.to_dict())
+        for stage in STAGES[STAGES.index(job.stage) :]:
+            if job.stage != stage:
+                job.stage, job.after = stage, None
+            if stage == LOCATION_STAGE:
+                self._delete_batches([_location_refs(job)])
+                self._checkpoint(job_ref, job, len(job.aids))
+                continue
+            while True:
+                if self._stopping.is_set():
+                    return False
+                refs, last_id = _query_page(
+                    job, *QUERY_STAGES[stage], self.parallel_batches * MAX_BATCH_WRITES
+                )
+                if last_id is None:
+                    break
+                self._delete_batches(_chunks(refs, MAX_BATCH_WRITES))
+                job.after = last_id
+                self._checkpoint(job_ref, job, len(refs))
+        job_ref.delete()
+        self.jobs_completed += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing the state of the worker"""
+        return {
+            "running": self.is_running(),
+            "pending": self._queue.qsize(),
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "documents_deleted": self.documents_deleted,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            email = self._queue.get()
+            if email is None:
+                continue
+            try:
+                self.run_job(email)
+            except Exception:
+                # The job is retried from its last checkpoint on the next start
+                logger.exception(f"Failed to delete the data of {email}")
+                self.jobs_failed += 1
+
+    def _delete_batches(self, batches: List[List[Any]]):
+        """Commit a batch of deletes for each list of references, concurrently."""
+        batches = [refs for refs in batches if refs]
+        run_concurrently(
+            *[lambda refs=refs: _delete_documents(refs) for refs in batches],
+            timeout=None,
+        )
+
+    def _checkpoint(self, job_ref, job: DeletionJob, deleted: int):
+        job.deleted[job.stage] = job.deleted.get(job.stage, 0) + deleted
+        self.documents_deleted += deleted
+        job_ref.set(job.to_dict())
+
+
+def _query_page(
+    job: DeletionJob,
+    collection: str,
+    user_field: str,
+    created_field: str,
+    page_size: int,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Next page of documents of a user to delete.
+
+    :return: The references of the documents to delete and the ID of the last document of
+        the page, None if there are no documents left
+    """
+    query = (
+        firestore_db()
+        .collection(collection)
+        .where(user_field, "==", job.email)
+        .order_by(FieldPath.document_id())
+        .select(["type", created_field])
+    )
+    if job.after is not None:
+        query = query.start_after({FieldPath.document_id(): job.after})
+    page = list(query.limit(page_size).stream())
+    if not page:
+        return [], None
+    return [doc.reference for doc in page if _should_delete(job, doc, created_field)], (
+        page[-1].id
+    )
+
+
+def _should_delete(job: DeletionJob, doc, created_field: str) -> bool:
+    data = doc.to_dict() or {}
+    if data.get("type") == EventType.ACCOUNT_DELETION.value:
+        return False  # Record of the deletion
+    created = data.get(created_field)
+    if isinstance(created, datetime) and created.tzinfo is not None:
+        return created <= job.requested_at
+    return True
+
+
+def _location_refs(job: DeletionJob) -> List[Any]:
+    locations = firestore_db().collection(LOCATION_COLLECTION)
+    return [locations.document(aid) for aid in job.aids]
+
+
+def _delete_documents(refs: List[Any]):
+    batch = firestore_db().batch()
+    for ref in refs:
+        batch.delete(ref)
+    batch.commit()
+
+
+def _chunks(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def deletion_jobs_collection():
+    return firestore_db().collection(DELETION_JOBS_COLLECTION)
+
+
+_worker = AccountDeletionWorker()
+
+
+def account_deletion_worker() -> AccountDeletionWorker:
+    """Process-wide worker running the account deletion jobs"""
+    return _worker
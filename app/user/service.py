@@ -1,16 +1,27 @@
 # This file contains service functions for the user API
+import copy
+from typing import Any, Dict, Optional
+
+from firebase_admin import firestore
+
 from app.user.user import User
 from app.user.errors import UserNotFoundError, UserAlreadyExistsError
 from app.rewards.service import (
     create_unique_referral_code,
+    release_referral_code,
     save_referral_code,
+    find_referral_code_owner,
     delete_referral_code,
 )
+from app.rewards.ledger import create_ledger, delete_ledger
 from app.events.service import (
     generate_account_signup_event,
     generate_account_delete_event,
 )
 from app.firebase import firestore_db, USERS_COLLECTION
+from app.unit_of_work import set_document, delete_document, after_commit, on_failure
+from .cache import user_cache, UPDATED_AT_FIELD
+from .deletion import schedule_account_deletion
 
 
 def find_user(email: str) -> User:
@@ -21,10 +32,16 @@ def find_user(email: str) -> User:
     :raises UserNotFoundError: if user with specified email does not exist
     :raises BadDataError: if user data retrieved is missing essential data
     """
+    user = user_cache().get(email)
+    if user is not None:
+        return user
+    version = user_cache().version(email)
     user_ref = users_collection().document(email).get()
     if not user_ref.exists:
         raise UserNotFoundError(email)
-    return User.from_dict(email, user_ref.to_dict())
+    user = User.from_dict(email, user_ref.to_dict())
+    user_cache().put(user, version)
+    return user
 
 
 def find_user_by_referral_code(referral_code: str) -> User:
@@ -35,10 +52,10 @@ def find_user_by_referral_code(referral_code: str) -> User:
     :raises UserNotFoundError: if user with specified referral code does not exist
     :raises BadDataError: if user data retrieved is missing essential data
     """
-    user_ref = users_collection().where("referral_code", "==", referral_code).get()
-    if not user_ref:
-        raise UserNotFoundError(referral_code)
-    return User.from_dict(user_ref[0].id, user_ref[0].to_dict())
+    owner = find_referral_code_owner(referral_code)
+    if owner is None:
+        raise UserNotFoundError(referral_code=referral_code)
+    return find_user(owner)
 
 
 def create_user(email: str) -> User:
@@ -52,34 +69,53 @@ def create_user(email: str) -> User:
     if users_collection().document(email).get().exists:
         raise UserAlreadyExistsError(email)
 
-    new_user = User(email=email, referral_code=create_unique_referral_code())
-    save_referral_code(new_user.referral_code)
-    update_user(new_user)
-    generate_account_signup_event(new_user)
+    referral_code = create_unique_referral_code()
+    try:
+        new_user = User(email=email, referral_code=referral_code)
+        save_referral_code(new_user.referral_code, new_user.email)
+        update_user(new_user)
+        create_ledger(new_user.email)
+        generate_account_signup_event(new_user)
+    except Exception:
+        release_referral_code(referral_code)
+        raise
+    # The writes of a unit of work are only sent when it is committed
+    on_failure(lambda: release_referral_code(referral_code))
     return new_user
 
 
 def update_user(user: User):
-    """Push updated User object to Firestore"""
-    users_collection().document(user.email).set(user.to_dict(), merge=True)
+    """
+    Push the changes of a User object to Firestore, and the user to the user cache once
+    they are committed. Only the changed fields are sent, see User.changes.
+    """
+    update = user_update(user)
+    if update is None:
+        return
+    document = copy.deepcopy(user.to_dict())
+    set_document(users_collection().document(user.email), update, merge=True)
+    user.mark_saved()
+    after_commit(lambda: user_cache().write(user.email, document))
 
 
-def delete_user(user: User):
+def delete_user(user: User, aid: Optional[str] = None):
     """
-    Deletes a specified user
+    Deletes a specified user. The other data of the user (events, location and POI
+    proposals) is deleted in the background, see app.user.deletion.
 
     :param user: User object for target user to delete
+    :param aid: ID of the location document of the user (Optional)
     :raises UserNotFoundError: If target user does not exist
     """
     target_user_snapshot = users_collection().document(user.email)
     if not target_user_snapshot.get().exists:
         raise UserNotFoundError(user.email)
-    target_user_snapshot.delete()
+    delete_document(target_user_snapshot)
     delete_referral_code(user.referral_code)
+    delete_ledger(user.email)
+    after_commit(lambda: user_cache().invalidate(user.email))
     generate_account_delete_event(user)
-
-    # TODO if there are any other references to the user that need to be deleted from other places,
-    # add them here
+    schedule_account_deletion(user.email, aid)
 
 
 def update_notification(user, setting):
@@ -90,3 +126,14 @@ def update_notification(user, setting):
 
 def users_collection():
     return firestore_db().collection(USERS_COLLECTION)
+
+
+def user_update(user: User) -> Optional[Dict[str, Any]]:
+    """
+    Fields to merge into the document of a user to save its changes, or None if it has not
+    changed. updated_at lets the user cache of the other processes see the write.
+    """
+    changes = user.changes()
+    if not changes:
+        return None
+    return {**changes, UPDATED_AT_FIELD: firestore.SERVER_TIMESTAMP}
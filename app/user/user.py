@@ -1,9 +1,17 @@
-from typing import Dict, Any
+import copy
+from typing import Dict, Any, Optional
+from google.cloud.firestore import DELETE_FIELD, Increment
 from app.common import BadDataError
 import json
 
 
 class User:
+    # Counters changed by a delta, saved with an atomic increment so that concurrent
+    # changes to the same user add up
+    COUNTER_FIELDS = ("reward_point_balance", "time_in_line", "num_lines_participated")
+    # Maps of counters, saved with an atomic increment of each changed key
+    COUNTER_MAP_FIELDS = ("poi_frequency",)
+
     def __init__(
         self,
         email,
@@ -25,6 +33,8 @@ class User:
         self.poi_frequency = poi_frequency
         self.hasCompletedOnboarding = hasCompletedOnboarding
         self.hasUsedReferralCode = hasUsedReferralCode
+        # Fields as last read from or saved to Firestore, None for a new user
+        self._saved: Optional[Dict[str, Any]] = None
 
     @staticmethod
     def from_dict(email: str, dict: Dict[str, Any]) -> "User":
@@ -41,7 +51,7 @@ class User:
             BadDataError: If required data is missing from the dictionary
         """
         try:
-            return User(
+            user = User(
                 email,
                 dict["referral_code"],
                 dict["reward_point_balance"],
@@ -54,6 +64,8 @@ class User:
             )
         except KeyError as e:
             raise BadDataError("Missing data from user data: " + str(e))
+        user.mark_saved()
+        return user
 
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -62,7 +74,39 @@ class User:
         Returns:
             dict: containing key-value pairs with all User data
         """
-        return self.__dict__
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_")
+        }
+
+    def changes(self) -> Dict[str, Any]:
+        """
+        Returns the fields to merge into the Firestore document of the User to save it
+
+        Returns:
+            dict: every field for a new user, otherwise only the fields changed since the
+                user was read or saved, with counters changed by an Increment
+        """
+        current = self.to_dict()
+        if self._saved is None:
+            return copy.deepcopy(current)
+        changes: Dict[str, Any] = {}
+        for name, value in current.items():
+            saved = self._saved.get(name)
+            if value == saved:
+                continue
+            if name in User.COUNTER_FIELDS and _is_number(value) and _is_number(saved):
+                changes[name] = Increment(value - saved)
+            elif name in User.COUNTER_MAP_FIELDS and isinstance(saved, dict):
+                changes[name] = _map_changes(saved, value)
+            else:
+                changes[name] = copy.deepcopy(value)
+        return changes
+
+    def mark_saved(self):
+        """Record the current fields as the ones stored in Firestore"""
+        self._saved = copy.deepcopy(self.to_dict())
 
     def to_json(self) -> str:
         """Return all properties in a JSON string"""
@@ -70,3 +114,23 @@ class User:
 
     def __eq__(self, other):
         return self.email == other.email
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _map_changes(saved: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Changes of a map of counters, merged into the map stored in Firestore"""
+    changes: Dict[str, Any] = {}
+    for key, value in current.items():
+        saved_value = saved.get(key, 0)
+        if _is_number(value) and _is_number(saved_value):
+            if value != saved_value:
+                changes[key] = Increment(value - saved_value)
+        elif key not in saved or value != saved[key]:
+            changes[key] = copy.deepcopy(value)
+    for key in saved:
+        if key not in current:
+            changes[key] = DELETE_FIELD
+    return changes
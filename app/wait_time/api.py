@@ -1,5 +1,6 @@
 from flask import jsonify
 from app.auth import with_auth_user
+from app.unit_of_work import with_unit_of_work
 from app.user.user import User
 from typing import Dict, Any
 from .location import UserLocation
@@ -27,6 +28,7 @@ def update_user_location(
 
 
 @with_auth_user
+@with_unit_of_work
 def submit_user_estimate(
     user: User, estimate_data: Dict[str, int], poi_id: str, **kwargs
 ):
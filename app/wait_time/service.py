@@ -1,11 +1,12 @@
 # Service class for the Wait Time API
 
 from app.firebase import firestore_db, LOCATION_COLLECTION
+from app.unit_of_work import set_document
 from app.user.service import update_user
 from app.user.user import User
 from app.wait_time.location import UserLocation
 from app.events.service import generate_waittime_submit_event
-from app.locations.service import get_details_for_POI
+from app.locations.service import get_details_for_POI, record_wait_time_submission
 from app.rewards.reward_values import POINTS_FOR_TIME_SUBMISSION
 
 
@@ -35,7 +36,7 @@ def update_location(location: UserLocation):
     :param location: UserLocation data to upload
     """
 
-    location_collection().document(location.aid).set(location.to_dict())
+    set_document(location_collection().document(location.aid), location.to_dict())
 
 
 def add_wait_time_suggestion(user: User, poi_id: str, time_estimate: int):
@@ -47,11 +48,11 @@ def add_wait_time_suggestion(user: User, poi_id: str, time_estimate: int):
     :param time_estimate: Wait time estimate to submit
     :raises POINotFoundError: If POI ID does not exist
     """
-    # TODO: Computation needs to be added here. For now it just creates an event
     # TODO: Should be a generate_waittime_confirm_event if the wait time suggestion matches current wait time
+    poi = get_details_for_POI(poi_id)
     user.reward_point_balance += POINTS_FOR_SUBMITTING_WAIT_TIME_ESTIMATE
     update_user(user)
 
-    generate_waittime_submit_event(
-        user, get_details_for_POI(poi_id), time_estimate, POINTS_FOR_TIME_SUBMISSION
-    )
+    generate_waittime_submit_event(user, poi, time_estimate, POINTS_FOR_TIME_SUBMISSION)
+    # Recompute the current estimate of the POI from the new submission
+    record_wait_time_submission(poi.id, time_estimate)
@@ -0,0 +1,29 @@
+###
+# ASGI entry point, an alternative to manage.py for ASGI servers such as uvicorn:
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+# Every request is served by the connexion app on a pool of ASGI_THREADS worker threads
+# (8 by default), see app/asgi.py.
+###
+
+import os
+
+from setup import (
+    initialize_firebase,
+    start_server,
+    start_background_services,
+    FIREBASE_CERT_PATH,
+)
+from app.asgi import AsgiApp, ASGI_THREADS
+
+
+initialize_firebase(FIREBASE_CERT_PATH)
+app = start_server(__name__)
+start_background_services()
+
+
+@app.route("/")
+def home():
+    return "<p>Queue Time</p>"
+
+
+application = AsgiApp(app, int(os.environ.get("ASGI_THREADS", ASGI_THREADS)))
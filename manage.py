@@ -2,11 +2,17 @@ import os
 import re
 from datetime import datetime, timezone
 from flask import request
-from setup import initialize_firebase, start_server, FIREBASE_CERT_PATH
+from setup import (
+    initialize_firebase,
+    start_server,
+    start_background_services,
+    FIREBASE_CERT_PATH,
+)
 
 
 initialize_firebase(FIREBASE_CERT_PATH)
 app = start_server(__name__)
+start_background_services()
 
 
 @app.route("/")
@@ -20,9 +26,17 @@ if __name__ == "__main__":
         # Run the app in production mode with waitress.
         from waitress import serve
         import logging
+        import signal
+        import sys
+        from app.locations.catalog import poi_catalog
 
         logger = logging.getLogger("waitress")
         logger.setLevel(logging.DEBUG)
+
+        # Ops hook: `kill -HUP <pid>` forces a reload of the in-memory POI catalog
+        signal.signal(signal.SIGHUP, lambda *_: poi_catalog().reload())
+        # Exit normally on `docker stop` so that the queued events are written
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
         SEP = " "
         REPLACE_EXPR = "\s*[\n\r\t]\s*"
 
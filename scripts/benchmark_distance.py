@@ -0,0 +1,56 @@
+###
+# Micro-benchmark comparing the scalar haversine distance computation with the
+# vectorized NumPy kernel used for POI lists.
+#
+# Usage (from the repository root): python scripts/benchmark_distance.py
+###
+
+import os
+import sys
+import timeit
+from random import Random
+
+import haversine
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.locations.distance import haversine_distances
+
+SIZES = [100, 10_000, 1_000_000]
+USER_LOCATION = (43.2635, -79.9175)
+
+
+def scalar_distances(origin, points):
+    return [haversine.haversine(origin, p, unit=haversine.Unit.METERS) for p in points]
+
+
+def main():
+    rng = Random(0)
+    print(f"{'POIs':>10} {'scalar (ms)':>14} {'vectorized (ms)':>16} {'speedup':>9}")
+    for size in SIZES:
+        points = [
+            (43.26 + rng.uniform(-0.05, 0.05), -79.92 + rng.uniform(-0.05, 0.05))
+            for _ in range(size)
+        ]
+        coordinates = np.array(points, dtype=np.float64)
+        repeat = max(1, 10_000 // size)
+
+        scalar = (
+            timeit.timeit(
+                lambda: scalar_distances(USER_LOCATION, points), number=repeat
+            )
+            / repeat
+        )
+        vectorized = (
+            timeit.timeit(
+                lambda: haversine_distances(USER_LOCATION, coordinates), number=repeat
+            )
+            / repeat
+        )
+        print(
+            f"{size:>10} {scalar * 1000:>14.3f} {vectorized * 1000:>16.3f} {scalar / vectorized:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+###
+# Micro-benchmark of the encode and decode throughput of events with the Firestore
+# document encoding (Event.to_dict / Event.from_dict), the same documents serialized with
+# msgpack, and the compact msgpack encoding of app.events.codec used by the event spool.
+#
+# Usage (from the repository root): python scripts/benchmark_event_codec.py
+###
+
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from random import Random
+
+import msgpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.events.codec import pack_events, unpack_events
+from app.events.event import (
+    Event,
+    EventType,
+    WaitTimeSubmitPayload,
+    RewardPointsAddPayload,
+    RewardSource,
+)
+
+SIZE = 1_000_000
+START = datetime(2023, 3, 5, tzinfo=timezone.utc)
+
+
+def make_events(size):
+    rng = Random(0)
+    events = []
+    for i in range(size):
+        user = f"user{rng.randrange(10_000)}@mcmaster.ca"
+        created = START + timedelta(seconds=i)
+        if i % 2:
+            payload = WaitTimeSubmitPayload(rng.randrange(60), f"poi_{i % 21}")
+            events.append(Event(EventType.WAITTIME_SUBMIT, user, payload, created))
+        else:
+            payload = RewardPointsAddPayload(RewardSource.WAITTIME_SUBMIT, 25)
+            events.append(Event(EventType.REWARD_POINTS_ADD, user, payload, created))
+    return events
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def dict_codec(events):
+    docs, encode = measure(lambda: [e.to_dict() for e in events])
+    _, decode = measure(lambda: [Event.from_dict(d) for d in docs])
+    return None, encode, decode
+
+
+def msgpack_dict_codec(events):
+    data, encode = measure(
+        lambda: b"".join(msgpack.packb(e.to_dict(), datetime=True) for e in events)
+    )
+    _, decode = measure(
+        lambda: [
+            Event.from_dict(d) for d in msgpack.Unpacker(io.BytesIO(data), timestamp=3)
+        ]
+    )
+    return len(data), encode, decode
+
+
+def compact_codec(events):
+    data, encode = measure(lambda: pack_events(events))
+    _, decode = measure(lambda: unpack_events(data))
+    return len(data), encode, decode
+
+
+def main():
+    events = make_events(SIZE)
+    print(f"{SIZE:,} events")
+    print(
+        f"{'encoding':>16} {'bytes/event':>12} {'encode (ev/s)':>14} {'decode (ev/s)':>14}"
+    )
+    for name, codec in [
+        ("document", dict_codec),
+        ("msgpack document", msgpack_dict_codec),
+        ("msgpack compact", compact_codec),
+    ]:
+        size, encode, decode = codec(events)
+        print(
+            f"{name:>16} {size / SIZE if size else float('nan'):>12.1f} "
+            f"{SIZE / encode:>14,.0f} {SIZE / decode:>14,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+###
+# Micro-benchmark comparing the bytes transferred and the deserialization time of POI
+# documents read in full (POI) and read with the projection used by the POI catalog
+# (POISummary).
+#
+# Documents are built from the POIs in scripts/poi.json and encoded with the same
+# protobuf messages Firestore sends over the wire.
+#
+# Usage (from the repository root): python scripts/benchmark_poi_projection.py
+###
+
+import json
+import os
+import sys
+import timeit
+
+from google.cloud.firestore_v1 import _helpers
+from google.cloud.firestore_v1.types import document
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.locations.poi import POI, POISummary
+
+SIZES = [21, 1_000, 10_000]
+DOCUMENT_PATH = "projects/qtime/databases/(default)/documents/POI/"
+
+
+def load_pois(size):
+    with open(os.path.join(os.path.dirname(__file__), "poi.json"), "r") as json_file:
+        templates = json.loads(json_file.read())
+    pois = []
+    for i in range(size):
+        poi = dict(templates[i % len(templates)])
+        poi["_id"] = f"{poi['_id']}_{i}"
+        pois.append(poi)
+    return pois
+
+
+def encode_documents(pois, fields=None):
+    return [
+        document.Document(
+            name=DOCUMENT_PATH + poi["_id"],
+            fields=_helpers.encode_dict(
+                {k: v for k, v in poi.items() if fields is None or k in fields}
+            ),
+        )
+        for poi in pois
+    ]
+
+
+def transferred_bytes(documents):
+    return sum(document.Document.pb(d).ByteSize() for d in documents)
+
+
+def deserialize(documents, model):
+    return [model.from_dict(_helpers.decode_dict(d.fields, None)) for d in documents]
+
+
+def main():
+    print(
+        f"{'POIs':>8} {'full (KB)':>10} {'projected (KB)':>15} "
+        f"{'full (ms)':>10} {'projected (ms)':>15} {'speedup':>8}"
+    )
+    for size in SIZES:
+        pois = load_pois(size)
+        full = encode_documents(pois)
+        projected = encode_documents(pois, POISummary.FIELDS)
+        repeat = max(1, 10_000 // size)
+
+        full_time = (
+            timeit.timeit(lambda: deserialize(full, POI), number=repeat) / repeat
+        )
+        projected_time = (
+            timeit.timeit(lambda: deserialize(projected, POISummary), number=repeat)
+            / repeat
+        )
+        print(
+            f"{size:>8} {transferred_bytes(full) / 1024:>10.1f} "
+            f"{transferred_bytes(projected) / 1024:>15.1f} "
+            f"{full_time * 1000:>10.3f} {projected_time * 1000:>15.3f} "
+            f"{full_time / projected_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,19 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import argparse
 from typing import Any, Dict, List
+import sys
 from sys import argv
 import json
 import os
 from datetime import datetime, timezone
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.locations.poi import Histogram
+from app.rewards.ledger import reconcile_ledgers
+from app.rewards.service import backfill_referral_code_owners
+from app.rewards.referral_pool import reclaim_stale_reservations
+from app.unit_of_work import MAX_BATCH_WRITES
+
 DEFAULT_FIREBASE_KEY_PATH = "../serviceAccountKey.json"
 FIREBASE_FIELD_TYPES = [
     "string",
@@ -86,6 +94,32 @@ parser.add_argument(
     """,
     nargs=2,
 )
+parser.add_argument(
+    "--consolidate-histograms",
+    action="store_true",
+    help="""
+    Packs the histogram_data/{day} documents of every POI histogram into its histogram/{poi}
+    document so that a histogram costs a single read. The histogram_data documents are left
+    in place.
+    """,
+)
+parser.add_argument(
+    "--reconcile-reward-ledgers",
+    action="store_true",
+    help="""
+    Recomputes the reward_ledger/{email} document and the reward point balance of every user
+    from the reward events in the events collection.
+    """,
+)
+parser.add_argument(
+    "--backfill-referral-code-owners",
+    action="store_true",
+    help="""
+    Stores the email of the owner of every referral code in its referral_codes/{code}
+    document, so that a referral code is looked up with a single read, and deletes the
+    referral code reservations that expired without an owner.
+    """,
+)
 args = parser.parse_args()
 
 # Connect to Firebase using given key
@@ -194,5 +228,41 @@ elif args.remove_property:
     print(
         f'\nSuccessfully deleted the "{name}" field from all documents in {collection_path}'
     )
+elif args.consolidate_histograms:
+    histogram_list = db.collection("histogram").stream()
+    print("Consolidating all histograms...")
+    batch = db.batch()
+    batch_writes = 0
+    histograms_consolidated = 0
+    for histogram_doc in histogram_list:
+        histogram_base = histogram_doc.to_dict()
+        if Histogram.is_consolidated(histogram_base):
+            continue  # Already consolidated
+        histogram_base["histogram_data"] = {
+            day_doc.id: day_doc.to_dict()
+            for day_doc in histogram_doc.reference.collection("histogram_data").stream()
+        }
+        histogram = Histogram.from_dict(histogram_base)
+        batch.set(histogram_doc.reference, histogram.to_consolidated_dict(), merge=True)
+        batch_writes += 1
+        histograms_consolidated += 1
+        if batch_writes == MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+            batch_writes = 0
+        print(f"Consolidated {histograms_consolidated} histograms.", end="\r")
+    if batch_writes:
+        batch.commit()
+    print(f"\nSuccessfully consolidated {histograms_consolidated} histograms")
+elif args.reconcile_reward_ledgers:
+    print("Reconciling all reward ledgers...")
+    users_reconciled = reconcile_ledgers()
+    print(f"Successfully reconciled the reward ledgers of {users_reconciled} users")
+elif args.backfill_referral_code_owners:
+    print("Backfilling the owners of all referral codes...")
+    codes_updated = backfill_referral_code_owners()
+    print(f"Successfully stored the owner of {codes_updated} referral codes")
+    codes_reclaimed = reclaim_stale_reservations()
+    print(f"Deleted {codes_reclaimed} expired referral code reservations")
 else:
     parser.print_help()
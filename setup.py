@@ -1,8 +1,18 @@
+import atexit
+import os
 import connexion
 from utils import combine_specifications
 from firebase_admin import credentials, initialize_app
 from app.error_handlers import handle_base_api_error, handle_generic_exception
 from app.base_api_error import BaseApiError
+from app.locations.catalog import poi_catalog
+from app.locations.service import histogram_estimate_writer
+from app.events.writer import event_writer
+from app.events.spool import event_spool
+from app.token_cache import id_token_cache
+from app.user.cache import user_cache, EvictionPolicy, USER_CACHE_MAX_SIZE
+from app.rewards.referral_pool import referral_code_pool
+from app.user.deletion import account_deletion_worker
 
 FIREBASE_CERT_PATH = "serviceAccountKey.json"
 
@@ -28,3 +38,40 @@ def start_server(name: str):
     app.add_error_handler(Exception, handle_generic_exception)
 
     return app
+
+
+def start_background_services():
+    """
+    Start the long running services used by the server. Requires firebase to be initialized.
+    """
+    # Load the POI catalog and keep it in sync with Firestore
+    poi_catalog().start()
+    # Write back the estimates recomputed when the hour rolls over in the background
+    histogram_estimate_writer().start()
+    atexit.register(histogram_estimate_writer().stop)
+    # Keep the public keys of the ID tokens fresh so that no request waits for them
+    id_token_cache().start()
+    # Cache the user documents, kept coherent with the writes of the other instances
+    user_cache().max_size = int(
+        os.environ.get("USER_CACHE_MAX_SIZE", USER_CACHE_MAX_SIZE)
+    )
+    user_cache().eviction = EvictionPolicy(
+        os.environ.get("USER_CACHE_EVICTION", EvictionPolicy.LRU.value)
+    )
+    user_cache().start()
+    atexit.register(user_cache().stop)
+    # Reserve referral codes ahead of the signups
+    referral_code_pool().start()
+    atexit.register(referral_code_pool().stop)
+    # Delete the data of deleted accounts in the background, resuming the pending deletions
+    account_deletion_worker().start()
+    atexit.register(account_deletion_worker().stop)
+    # Write events in the background. With EVENT_SPOOL_DIR set, events go through a local
+    # spool that survives restarts, otherwise through an in-memory queue drained on exit
+    spool_dir = os.environ.get("EVENT_SPOOL_DIR")
+    if spool_dir:
+        event_spool().start(spool_dir)
+        atexit.register(event_spool().stop)
+    else:
+        event_writer().start()
+        atexit.register(event_writer().stop)
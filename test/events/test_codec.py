@@ -0,0 +1,104 @@
+import time
+import unittest
+from datetime import datetime, timezone
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+from app.events.codec import (
+    encode_event,
+    pack_event,
+    unpack_event,
+    pack_events,
+    unpack_events,
+)
+from app.events.event import (
+    Event,
+    EventType,
+    WaitTimeSubmitPayload,
+    WaitTimeConfirmPayload,
+    RewardPointsAddPayload,
+    RewardSource,
+)
+
+CREATED = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+EVENTS = [
+    Event(EventType.ACCOUNT_SIGNUP, "test@sample.ca", None, CREATED),
+    Event(EventType.ACCOUNT_DELETION, "test@sample.ca", None, CREATED),
+    Event(
+        EventType.WAITTIME_SUBMIT,
+        "test@sample.ca",
+        WaitTimeSubmitPayload(12, "centro"),
+        CREATED,
+    ),
+    Event(
+        EventType.WAITTIME_CONFIRM,
+        "test@sample.ca",
+        WaitTimeConfirmPayload("centro"),
+        CREATED,
+    ),
+    Event(
+        EventType.REWARD_POINTS_ADD,
+        "test@sample.ca",
+        RewardPointsAddPayload(RewardSource.REFERRAL_BONUS, 50),
+        CREATED,
+    ),
+]
+
+
+class TestEvent(unittest.TestCase):
+    def test_created_default(self):
+        first = Event(EventType.ACCOUNT_SIGNUP, "test@sample.ca")
+        time.sleep(0.001)
+        second = Event(EventType.ACCOUNT_SIGNUP, "test@sample.ca")
+        self.assertLess(first.created, second.created)
+        self.assertIsNotNone(first.created.tzinfo)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            EVENTS[0].user = "other@sample.ca"
+        with self.assertRaises(AttributeError):
+            EVENTS[0].other = 1
+
+    def test_eq_and_hash(self):
+        copy = Event.from_dict(EVENTS[2].to_dict())
+        self.assertEqual(copy, EVENTS[2])
+        self.assertEqual(hash(copy), hash(EVENTS[2]))
+        self.assertNotEqual(EVENTS[2], EVENTS[3])
+        self.assertEqual(len(set(EVENTS + EVENTS)), len(EVENTS))
+
+    def test_from_dict(self):
+        for event in EVENTS:
+            self.assertEqual(Event.from_dict(event.to_dict()), event)
+        firestore_created = DatetimeWithNanoseconds(
+            2023, 3, 5, 18, 25, tzinfo=timezone.utc
+        )
+        event = Event.from_dict({**EVENTS[0].to_dict(), "created": firestore_created})
+        self.assertIs(type(event.created), datetime)
+        self.assertEqual(event.created.timestamp(), CREATED.timestamp())
+
+
+class TestEventCodec(unittest.TestCase):
+    def test_round_trip(self):
+        for event in EVENTS:
+            self.assertEqual(unpack_event(pack_event(event)), event)
+        self.assertEqual(unpack_events(pack_events(EVENTS)), EVENTS)
+
+    def test_compact(self):
+        event = EVENTS[2]
+        self.assertEqual(
+            encode_event(event), [2, "test@sample.ca", [12, "centro"], CREATED]
+        )
+
+    def test_naive_created_is_utc(self):
+        event = Event(EventType.ACCOUNT_SIGNUP, "a@b.ca", None, datetime(2023, 3, 5))
+        self.assertEqual(
+            unpack_event(pack_event(event)).created,
+            datetime(2023, 3, 5, tzinfo=timezone.utc),
+        )
+
+    def test_server_timestamp(self):
+        with self.assertRaises(ValueError):
+            pack_event(
+                Event(EventType.ACCOUNT_SIGNUP, "a@b.ca", None, SERVER_TIMESTAMP)
+            )
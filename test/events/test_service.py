@@ -1,11 +1,16 @@
 import unittest
-from unittest.mock import patch, ANY, call
+from datetime import datetime, timezone
+from unittest.mock import patch, ANY, call, MagicMock
 
+from app.base_api_error import InvalidCursorError
+from app.cursor import encode_cursor
 from app.events import service as event_service
+from app.events.event import Event, EventType, RewardPointsAddPayload, RewardSource
 from app.user.user import User
 from app.locations.poi import POI
 
 
+@patch("app.events.service.record_reward")
 @patch("app.events.service.firestore_db")
 class TestEventService(unittest.TestCase):
     """Test the event service"""
@@ -20,7 +25,7 @@ class TestEventService(unittest.TestCase):
             self.poi_id, "Testing poi", "queue", None, None, None, None, None
         )
 
-    def test_generate_account_signup_event(self, firebase_mock):
+    def test_generate_account_signup_event(self, firebase_mock, record_reward_mock):
         event_service.generate_account_signup_event(self.user)
         firebase_mock().collection().add.assert_called_once_with(
             {
@@ -31,7 +36,7 @@ class TestEventService(unittest.TestCase):
             }
         )
 
-    def test_generate_account_delete_event(self, firebase_mock):
+    def test_generate_account_delete_event(self, firebase_mock, record_reward_mock):
         event_service.generate_account_delete_event(self.user)
         firebase_mock().collection().add.assert_called_once_with(
             {
@@ -42,7 +47,7 @@ class TestEventService(unittest.TestCase):
             }
         )
 
-    def test_generate_waittime_submit_event(self, firebase_mock):
+    def test_generate_waittime_submit_event(self, firebase_mock, record_reward_mock):
         event_service.generate_waittime_submit_event(
             self.user, self.poi, 50, self.points_awarded
         )
@@ -58,6 +63,9 @@ class TestEventService(unittest.TestCase):
                     "created": ANY,
                 }
             ),
+        ]
+        firebase_mock().collection().add.assert_has_calls(calls)
+        reward_calls = [
             call(
                 {
                     "type": "reward_points_add_event",
@@ -67,12 +75,16 @@ class TestEventService(unittest.TestCase):
                         "points_change": self.points_awarded,
                     },
                     "created": ANY,
-                }
+                },
+                merge=False,
             ),
         ]
-        firebase_mock().collection().add.assert_has_calls(calls, any_order=True)
+        firebase_mock().collection().document().set.assert_has_calls(reward_calls)
+        record_reward_mock.assert_called_once_with(
+            self.email, RewardSource.WAITTIME_SUBMIT, self.points_awarded, ANY, ANY
+        )
 
-    def test_generate_waittime_confirm_event(self, firebase_mock):
+    def test_generate_waittime_confirm_event(self, firebase_mock, record_reward_mock):
         event_service.generate_waittime_confirm_event(
             self.user, self.poi, self.points_awarded
         )
@@ -85,6 +97,9 @@ class TestEventService(unittest.TestCase):
                     "created": ANY,
                 }
             ),
+        ]
+        firebase_mock().collection().add.assert_has_calls(calls)
+        reward_calls = [
             call(
                 {
                     "type": "reward_points_add_event",
@@ -94,18 +109,19 @@ class TestEventService(unittest.TestCase):
                         "points_change": self.points_awarded,
                     },
                     "created": ANY,
-                }
+                },
+                merge=False,
             ),
         ]
-        firebase_mock().collection().add.assert_has_calls(calls, any_order=True)
+        firebase_mock().collection().document().set.assert_has_calls(reward_calls)
 
-    def test_generate_referral_event_same_user(self, firebase_mock):
+    def test_generate_referral_event_same_user(self, firebase_mock, record_reward_mock):
         with self.assertRaises(ValueError):
             event_service.generate_referral_event(
                 self.user, self.user, self.points_awarded
             )
 
-    def test_generate_referral_event(self, firebase_mock):
+    def test_generate_referral_event(self, firebase_mock, record_reward_mock):
         referral_email = "refferer@sample.com"
         same_referral_user = User(referral_email, "ASDKGUE")
 
@@ -113,7 +129,7 @@ class TestEventService(unittest.TestCase):
             self.user, same_referral_user, self.points_awarded
         )
 
-        calls = [
+        reward_calls = [
             call(
                 {
                     "type": "reward_points_add_event",
@@ -123,7 +139,8 @@ class TestEventService(unittest.TestCase):
                         "points_change": self.points_awarded,
                     },
                     "created": ANY,
-                }
+                },
+                merge=False,
             ),
             call(
                 {
@@ -134,7 +151,49 @@ class TestEventService(unittest.TestCase):
                         "points_change": self.points_awarded,
                     },
                     "created": ANY,
-                }
+                },
+                merge=False,
             ),
         ]
-        firebase_mock().collection().add.assert_has_calls(calls, any_order=True)
+        firebase_mock().collection().document().set.assert_has_calls(reward_calls)
+
+    def test_reward_events_pages(self, firebase_mock, record_reward_mock):
+        created = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+        snapshots = []
+        for event_id in ("c", "b", "a"):
+            snapshot = MagicMock()
+            snapshot.id = event_id
+            snapshot.to_dict.return_value = Event(
+                EventType.REWARD_POINTS_ADD,
+                self.email,
+                RewardPointsAddPayload(RewardSource.WAITTIME_SUBMIT, 25),
+                created,
+            ).to_dict()
+            snapshot.get.return_value = created
+            snapshots.append(snapshot)
+        query = firebase_mock().collection().where().where().order_by().order_by()
+
+        query.limit().stream.return_value = snapshots
+        events, next_cursor = event_service.find_all_reward_events_for_user(
+            self.email, 2
+        )
+        query.limit.assert_called_with(3)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(next_cursor, event_service.reward_events_cursor(created, "b"))
+
+        # The next page resumes after the last event, including events created at the same time
+        query.start_after().limit().stream.return_value = snapshots[2:]
+        events, next_cursor = event_service.find_all_reward_events_for_user(
+            self.email, 2, next_cursor
+        )
+        query.start_after.assert_called_with({"created": created, "__name__": "b"})
+        self.assertEqual(len(events), 1)
+        self.assertIsNone(next_cursor)
+
+    def test_invalid_reward_events_cursor(self, firebase_mock, record_reward_mock):
+        with self.assertRaises(InvalidCursorError):
+            event_service.find_all_reward_events_for_user(self.email, 2, "invalid")
+        with self.assertRaises(InvalidCursorError):
+            event_service.find_all_reward_events_for_user(
+                self.email, 2, encode_cursor("reward_events", ["yesterday", "b"])
+            )
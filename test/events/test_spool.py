@@ -0,0 +1,148 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from google.api_core.exceptions import InvalidArgument
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+import msgpack
+
+from app.events.event import Event, EventType, WaitTimeConfirmPayload
+from app.events.spool import EventSpool, _read_segment
+
+CREATED = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+
+
+def _event(i: int = 0, created=CREATED):
+    return Event(
+        EventType.WAITTIME_CONFIRM,
+        "test@sample.ca",
+        WaitTimeConfirmPayload(f"poi_{i}"),
+        created,
+    )
+
+
+@patch("app.events.spool.firestore_db")
+class TestEventSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # Long intervals so that the tests drive the replay
+        self.spool = EventSpool(fsync_interval_seconds=60, replay_interval_seconds=60)
+
+    def tearDown(self):
+        with patch("app.events.spool.firestore_db"):
+            self.spool.stop()
+        self.directory.cleanup()
+
+    def _segments(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_append_and_replay(self, firebase_mock):
+        self.spool.start(self.directory.name)
+        record_id = self.spool.append(_event())
+        self.assertEqual(
+            len(_read_segment(os.path.join(self.directory.name, self._segments()[0]))),
+            1,
+        )
+
+        # The active segment is not replayed
+        self.assertEqual(self.spool.replay(), 0)
+        self.spool.stop()
+        firebase_mock().collection().document.assert_called_with(record_id)
+        firebase_mock().batch().set.assert_called_once()
+        self.assertDictEqual(
+            firebase_mock().batch().set.call_args[0][1], _event().to_dict()
+        )
+        self.assertEqual(self._segments(), [])
+        self.assertEqual(self.spool.stats()["replayed"], 1)
+
+    def test_server_timestamp(self, firebase_mock):
+        self.spool.start(self.directory.name)
+        self.spool.append(_event(created=SERVER_TIMESTAMP))
+        self.spool.stop()
+        created = firebase_mock().batch().set.call_args[0][1]["created"]
+        self.assertIsInstance(created, datetime)
+
+    def test_rotation(self, firebase_mock):
+        self.spool.segment_max_bytes = 1
+        self.spool.start(self.directory.name)
+        self.spool.append(_event(0))
+        self.spool.append(_event(1))
+        self.assertEqual(len(self._segments()), 3)
+        self.assertEqual(self.spool.replay(), 2)
+        self.assertEqual(len(self._segments()), 1)
+
+    def test_failed_replay_is_kept(self, firebase_mock):
+        firebase_mock().batch().commit.side_effect = Exception("unavailable")
+        self.spool.start(self.directory.name)
+        self.spool.append(_event())
+        self.spool.stop()
+        self.assertEqual(len(self._segments()), 1)
+        self.assertEqual(self.spool.stats()["replay_failures"], 1)
+
+        # Replayed with the same document ids by the next process
+        firebase_mock().batch().commit.side_effect = None
+        spool = EventSpool(fsync_interval_seconds=60, replay_interval_seconds=60)
+        spool.start(self.directory.name)
+        self.assertEqual(spool.replay(), 1)
+        spool.stop()
+        self.assertEqual(self._segments(), [])
+
+    def test_unreadable_segment_is_quarantined(self, firebase_mock):
+        with open(os.path.join(self.directory.name, "000000000001.seg"), "wb") as f:
+            f.write(msgpack.packb(["abc", {"not": "an event"}]))
+        with open(os.path.join(self.directory.name, "000000000002.seg"), "wb") as f:
+            f.write(msgpack.packb(["def", [0]]))
+        self.spool.start(self.directory.name)
+        self.spool.append(_event())
+        self.spool.stop()
+        self.assertEqual(
+            self._segments(), ["000000000001.seg.bad", "000000000002.seg.bad"]
+        )
+        firebase_mock().batch().set.assert_called_once()
+        self.assertEqual(self.spool.stats()["quarantined"], 2)
+        self.assertEqual(self.spool.stats()["replayed"], 1)
+
+    def test_rejected_segment_is_quarantined(self, firebase_mock):
+        firebase_mock().batch().commit.side_effect = [InvalidArgument("bad"), None]
+        self.spool.segment_max_bytes = 1
+        self.spool.start(self.directory.name)
+        self.spool.append(_event(0))
+        self.spool.append(_event(1))
+        self.assertEqual(self.spool.replay(), 1)
+        self.assertEqual(len(self._segments()), 2)
+        self.assertTrue(self._segments()[0].endswith(".seg.bad"))
+        self.assertEqual(self.spool.stats()["quarantined"], 1)
+
+    def test_fsync(self, firebase_mock):
+        self.spool.fsync_interval_seconds = 0.01
+        self.spool.start(self.directory.name)
+        self.spool.append(_event())
+        for _ in range(100):
+            if self.spool.stats()["fsyncs"]:
+                break
+            time.sleep(0.01)
+        self.assertGreaterEqual(self.spool.stats()["fsyncs"], 1)
+
+    def test_torn_segment(self, firebase_mock):
+        self.spool.start(self.directory.name)
+        self.spool.append(_event(0))
+        self.spool.append(_event(1))
+        path = os.path.join(self.directory.name, self._segments()[0])
+        with open(path, "r+b") as segment:
+            segment.truncate(os.path.getsize(path) - 2)
+        self.assertEqual(
+            [event for _, event in _read_segment(path)], [_event(0).to_dict()]
+        )
+
+    def test_append_after_stop(self, firebase_mock):
+        self.spool.start(self.directory.name)
+        self.spool.stop()
+        record_id = self.spool.append(_event())
+        firebase_mock().collection().document.assert_called_with(record_id)
+        firebase_mock().collection().document().set.assert_called_once_with(
+            _event().to_dict()
+        )
@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from app.events import service as event_service
+from app.events.writer import EventWriter
+from app.unit_of_work import unit_of_work
+from app.user.user import User
+
+
+@patch("app.events.writer.firestore_db")
+class TestEventWriter(unittest.TestCase):
+    def setUp(self):
+        self.writer = EventWriter(
+            batch_size=3, flush_interval_seconds=0.05, retry_backoff_seconds=0.001
+        )
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def test_flushes_in_batches(self, firebase_mock):
+        self.writer.start()
+        for i in range(7):
+            self.writer.write({"i": i})
+        self.writer.stop()
+
+        batch = firebase_mock().batch()
+        self.assertEqual(batch.set.call_count, 7)
+        self.assertGreaterEqual(batch.commit.call_count, 3)
+        firebase_mock().collection().add.assert_not_called()
+        stats = self.writer.stats()
+        self.assertEqual(stats["written"], 7)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertFalse(stats["running"])
+        self.assertIsNotNone(stats["last_flush_seconds"])
+
+    def test_flushes_on_age(self, firebase_mock):
+        self.writer.start()
+        self.writer.write({"i": 0})
+        for _ in range(100):
+            if self.writer.written:
+                break
+            self.writer._stopping.wait(0.01)
+        self.assertEqual(self.writer.written, 1)
+        firebase_mock().batch().commit.assert_called_once()
+
+    def test_writes_synchronously_when_stopped(self, firebase_mock):
+        self.writer.write({"i": 0})
+        firebase_mock().collection().add.assert_called_once_with({"i": 0})
+        firebase_mock().batch().commit.assert_not_called()
+
+    def test_overflow(self, firebase_mock):
+        writer = EventWriter(max_queue_size=1)
+        writer._thread = MagicMock()  # Running but not flushing
+        writer.write({"i": 0})
+        writer.write({"i": 1})
+        self.assertEqual(writer.stats()["overflows"], 1)
+        firebase_mock().collection().add.assert_called_once_with({"i": 1})
+
+    def test_failed_flush(self, firebase_mock):
+        firebase_mock().batch().commit.side_effect = Exception("unavailable")
+        self.writer.start()
+        self.writer.write({"i": 0})
+        self.writer.stop()
+        self.assertEqual(self.writer.failed, 1)
+        self.assertEqual(self.writer.written, 0)
+        self.assertEqual(firebase_mock().batch().commit.call_count, 5)
+        self.assertEqual(self.writer.stats()["retries"], 4)
+
+    def test_failed_flush_is_retried(self, firebase_mock):
+        batch = firebase_mock().batch()
+        batch.commit.side_effect = [Exception("unavailable"), None]
+        # Queued before the flusher starts so that they are in the same batch
+        self.writer._thread = MagicMock()
+        self.writer.write({"i": 0})
+        self.writer.write({"i": 1}, "event")
+        self.writer._thread = None
+        self.writer.start()
+        self.writer.stop()
+        self.assertEqual(self.writer.written, 2)
+        self.assertEqual(self.writer.failed, 0)
+        # The retry sets the same documents, so an applied commit is not duplicated
+        document = firebase_mock().collection().document
+        ids = [c[0][0] for c in document.call_args_list if c[0]]
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(ids[:2], ids[2:])
+        self.assertEqual(ids[1], "event")
+
+    @patch("app.unit_of_work.firestore_db")
+    def test_queued_after_commit(self, uow_firebase_mock, firebase_mock):
+        writer = EventWriter()
+        writer._thread = MagicMock()  # Running but not flushing
+        with patch("app.events.service.event_writer", return_value=writer):
+            with self.assertRaises(ValueError):
+                with unit_of_work():
+                    event_service.generate_account_signup_event(User("a@b.ca"))
+                    raise ValueError("failed")
+            self.assertEqual(writer.stats()["queue_depth"], 0)
+
+            with unit_of_work():
+                event_service.generate_account_signup_event(User("a@b.ca"))
+                self.assertEqual(writer.stats()["queue_depth"], 0)
+            self.assertEqual(writer.stats()["queue_depth"], 1)
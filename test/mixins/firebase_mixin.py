@@ -3,8 +3,9 @@ from typing import Callable, Dict, Any, Optional
 import requests
 
 from setup import initialize_firebase, FIREBASE_CERT_PATH
-from app.firebase import firestore_db, USERS_COLLECTION
+from app.firebase import firestore_db, USERS_COLLECTION, REFERRAL_CODES_COLLECTION
 from app.user.user import User
+from app.user.cache import user_cache
 
 FIRESTORE_PROJECT_ID = "qtime-bd47e"
 FIRESTORE_CERT_PATH_ENV_VAR = "SERVICE_KEY_PATH"
@@ -73,6 +74,10 @@ class FirebaseTestMixin:
                 user.email, USER_PASSWORD, user.email
             )
             _create_document_in_collection(USERS_COLLECTION, user.to_dict(), user.email)
+            if user.referral_code:
+                _create_document_in_collection(
+                    REFERRAL_CODES_COLLECTION, {"owner": user.email}, user.referral_code
+                )
 
     def token(self, email: str) -> str:
         """
@@ -98,6 +103,7 @@ class FirebaseTestMixin:
         requests.delete(
             FIRESTORE_DELETE_ALL_URL, headers={"Authorization": "Bearer owner"}
         )
+        user_cache().clear()
 
     def delete_user_accounts(self):
         """Clears all user accounts in the firebase auth emulator."""
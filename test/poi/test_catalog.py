@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from app.locations.catalog import POICatalog
+from app.locations.poi import POIClassification, POISummary
+
+
+def _poi_snapshot(poi_id: str, classification: str, exists: bool = True):
+    snapshot = Mock()
+    snapshot.id = poi_id
+    snapshot.exists = exists
+    snapshot.to_dict.return_value = {
+        "_id": poi_id,
+        "name": poi_id,
+        "class": classification,
+        "hours_of_operation": {"Monday": "7:30 AM - 9:00 PM"},
+        "address": "McMaster University",
+        "type": "EATERY",
+        "location": {"latitude": 43.2635, "longitude": -79.9175},
+        "image_url": "https://test.com",
+    }
+    return snapshot
+
+
+def _ids(catalog: POICatalog, classification=None):
+    """IDs of the POIs of the catalog, ordered by id"""
+    return [
+        poi.id
+        for poi, _ in catalog.geo_index().distances_from(
+            (43.2635, -79.9175), classification
+        )
+    ]
+
+
+@patch("app.locations.catalog.firestore_db")
+class TestPOICatalog(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = [
+            _poi_snapshot("tim_hortons_musc", "queue"),
+            _poi_snapshot("centro", "occupancy"),
+            _poi_snapshot("starbucks", "queue"),
+        ]
+
+    def test_loads_once(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        catalog = POICatalog()
+        self.assertEqual(_ids(catalog), ["centro", "starbucks", "tim_hortons_musc"])
+        self.assertEqual(
+            _ids(catalog, POIClassification.QUEUE), ["starbucks", "tim_hortons_musc"]
+        )
+        firebase_mock().collection().select().stream.assert_called_once()
+        self.assertEqual(catalog.stats()["hits"], 1)
+        self.assertEqual(catalog.stats()["misses"], 1)
+
+    def test_reads_summary_fields(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        catalog = POICatalog()
+        ((poi, _), *_) = catalog.geo_index().distances_from((43.2635, -79.9175))
+        self.assertIsInstance(poi, POISummary)
+        firebase_mock().collection().select.assert_called_with(POISummary.FIELDS)
+        firebase_mock().collection().stream.assert_not_called()
+
+    def test_get(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        document_get = firebase_mock().collection().document().get
+        document_get.return_value = _poi_snapshot("centro", "occupancy")
+        catalog = POICatalog()
+        # The details are read the first time they are requested
+        self.assertEqual(catalog.get("centro").address, "McMaster University")
+        self.assertEqual(catalog.get("centro").id, "centro")
+        document_get.assert_called_once()
+        self.assertEqual(catalog.stats()["hits"], 1)
+        self.assertEqual(catalog.stats()["misses"], 1)
+        self.assertEqual(catalog.stats()["details"], 1)
+
+        document_get.return_value = _poi_snapshot("missing", "queue", exists=False)
+        self.assertIsNone(catalog.get("missing"))
+        self.assertEqual(catalog.stats()["misses"], 2)
+
+    def test_get_falls_back_to_document(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        firebase_mock().collection().document().get.return_value = _poi_snapshot(
+            "la_piazza", "occupancy"
+        )
+        catalog = POICatalog()
+        self.assertEqual(catalog.get("la_piazza").id, "la_piazza")
+        self.assertEqual(len(_ids(catalog)), 4)
+
+    def test_ttl_refresh(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        catalog = POICatalog(ttl_seconds=0)
+        catalog.geo_index()
+        catalog.geo_index()
+        self.assertEqual(firebase_mock().collection().select().stream.call_count, 2)
+
+    def test_listener_keeps_catalog_fresh(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        firebase_mock().collection().on_snapshot().is_active = True
+        catalog = POICatalog(ttl_seconds=0)
+        catalog.start()
+        version = catalog.version
+        catalog._on_snapshot(self.snapshots[:1], [], None)
+        self.assertEqual(_ids(catalog), ["tim_hortons_musc"])
+        self.assertEqual(catalog.version, version + 1)
+        # The snapshot holds the whole documents so the details are served from memory
+        self.assertEqual(catalog.get("tim_hortons_musc").id, "tim_hortons_musc")
+        firebase_mock().collection().document().get.assert_not_called()
+        # The listener is active so the TTL is not used
+        firebase_mock().collection().select().stream.assert_called_once()
+        catalog.stop()
+        firebase_mock().collection().on_snapshot().unsubscribe.assert_called_once()
+
+    def test_invalid_document_is_skipped(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        firebase_mock().collection().on_snapshot().is_active = True
+        catalog = POICatalog()
+        catalog.start()
+        invalid = _poi_snapshot("broken", "queue")
+        invalid.to_dict.return_value = {"_id": "broken"}
+        with self.assertLogs("app.locations.catalog", "ERROR"):
+            catalog._on_snapshot([*self.snapshots, invalid], [], None)
+        self.assertEqual(_ids(catalog), ["centro", "starbucks", "tim_hortons_musc"])
+        self.assertTrue(catalog.stats()["listening"])
+        catalog.stop()
+
+    def test_revision(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        for i, snapshot in enumerate(self.snapshots):
+            snapshot.update_time = f"2023-03-0{i + 1}"
+        revision = POICatalog().revision()
+        self.assertEqual(POICatalog().revision(), revision)
+
+        self.snapshots[0].update_time = "2023-03-09"
+        self.assertNotEqual(POICatalog().revision(), revision)
+
+    def test_reload(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = self.snapshots
+        catalog = POICatalog()
+        catalog.geo_index()
+        catalog.reload()
+        self.assertEqual(catalog.stats()["reloads"], 2)
@@ -0,0 +1,347 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import call, patch, Mock
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import Increment
+
+from app.common import BadDataError
+from app.sharded_counter import counter_cache
+from app.unit_of_work import MAX_BATCH_WRITES
+from app.locations.current_estimate import (
+    CurrentEstimate,
+    EstimateSource,
+    estimate_bucket,
+)
+from app.locations import service
+from app.locations.poi import POI, POIClassification
+from app.locations.service import (
+    fetch_current_estimates,
+    record_wait_time_submission,
+    estimates_max_age,
+    estimates_revision,
+)
+
+# Sunday 13:25 in US/Eastern
+NOW = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+HOUR_START = datetime(2023, 3, 5, 18, 0, tzinfo=timezone.utc)
+BUCKET = estimate_bucket(HOUR_START)
+
+
+def _poi(poi_id: str, classification: POIClassification):
+    return POI(
+        id=poi_id,
+        name=poi_id,
+        classification=classification,
+        hours_of_operation={},
+        address="McMaster University",
+        poi_type="EATERY",
+        location={"latitude": 43.2635, "longitude": -79.9175},
+        image_url="",
+    )
+
+
+def _snapshot(poi_id: str, data, exists=True):
+    snapshot = Mock()
+    snapshot.id = poi_id
+    snapshot.exists = exists
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
+class TestCurrentEstimate(unittest.TestCase):
+    def test_to_from_dict(self):
+        current_estimate = CurrentEstimate(
+            "centro", 40, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+        )
+        current_estimate_dict = current_estimate.to_dict()
+        self.assertEqual(current_estimate_dict["source"], "histogram")
+        self.assertDictEqual(
+            CurrentEstimate.from_dict(current_estimate_dict).to_dict(),
+            current_estimate_dict,
+        )
+        with self.assertRaises(BadDataError):
+            CurrentEstimate.from_dict({"poi_id": "centro"})
+        with self.assertRaises(BadDataError):
+            CurrentEstimate.from_dict({**current_estimate_dict, "source": "unknown"})
+
+    def test_bucket(self):
+        current_estimate = CurrentEstimate(
+            "centro", 40, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+        )
+        self.assertTrue(current_estimate.is_current(estimate_bucket(NOW)))
+        self.assertFalse(
+            current_estimate.is_current(
+                estimate_bucket(HOUR_START + timedelta(hours=1))
+            )
+        )
+        # The same weekday and hour of the previous week is another bucket
+        self.assertFalse(
+            current_estimate.is_current(estimate_bucket(HOUR_START + timedelta(days=7)))
+        )
+        self.assertEqual(current_estimate.minutes_since_update(NOW), 25)
+        self.assertEqual(
+            current_estimate.minutes_since_update(HOUR_START - timedelta(minutes=1)),
+            0,
+        )
+
+
+@patch("app.locations.service.firestore_db")
+class TestCurrentEstimateService(unittest.TestCase):
+    def setUp(self):
+        service._estimate_writes.clear()
+        service._pending_estimate_writes.clear()
+        counter_cache().clear()
+
+    def test_fetch_current_estimates(self, firebase_mock):
+        firebase_mock().get_all.return_value = [
+            _snapshot(
+                "centro",
+                CurrentEstimate(
+                    "centro", 40, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+                ).to_dict(),
+            ),
+            _snapshot(
+                "tim_hortons_musc",
+                CurrentEstimate(
+                    "tim_hortons_musc",
+                    6.6,
+                    EstimateSource.SUBMISSIONS,
+                    BUCKET,
+                    NOW - timedelta(minutes=2),
+                    3,
+                ).to_dict(),
+            ),
+        ]
+        estimates = fetch_current_estimates(
+            [
+                _poi("centro", POIClassification.OCCUPANCY),
+                _poi("tim_hortons_musc", POIClassification.QUEUE),
+            ],
+            NOW,
+        )
+        # Histogram estimates get the peak adjustment, submissions are used as is
+        self.assertDictEqual(
+            estimates, {"centro": (50, 25), "tim_hortons_musc": (7, 2)}
+        )
+        firebase_mock().get_all.assert_called_once()
+        firebase_mock().batch().commit.assert_not_called()
+
+    def test_fetch_current_estimates_hour_rollover(self, firebase_mock):
+        firebase_mock().get_all.side_effect = [
+            [
+                _snapshot(
+                    "centro",
+                    CurrentEstimate(
+                        "centro",
+                        60,
+                        EstimateSource.SUBMISSIONS,
+                        estimate_bucket(HOUR_START - timedelta(hours=1)),
+                        HOUR_START - timedelta(minutes=10),
+                        2,
+                    ).to_dict(),
+                )
+            ],
+            [
+                _snapshot(
+                    "centro",
+                    {
+                        "poi_name": "centro",
+                        "class": "occupancy",
+                        "days": [],
+                        "slots": [None] * (7 * 24),
+                    },
+                )
+            ],
+        ]
+        estimates = fetch_current_estimates(
+            [_poi("centro", POIClassification.OCCUPANCY)], NOW
+        )
+        self.assertDictEqual(estimates, {"centro": (0, 25)})
+        # Only written if the stale estimate was not replaced since it was read
+        batch = firebase_mock().batch()
+        batch.set.assert_not_called()
+        batch.update.assert_called_once()
+        self.assertDictEqual(
+            batch.update.call_args[0][1],
+            CurrentEstimate(
+                "centro", None, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+            ).to_dict(),
+        )
+        self.assertEqual(
+            batch.update.call_args[1]["option"],
+            firebase_mock().write_option.return_value,
+        )
+        batch.commit.assert_called_once()
+
+    def test_fetch_current_estimates_previous_week(self, firebase_mock):
+        # Same weekday and hour one week earlier
+        firebase_mock().get_all.side_effect = [
+            [
+                _snapshot(
+                    "centro",
+                    CurrentEstimate(
+                        "centro",
+                        60,
+                        EstimateSource.SUBMISSIONS,
+                        estimate_bucket(HOUR_START - timedelta(days=7)),
+                        NOW - timedelta(days=7),
+                        2,
+                    ).to_dict(),
+                )
+            ],
+            [
+                _snapshot(
+                    "centro",
+                    {
+                        "poi_name": "centro",
+                        "class": "occupancy",
+                        "days": [],
+                        "slots": [None] * (7 * 24),
+                    },
+                )
+            ],
+        ]
+        estimates = fetch_current_estimates(
+            [_poi("centro", POIClassification.OCCUPANCY)], NOW
+        )
+        self.assertDictEqual(estimates, {"centro": (0, 25)})
+        # Only written if the stale estimate was not replaced since it was read
+        batch = firebase_mock().batch()
+        batch.set.assert_not_called()
+        batch.update.assert_called_once()
+        self.assertDictEqual(
+            batch.update.call_args[0][1],
+            CurrentEstimate(
+                "centro", None, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+            ).to_dict(),
+        )
+        self.assertEqual(
+            batch.update.call_args[1]["option"],
+            firebase_mock().write_option.return_value,
+        )
+        batch.commit.assert_called_once()
+
+    def test_fetch_current_estimates_write_conflict(self, firebase_mock):
+        histogram = {
+            "poi_name": "centro",
+            "class": "occupancy",
+            "days": [],
+            "slots": [None] * (7 * 24),
+        }
+        firebase_mock().get_all.side_effect = [
+            [_snapshot("centro", None, exists=False), _snapshot("musc", None, False)],
+            [_snapshot("centro", histogram), _snapshot("musc", histogram)],
+        ]
+        batch = firebase_mock().batch()
+        # A submission created the estimate of centro after it was read
+        batch.commit.side_effect = AlreadyExists("")
+        estimates = fetch_current_estimates(
+            [
+                _poi("centro", POIClassification.OCCUPANCY),
+                _poi("musc", POIClassification.OCCUPANCY),
+            ],
+            NOW,
+        )
+        self.assertDictEqual(estimates, {"centro": (0, 25), "musc": (0, 25)})
+        batch.set.assert_not_called()
+        # The batch is dropped, the next read of musc writes it again
+        self.assertEqual(batch.create.call_count, 2)
+        batch.commit.assert_called_once()
+
+    def test_histogram_estimates_are_written_in_chunks(self, firebase_mock):
+        estimate = CurrentEstimate(
+            "centro", None, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+        )
+        writer = service.HistogramEstimateWriter()
+        writer.submit(
+            {f"poi{i}": (None, estimate) for i in range(MAX_BATCH_WRITES + 1)}
+        )
+        batch = firebase_mock().batch()
+        self.assertEqual(batch.create.call_count, MAX_BATCH_WRITES + 1)
+        self.assertEqual(batch.commit.call_count, 2)
+        self.assertEqual(writer.stats()["written"], MAX_BATCH_WRITES + 1)
+
+    def test_histogram_estimates_are_written_in_the_background(self, firebase_mock):
+        estimate = CurrentEstimate(
+            "centro", None, EstimateSource.HISTOGRAM, BUCKET, HOUR_START
+        )
+        writer = service.HistogramEstimateWriter()
+        writer._thread = Mock()  # Queue the estimates without writing them
+        writer.submit({"centro": (None, estimate)})
+        writer.submit({"centro": (None, estimate), "musc": (None, estimate)})
+        firebase_mock().batch().commit.assert_not_called()
+        self.assertEqual(writer.stats()["pending"], 2)
+
+        writer._thread = None
+        writer.start()
+        writer.stop()
+        batch = firebase_mock().batch()
+        self.assertEqual(batch.create.call_count, 2)
+        batch.commit.assert_called_once()
+
+    def test_fetch_current_estimates_empty(self, firebase_mock):
+        self.assertDictEqual(fetch_current_estimates([], NOW), {})
+        firebase_mock().get_all.assert_not_called()
+
+    def test_record_wait_time_submission(self, firebase_mock):
+        current_estimate_ref = firebase_mock().collection().document()
+        counter_ref = current_estimate_ref.collection().document()
+        counter_ref.collection().stream.return_value = [
+            _snapshot("0", {"count": 2, "sum": 12}),
+            _snapshot("3", {"count": 1, "sum": 9}),
+        ]
+        record_wait_time_submission("tim_hortons_musc", 9, NOW)
+        self.assertEqual(
+            counter_ref.collection().document().set.call_args,
+            call({"count": Increment(1), "sum": Increment(9)}, merge=True),
+        )
+        current_estimate_ref.set.assert_called_once()
+        self.assertDictEqual(
+            current_estimate_ref.set.call_args[0][0],
+            CurrentEstimate(
+                "tim_hortons_musc", 7, EstimateSource.SUBMISSIONS, BUCKET, NOW, 3
+            ).to_dict(),
+        )
+
+    @patch("app.locations.service.threading.Timer")
+    def test_current_estimate_writes_are_coalesced(self, timer_mock, firebase_mock):
+        current_estimate_ref = firebase_mock().collection().document()
+        counter_ref = current_estimate_ref.collection().document()
+        counter_ref.collection().stream.return_value = [
+            _snapshot("0", {"count": 1, "sum": 9})
+        ]
+        for _ in range(3):
+            record_wait_time_submission("tim_hortons_musc", 9, NOW)
+        self.assertEqual(counter_ref.collection().document().set.call_count, 3)
+        current_estimate_ref.set.assert_called_once()
+        timer_mock.assert_called_once()
+
+        # A single trailing write sees the submissions made during the interval
+        counter_ref.collection().stream.return_value = [
+            _snapshot("0", {"count": 2, "sum": 15}),
+            _snapshot("1", {"count": 1, "sum": 9}),
+        ]
+        _, flush, args = timer_mock.call_args[0]
+        flush(*args)
+        self.assertEqual(current_estimate_ref.set.call_count, 2)
+        self.assertEqual(current_estimate_ref.set.call_args[0][0]["estimate"], 8)
+        self.assertEqual(
+            current_estimate_ref.set.call_args[0][0]["submission_count"], 3
+        )
+
+    def test_estimates_max_age(self, firebase_mock):
+        # The peak adjustment ends at 13:31
+        self.assertEqual(estimates_max_age(NOW), 6 * 60)
+        self.assertEqual(estimates_max_age(NOW + timedelta(seconds=30)), 6 * 60 - 30)
+        self.assertEqual(estimates_max_age(HOUR_START), 20 * 60)
+        self.assertEqual(estimates_max_age(NOW + timedelta(minutes=10)), 25 * 60)
+
+    def test_estimates_revision(self, firebase_mock):
+        self.assertEqual(
+            estimates_revision(NOW), estimates_revision(NOW + timedelta(seconds=30))
+        )
+        self.assertNotEqual(estimates_revision(NOW), estimates_revision(HOUR_START))
+        self.assertNotEqual(
+            estimates_revision(NOW), estimates_revision(NOW + timedelta(minutes=10))
+        )
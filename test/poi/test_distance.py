@@ -0,0 +1,47 @@
+import random
+import unittest
+
+import haversine
+import numpy as np
+
+from app.locations.distance import haversine_distances, coordinates_array
+from app.locations.poi import POI
+
+
+class TestDistance(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        rng = random.Random(7)
+        self.origin = (43.2635, -79.9175)
+        self.points = [
+            (rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(1000)
+        ]
+
+    def test_haversine_distances_matches_scalar(self):
+        distances = haversine_distances(self.origin, np.array(self.points))
+        expected = [
+            haversine.haversine(self.origin, p, unit=haversine.Unit.METERS)
+            for p in self.points
+        ]
+        np.testing.assert_allclose(distances, expected, rtol=1e-9)
+
+    def test_haversine_distances_empty(self):
+        self.assertEqual(
+            len(haversine_distances(self.origin, coordinates_array([]))), 0
+        )
+
+    def test_coordinates_array(self):
+        poi = POI(
+            id="tim_hortons_musc",
+            name="Tim Hortons MUSC",
+            classification="queue",
+            hours_of_operation={},
+            address="",
+            poi_type="EATERY",
+            location={"latitude": 43.2635, "longitude": -79.9175},
+            image_url="",
+        )
+        coordinates = coordinates_array([poi, poi])
+        self.assertEqual(coordinates.shape, (2, 2))
+        self.assertTrue(coordinates.flags["C_CONTIGUOUS"])
+        self.assertEqual(tuple(coordinates[0]), (43.2635, -79.9175))
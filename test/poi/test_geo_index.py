@@ -0,0 +1,130 @@
+import random
+import unittest
+
+import haversine
+
+from app.locations.geo_index import GeoGridIndex
+from app.locations.poi import POI, POIClassification
+
+
+def _poi(
+    poi_id: str,
+    classification: POIClassification,
+    latitude: float,
+    longitude: float,
+):
+    return POI(
+        id=poi_id,
+        name=poi_id,
+        classification=classification,
+        hours_of_operation={},
+        address="",
+        poi_type="EATERY",
+        location={"latitude": latitude, "longitude": longitude},
+        image_url="",
+    )
+
+
+class TestGeoGridIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        rng = random.Random(4)
+        self.pois = [
+            _poi(
+                f"poi_{i}",
+                rng.choice(list(POIClassification)),
+                43.26 + rng.uniform(-0.05, 0.05),
+                -79.92 + rng.uniform(-0.05, 0.05),
+            )
+            for i in range(500)
+        ]
+        self.index = GeoGridIndex(self.pois)
+        self.user_location = (43.2635, -79.9175)
+
+    def _brute_force(self, location, classification=None):
+        return sorted(
+            (
+                (
+                    poi,
+                    haversine.haversine(
+                        location,
+                        (poi.location["latitude"], poi.location["longitude"]),
+                        unit=haversine.Unit.METERS,
+                    ),
+                )
+                for poi in self.pois
+                if classification is None or poi.classification == classification
+            ),
+            key=lambda x: (x[1], x[0].id),
+        )
+
+    def _ids(self, results):
+        return [poi.id for poi, _ in results]
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 500)
+
+    def test_nearest(self):
+        expected = self._brute_force(self.user_location)
+        self.assertEqual(
+            self._ids(self.index.nearest(self.user_location, limit=10)),
+            self._ids(expected[:10]),
+        )
+        self.assertEqual(
+            self._ids(self.index.nearest(self.user_location)), self._ids(expected)
+        )
+
+    def test_nearest_after(self):
+        expected = self._brute_force(self.user_location)
+        poi, distance = expected[9]
+        self.assertEqual(
+            self._ids(
+                self.index.nearest(
+                    self.user_location, limit=10, after=(distance, poi.id)
+                )
+            ),
+            self._ids(expected[10:20]),
+        )
+
+    def test_nearest_with_classification(self):
+        expected = self._brute_force(self.user_location, POIClassification.QUEUE)
+        self.assertEqual(
+            self._ids(
+                self.index.nearest(
+                    self.user_location,
+                    limit=25,
+                    classification=POIClassification.QUEUE,
+                )
+            ),
+            self._ids(expected[:25]),
+        )
+
+    def test_nearest_with_radius(self):
+        expected = [x for x in self._brute_force(self.user_location) if x[1] <= 1500]
+        self.assertEqual(
+            self._ids(self.index.nearest(self.user_location, radius_m=1500)),
+            self._ids(expected),
+        )
+        self.assertEqual(
+            self._ids(self.index.nearest(self.user_location, limit=3, radius_m=1500)),
+            self._ids(expected[:3]),
+        )
+
+    def test_within(self):
+        expected = sorted(
+            poi.id for poi, d in self._brute_force(self.user_location) if d <= 1000
+        )
+        self.assertEqual(
+            self._ids(self.index.within(self.user_location, 1000)), expected
+        )
+
+    def test_far_away_location(self):
+        location = (0.0, 0.0)
+        self.assertEqual(
+            self._ids(self.index.nearest(location, limit=5)),
+            self._ids(self._brute_force(location)[:5]),
+        )
+        self.assertEqual(self.index.nearest(location, radius_m=1000), [])
+
+    def test_empty(self):
+        self.assertEqual(GeoGridIndex([]).nearest(self.user_location, limit=5), [])
@@ -0,0 +1,98 @@
+import unittest
+
+from app.common import BadDataError
+from app.locations.poi import Histogram, POIClassification
+
+
+class TestHistogram(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.histogram_dict = {
+            "poi_name": "tim_hortons_musc",
+            "class": "queue",
+            "histogram_data": {
+                "Sunday": {
+                    "day": "Sunday",
+                    "poi_name": "tim_hortons_musc",
+                    "hours": {"13": 7, "1": 1, "2": 2},
+                },
+                "Monday": {
+                    "day": "Monday",
+                    "poi_name": "tim_hortons_musc",
+                    "hours": {"2": 2.5},
+                },
+            },
+        }
+
+    def test_to_from_dict(self):
+        histogram = Histogram.from_dict(self.histogram_dict)
+        self.assertEqual(histogram.classification, POIClassification.QUEUE)
+        self.assertDictEqual(histogram.to_dict(), self.histogram_dict)
+
+    def test_slots(self):
+        histogram = Histogram.from_dict(self.histogram_dict)
+        self.assertEqual(histogram.slots.shape, (7, 24))
+        self.assertEqual(histogram.estimate_at("Sunday", 13), 7)
+        self.assertEqual(histogram.estimate_at("Monday", 2), 2.5)
+        self.assertIsNone(histogram.estimate_at("Monday", 3))
+        self.assertIsNone(histogram.estimate_at("Tuesday", 2))
+        self.assertIsNone(histogram.estimate_at("Sunday", 24))
+
+    def test_series(self):
+        histogram = Histogram.from_dict(self.histogram_dict)
+        self.assertEqual(
+            histogram.series("Sunday"),
+            [
+                {"time": 1, "estimate": 1},
+                {"time": 2, "estimate": 2},
+                {"time": 13, "estimate": 7},
+            ],
+        )
+        self.assertIsInstance(histogram.series("Sunday")[0]["estimate"], int)
+        self.assertTrue(histogram.has_day("Monday"))
+        self.assertFalse(histogram.has_day("Tuesday"))
+        self.assertEqual(histogram.series("Tuesday"), [])
+
+    def test_empty_day(self):
+        histogram = Histogram.from_dict(
+            {
+                "poi_name": "centro",
+                "class": "occupancy",
+                "histogram_data": {
+                    "Friday": {"day": "Friday", "poi_name": "centro", "hours": {}}
+                },
+            }
+        )
+        self.assertTrue(histogram.has_day("Friday"))
+        self.assertEqual(histogram.series("Friday"), [])
+
+    def test_bad_data(self):
+        with self.assertRaises(BadDataError):
+            Histogram.from_dict({"poi_name": "centro", "class": "occupancy"})
+        with self.assertRaises(BadDataError):
+            Histogram.from_dict(
+                {
+                    "poi_name": "centro",
+                    "class": "occupancy",
+                    "histogram_data": {"Friday": {"hours": {"25": 1}}},
+                }
+            )
+
+    def test_to_from_consolidated_dict(self):
+        histogram = Histogram.from_dict(self.histogram_dict)
+        consolidated = histogram.to_consolidated_dict()
+        self.assertTrue(Histogram.is_consolidated(consolidated))
+        self.assertFalse(Histogram.is_consolidated(self.histogram_dict))
+        self.assertEqual(consolidated["days"], ["Monday", "Sunday"])
+        self.assertEqual(len(consolidated["slots"]), 7 * 24)
+        self.assertEqual(consolidated["slots"][6 * 24 + 13], 7)
+        self.assertIsNone(consolidated["slots"][0])
+
+        histogram = Histogram.from_consolidated_dict(consolidated)
+        self.assertDictEqual(histogram.to_dict(), self.histogram_dict)
+
+    def test_bad_consolidated_data(self):
+        with self.assertRaises(BadDataError):
+            Histogram.from_consolidated_dict(
+                {"poi_name": "centro", "class": "occupancy", "days": [], "slots": [1]}
+            )
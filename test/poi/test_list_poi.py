@@ -0,0 +1,243 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from app.locations.catalog import poi_catalog
+from app.base_api_error import InvalidCursorError
+from app.locations.poi import POIClassification
+from app.locations.service import list_POI, _hourly_estimates
+
+
+def _poi_dict(poi_id: str, classification: str, latitude: float, longitude: float):
+    return {
+        "_id": poi_id,
+        "name": poi_id,
+        "class": classification,
+        "hours_of_operation": {"Monday": "7:30 AM - 9:00 PM"},
+        "address": "McMaster University",
+        "type": "EATERY",
+        "location": {"latitude": latitude, "longitude": longitude},
+        "image_url": "https://test.com",
+    }
+
+
+def _poi_snapshot(poi: dict):
+    snapshot = Mock()
+    snapshot.id = poi["_id"]
+    snapshot.to_dict.return_value = poi
+    return snapshot
+
+
+def _histogram_base_snapshot(poi_id: str, classification: str, sunday: dict):
+    slots = [None] * (7 * 24)
+    for hour, estimate in sunday.items():
+        slots[6 * 24 + int(hour)] = estimate
+    snapshot = Mock()
+    snapshot.exists = True
+    snapshot.id = poi_id
+    snapshot.to_dict.return_value = {
+        "poi_name": poi_id,
+        "class": classification,
+        "days": ["Sunday"] if sunday else [],
+        "slots": slots,
+    }
+    return snapshot
+
+
+def _legacy_base_snapshot(poi_id: str, classification: str):
+    snapshot = Mock()
+    snapshot.exists = True
+    snapshot.id = poi_id
+    snapshot.to_dict.return_value = {"poi_name": poi_id, "class": classification}
+    return snapshot
+
+
+def _current_estimate_snapshot(current_estimate: dict):
+    snapshot = Mock()
+    snapshot.exists = True
+    snapshot.id = current_estimate["poi_id"]
+    snapshot.to_dict.return_value = current_estimate
+    return snapshot
+
+
+def _histogram_day_snapshot(poi_id: str, hours: dict, exists: bool = True):
+    snapshot = Mock()
+    snapshot.exists = exists
+    snapshot.reference.parent.parent.id = poi_id
+    snapshot.to_dict.return_value = {
+        "poi_name": poi_id,
+        "day": "Sunday",
+        "hours": hours,
+    }
+    return snapshot
+
+
+@patch("app.locations.service.firestore_db")
+class TestListPOI(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.user_location = (43.2635, -79.9175)
+        self.pois = [
+            _poi_dict("tim_hortons_musc", "queue", 43.2635, -79.9175),
+            _poi_dict("centro", "occupancy", 43.2610, -79.9190),
+            _poi_dict("starbucks", "queue", 43.2600, -79.9200),
+        ]
+        self.histogram_snapshots = [
+            _histogram_base_snapshot("centro", "occupancy", {"13": 40}),
+            _histogram_base_snapshot("tim_hortons_musc", "queue", {"13": 7}),
+            _histogram_base_snapshot("starbucks", "queue", {}),
+        ]
+
+    def test_hourly_estimates_single_multi_get(self, firebase_mock):
+        firebase_mock().get_all.return_value = self.histogram_snapshots
+        estimates = _hourly_estimates(
+            ["tim_hortons_musc", "centro", "starbucks"], "Sunday", 13
+        )
+        self.assertDictEqual(
+            estimates, {"tim_hortons_musc": 7, "centro": 40, "starbucks": None}
+        )
+        firebase_mock().get_all.assert_called_once()
+        self.assertEqual(len(firebase_mock().get_all.call_args[0][0]), 3)
+
+    def test_hourly_estimates_legacy_layout(self, firebase_mock):
+        firebase_mock().get_all.side_effect = [
+            [
+                self.histogram_snapshots[1],
+                _legacy_base_snapshot("centro", "occupancy"),
+                _legacy_base_snapshot("starbucks", "queue"),
+            ],
+            [
+                _histogram_day_snapshot("centro", {"13": 40}),
+                _histogram_day_snapshot("starbucks", {}, exists=False),
+            ],
+        ]
+        estimates = _hourly_estimates(
+            ["tim_hortons_musc", "centro", "starbucks"], "Sunday", 13
+        )
+        self.assertDictEqual(
+            estimates, {"tim_hortons_musc": 7, "centro": 40, "starbucks": None}
+        )
+        # Only the POIs still in the legacy layout read their day document
+        self.assertEqual(firebase_mock().get_all.call_count, 2)
+        self.assertEqual(len(firebase_mock().get_all.call_args[0][0]), 2)
+        firebase_mock().get_all.side_effect = None
+
+    def test_hourly_estimates_empty(self, firebase_mock):
+        self.assertDictEqual(_hourly_estimates([], "Sunday", 13), {})
+        firebase_mock().get_all.assert_not_called()
+
+    @patch("app.locations.catalog.firestore_db")
+    def test_list_POI_reads_per_call(self, catalog_firebase_mock, firebase_mock):
+        poi_catalog().invalidate()
+        catalog_firebase_mock().collection().select().stream.return_value = list(
+            map(_poi_snapshot, self.pois)
+        )
+        # No current estimates are materialized yet
+        firebase_mock().get_all.side_effect = [[], self.histogram_snapshots]
+        written = {}
+        firebase_mock().batch().create.side_effect = lambda ref, data: written.update(
+            {data["poi_id"]: data}
+        )
+        document_get = firebase_mock().collection().document().get
+        document_get.reset_mock()
+
+        results, next_cursor = list_POI(self.user_location, sort_by="distance")
+        self.assertIsNone(next_cursor)
+
+        # One query to load the POI catalog, one multi-get for the current estimates and
+        # one multi-get for the histograms of the missing estimates
+        self.assertEqual(
+            catalog_firebase_mock().collection().select().stream.call_count, 1
+        )
+        self.assertEqual(firebase_mock().get_all.call_count, 2)
+        firebase_mock().batch().commit.assert_called_once()
+        document_get.assert_not_called()
+        self.assertEqual(
+            [poi.id for poi, _, _, _ in results],
+            ["tim_hortons_musc", "centro", "starbucks"],
+        )
+        self.assertEqual(len(written), 3)
+        for poi, estimate, distance, last_updated in results:
+            self.assertIsInstance(estimate, int)
+            self.assertGreaterEqual(distance, 0)
+            self.assertTrue(0 <= last_updated < 60)
+            self.assertEqual(written[poi.id]["source"], "histogram")
+
+        # The POI catalog is served from memory and the estimates are materialized
+        firebase_mock().get_all.side_effect = None
+        firebase_mock().get_all.return_value = [
+            _current_estimate_snapshot(d) for d in written.values()
+        ]
+        list_POI(self.user_location, sort_by="distance")
+        self.assertEqual(
+            catalog_firebase_mock().collection().select().stream.call_count, 1
+        )
+        self.assertEqual(firebase_mock().get_all.call_count, 3)
+        firebase_mock().batch().commit.assert_called_once()
+        poi_catalog().invalidate()
+
+    @patch("app.locations.catalog.firestore_db")
+    def test_list_POI_radius_and_limit(self, catalog_firebase_mock, firebase_mock):
+        poi_catalog().invalidate()
+        catalog_firebase_mock().collection().select().stream.return_value = list(
+            map(_poi_snapshot, self.pois)
+        )
+        firebase_mock().get_all.return_value = self.histogram_snapshots
+
+        results, next_cursor = list_POI(self.user_location, sort_by="distance", limit=2)
+        self.assertEqual(
+            [poi.id for poi, _, _, _ in results], ["tim_hortons_musc", "centro"]
+        )
+        self.assertIsNotNone(next_cursor)
+        # Only the estimates of the selected POIs and of the first POI of the next page
+        # are read
+        self.assertEqual(len(firebase_mock().get_all.call_args[0][0]), 3)
+
+        results, _ = list_POI(self.user_location, radius_m=350)
+        self.assertEqual(
+            [poi.id for poi, _, _, _ in results], ["centro", "tim_hortons_musc"]
+        )
+
+        results, _ = list_POI(
+            self.user_location,
+            classification=POIClassification.QUEUE,
+            sort_by="estimate",
+            limit=1,
+        )
+        self.assertEqual([poi.id for poi, _, _, _ in results], ["starbucks"])
+        poi_catalog().invalidate()
+
+    @patch("app.locations.catalog.firestore_db")
+    def test_list_POI_cursor(self, catalog_firebase_mock, firebase_mock):
+        poi_catalog().invalidate()
+        catalog_firebase_mock().collection().select().stream.return_value = list(
+            map(_poi_snapshot, self.pois)
+        )
+        firebase_mock().get_all.return_value = self.histogram_snapshots
+
+        for sort_by in [None, "distance", "estimate"]:
+            expected, next_cursor = list_POI(self.user_location, sort_by=sort_by)
+            self.assertIsNone(next_cursor)
+            pages = []
+            while True:
+                results, next_cursor = list_POI(
+                    self.user_location, sort_by=sort_by, limit=2, cursor=next_cursor
+                )
+                pages.append([poi.id for poi, _, _, _ in results])
+                if next_cursor is None:
+                    break
+            self.assertEqual(
+                [len(page) for page in pages], [2, 1], f"sort_by={sort_by}"
+            )
+            self.assertEqual(
+                [poi_id for page in pages for poi_id in page],
+                [poi.id for poi, _, _, _ in expected],
+                f"sort_by={sort_by}",
+            )
+
+        _, cursor = list_POI(self.user_location, sort_by="distance", limit=1)
+        # A cursor can only be used with the sort it was made for
+        with self.assertRaises(InvalidCursorError):
+            list_POI(self.user_location, sort_by="estimate", cursor=cursor)
+        with self.assertRaises(InvalidCursorError):
+            list_POI(self.user_location, cursor="not a cursor")
+        poi_catalog().invalidate()
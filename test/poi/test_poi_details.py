@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from app.locations.errors import POINotFoundError
+from app.locations.poi import POI
+from app.locations.service import fetch_POI_details
+
+
+def _snapshot(data, exists=True):
+    snapshot = Mock()
+    snapshot.exists = exists
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
+@patch("app.locations.service.get_details_for_POI")
+@patch("app.locations.service.firestore_db")
+class TestFetchPOIDetails(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.poi = POI(
+            id="tim_hortons_musc",
+            name="Tim Hortons MUSC",
+            classification="queue",
+            hours_of_operation={},
+            address="McMaster University Student Centre",
+            poi_type="EATERY",
+            location={"latitude": 43.2635, "longitude": -79.9175},
+            image_url="",
+        )
+
+    def setUp(self):
+        self.collections = {
+            "histogram": Mock(),
+            "current_estimate": Mock(),
+        }
+        self.collections["current_estimate"].document().get.return_value = _snapshot(
+            None, exists=False
+        )
+
+    def _collection(self, name):
+        return self.collections[name]
+
+    def test_fetch_POI_details(self, firebase_mock, get_details_mock):
+        get_details_mock.return_value = self.poi
+        firebase_mock().collection.side_effect = self._collection
+        histogram = self.collections["histogram"].document()
+        histogram.get.return_value = _snapshot(
+            {"poi_name": "tim_hortons_musc", "class": "queue"}
+        )
+        histogram.collection().stream.return_value = [
+            _snapshot(
+                {
+                    "poi_name": "tim_hortons_musc",
+                    "day": "Sunday",
+                    "hours": {"2": 2, "1": 1},
+                }
+            )
+        ]
+
+        poi, estimate, last_updated, series = fetch_POI_details(
+            "tim_hortons_musc", "Sunday"
+        )
+        self.assertEqual(poi, self.poi)
+        self.assertTrue(0 <= last_updated < 60)
+        self.assertEqual(
+            series, [{"time": 1, "estimate": 1}, {"time": 2, "estimate": 2}]
+        )
+        # The missing current estimate is materialized from the histogram
+        create = firebase_mock().batch().create
+        create.assert_called_once()
+        self.assertEqual(create.call_args[0][1]["source"], "histogram")
+
+    def test_fetch_POI_details_consolidated(self, firebase_mock, get_details_mock):
+        get_details_mock.return_value = self.poi
+        firebase_mock().collection.side_effect = self._collection
+        slots = [None] * (7 * 24)
+        slots[6 * 24 + 1] = 1
+        slots[6 * 24 + 2] = 2
+        histogram = self.collections["histogram"].document()
+        histogram.get.return_value = _snapshot(
+            {
+                "poi_name": "tim_hortons_musc",
+                "class": "queue",
+                "days": ["Sunday"],
+                "slots": slots,
+            }
+        )
+        histogram.collection().stream.reset_mock()
+
+        poi, estimate, last_updated, series = fetch_POI_details(
+            "tim_hortons_musc", "Sunday"
+        )
+        self.assertEqual(poi, self.poi)
+        self.assertEqual(
+            series, [{"time": 1, "estimate": 1}, {"time": 2, "estimate": 2}]
+        )
+        # The whole week is in the histogram document
+        histogram.collection().stream.assert_not_called()
+
+    def test_fetch_POI_details_not_found(self, firebase_mock, get_details_mock):
+        get_details_mock.side_effect = POINotFoundError("missing")
+        firebase_mock().collection().document().get.return_value = _snapshot(
+            None, exists=False
+        )
+        with self.assertRaises(POINotFoundError):
+            fetch_POI_details("missing")
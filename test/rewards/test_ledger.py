@@ -0,0 +1,161 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from google.cloud.firestore import ArrayRemove, ArrayUnion, Increment
+
+from app.common import BadDataError
+from app.events.event import (
+    Event,
+    EventType,
+    RewardPointsAddPayload,
+    RewardSource,
+)
+from app.rewards import ledger as reward_ledger
+from app.rewards.ledger import LEDGER_RECENT_ENTRIES, LedgerEntry, RewardLedger
+
+CREATED = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+
+
+def _reward_event(email: str, source: RewardSource, points: int, minutes: int = 0):
+    return Event(
+        EventType.REWARD_POINTS_ADD,
+        email,
+        RewardPointsAddPayload(source, points),
+        CREATED + timedelta(minutes=minutes),
+    )
+
+
+def _snapshot(id: str, data=None):
+    snapshot = MagicMock()
+    snapshot.id = id
+    snapshot.exists = data is not None
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
+@patch("app.rewards.ledger.firestore_db")
+class TestRewardLedger(unittest.TestCase):
+    """Test the reward ledger"""
+
+    @classmethod
+    def setUpClass(self):
+        self.email = "test@sample.ca"
+
+    def test_from_events(self, firebase_mock):
+        ledger = RewardLedger.from_events(
+            self.email,
+            [
+                ("a", _reward_event(self.email, RewardSource.REFERRED_BONUS, 200, 0)),
+                ("b", _reward_event(self.email, RewardSource.WAITTIME_SUBMIT, 25, 2)),
+                ("c", _reward_event(self.email, RewardSource.WAITTIME_SUBMIT, 25, 1)),
+            ],
+        )
+        self.assertTrue(ledger.complete)
+        self.assertEqual(ledger.balance, 250)
+        self.assertDictEqual(
+            ledger.sources, {"referred_bonus": 200, "waittime_submit": 50}
+        )
+        self.assertEqual([entry.event_id for entry in ledger.recent], ["b", "c", "a"])
+
+    def test_dict_round_trip(self, firebase_mock):
+        ledger = RewardLedger(
+            self.email,
+            25,
+            {"waittime_submit": 25},
+            [LedgerEntry(RewardSource.WAITTIME_SUBMIT, 25, CREATED)],
+            True,
+        )
+        self.assertEqual(
+            RewardLedger.from_dict(self.email, ledger.to_dict()).to_dict(),
+            ledger.to_dict(),
+        )
+        with self.assertRaises(BadDataError):
+            RewardLedger.from_dict(self.email, {"recent": []})
+
+    def test_find_ledger(self, firebase_mock):
+        firebase_mock().collection().document().get.return_value = _snapshot(self.email)
+        self.assertIsNone(reward_ledger.find_ledger(self.email))
+
+        firebase_mock().collection().document().get.return_value = _snapshot(
+            self.email, RewardLedger(self.email, 200, complete=True).to_dict()
+        )
+        ledger = reward_ledger.find_ledger(self.email)
+        self.assertEqual(ledger.balance, 200)
+        self.assertTrue(ledger.complete)
+
+    def test_find_ledger_trims_recent_entries(self, firebase_mock):
+        entries = [
+            LedgerEntry(
+                RewardSource.WAITTIME_SUBMIT, 25, CREATED + timedelta(minutes=i)
+            )
+            for i in range(reward_ledger.LEDGER_TRIM_ENTRIES + 1)
+        ]
+        ledger_ref = firebase_mock().collection().document()
+        ledger_ref.get.return_value = _snapshot(
+            self.email, RewardLedger(self.email, 25, recent=entries).to_dict()
+        )
+        ledger = reward_ledger.find_ledger(self.email)
+        # Newest first
+        self.assertEqual(ledger.recent, entries[::-1][:LEDGER_RECENT_ENTRIES])
+        ledger_ref.update.assert_called_once_with(
+            {
+                "recent": ArrayRemove(
+                    [entry.to_dict() for entry in entries[::-1][LEDGER_RECENT_ENTRIES:]]
+                )
+            }
+        )
+
+        # Not trimmed until there are more than LEDGER_TRIM_ENTRIES
+        ledger_ref.update.reset_mock()
+        ledger_ref.get.return_value = _snapshot(
+            self.email, RewardLedger(self.email, 25, recent=entries[1:]).to_dict()
+        )
+        ledger = reward_ledger.find_ledger(self.email)
+        self.assertEqual(len(ledger.recent), LEDGER_RECENT_ENTRIES)
+        ledger_ref.update.assert_not_called()
+
+    def test_record_reward(self, firebase_mock):
+        entry_created = CREATED + timedelta(minutes=1)
+        reward_ledger.record_reward(
+            self.email, RewardSource.WAITTIME_SUBMIT, 25, entry_created
+        )
+        (update,) = firebase_mock().collection().document().set.call_args[0]
+        self.assertTrue(
+            firebase_mock().collection().document().set.call_args[1]["merge"]
+        )
+        self.assertEqual(update["balance"], Increment(25))
+        self.assertEqual(update["sources"], {"waittime_submit": Increment(25)})
+        self.assertEqual(
+            update["recent"],
+            ArrayUnion(
+                [LedgerEntry(RewardSource.WAITTIME_SUBMIT, 25, entry_created).to_dict()]
+            ),
+        )
+        # The ledger is not read
+        firebase_mock().collection().document().get.assert_not_called()
+
+    @patch("app.rewards.ledger.MAX_BATCH_WRITES", 2)
+    def test_reconcile_ledgers(self, firebase_mock):
+        other_email = "other@sample.ca"
+        events = [
+            _reward_event(self.email, RewardSource.REFERRED_BONUS, 200),
+            _reward_event(other_email, RewardSource.REFERRAL_BONUS, 200),
+            _reward_event(self.email, RewardSource.WAITTIME_SUBMIT, 25),
+        ]
+        firebase_mock().collection().where().stream.return_value = [
+            _snapshot("", event.to_dict()) for event in events
+        ]
+        firebase_mock().collection().select().stream.return_value = [
+            _snapshot(self.email),
+            _snapshot(other_email),
+        ]
+
+        self.assertEqual(reward_ledger.reconcile_ledgers(), 2)
+        self.assertEqual(firebase_mock().batch().commit.call_count, 2)
+        balances = [
+            set_call[0][1]["reward_point_balance"]
+            for set_call in firebase_mock().batch().set.call_args_list
+            if "reward_point_balance" in set_call[0][1]
+        ]
+        self.assertEqual(balances, [225, 200])
@@ -0,0 +1,160 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from app.rewards.errors import ReferralCodePoolExhaustedError
+from datetime import datetime
+
+from google.api_core.exceptions import FailedPrecondition
+
+from app.rewards import referral_pool
+from app.rewards.referral_pool import (
+    ReferralCodePool,
+    _release_code,
+    _reserve_codes,
+    reclaim_stale_reservations,
+)
+
+
+def _code_snapshot(code_ref, exists: bool):
+    snapshot = MagicMock()
+    snapshot.reference = code_ref
+    snapshot.exists = exists
+    return snapshot
+
+
+@patch("app.rewards.referral_pool._reserve_codes")
+@patch("app.rewards.referral_pool.firestore_db")
+class TestReferralCodePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ReferralCodePool(size=4, low_water=2)
+
+    def _reserve_all(self, transaction, code_refs):
+        return [f"CODE{i:02}" for i in range(len(code_refs))]
+
+    def test_take_reserves_on_demand(self, firebase_mock, reserve_mock):
+        reserve_mock.side_effect = self._reserve_all
+        codes = [self.pool.take() for _ in range(4)]
+        self.assertEqual(codes, ["CODE00", "CODE01", "CODE02", "CODE03"])
+        reserve_mock.assert_called_once()
+        self.assertEqual(len(reserve_mock.call_args[0][1]), 4)
+        self.pool.take()
+        self.assertEqual(reserve_mock.call_count, 2)
+        self.assertEqual(self.pool.stats()["taken"], 5)
+
+    def test_collisions_are_not_pooled(self, firebase_mock, reserve_mock):
+        reserve_mock.side_effect = lambda transaction, code_refs: ["FREEAA"]
+        self.pool.refill()
+        stats = self.pool.stats()
+        self.assertEqual((stats["size"], stats["collisions"]), (1, 3))
+        self.pool.refill()
+        self.assertEqual(reserve_mock.call_count, 2)
+        # Only the missing codes are reserved
+        self.assertEqual(len(reserve_mock.call_args[0][1]), 3)
+
+    def test_pool_exhausted(self, firebase_mock, reserve_mock):
+        reserve_mock.return_value = []
+        with self.assertRaises(ReferralCodePoolExhaustedError):
+            self.pool.take()
+
+    def test_low_water_wakes_refiller(self, firebase_mock, reserve_mock):
+        reserve_mock.side_effect = self._reserve_all
+        self.pool.refill()
+        self.pool.take()
+        self.assertFalse(self.pool._wakeup.is_set())
+        self.pool.take()
+        self.pool.take()
+        self.assertTrue(self.pool._wakeup.is_set())
+
+    def test_expired_codes_are_not_taken(self, firebase_mock, reserve_mock):
+        reserve_mock.side_effect = self._reserve_all
+        self.pool.refill()
+        with patch("app.rewards.referral_pool.time.monotonic") as monotonic_mock:
+            monotonic_mock.return_value = (
+                self.pool._codes[0][1]
+                + referral_pool.REFERRAL_CODE_RESERVATION_TTL_SECONDS
+            )
+            self.assertEqual(self.pool.take(), "CODE00")
+        # The 4 expired codes are released and new codes are reserved
+        self.assertEqual(firebase_mock().batch().delete.call_count, 4)
+        self.assertEqual(reserve_mock.call_count, 2)
+        self.assertEqual(self.pool.stats()["expired"], 4)
+
+    @patch("app.rewards.referral_pool._release_code", return_value=True)
+    def test_release_code(self, release_mock, firebase_mock, reserve_mock):
+        self.pool.release_code("ABCDEF")
+        release_mock.assert_called_once()
+        self.assertEqual(
+            release_mock.call_args[0][1].id, firebase_mock().collection().document().id
+        )
+        self.assertEqual(self.pool.stats()["released"], 1)
+
+        # Errors are logged, the reservation expires
+        release_mock.side_effect = Exception("unavailable")
+        self.pool.release_code("ABCDEF")
+        self.assertEqual(self.pool.stats()["released"], 1)
+
+    def test_stop_releases_codes(self, firebase_mock, reserve_mock):
+        reserve_mock.side_effect = self._reserve_all
+        self.pool.start()
+        self.pool.stop()
+        self.assertEqual(firebase_mock().batch().delete.call_count, 4)
+        firebase_mock().batch().commit.assert_called_once()
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+
+class TestReserveCodes(unittest.TestCase):
+    @patch("app.rewards.referral_pool.firestore_db")
+    def test_only_free_codes_are_created(self, firebase_mock):
+        taken_ref, free_ref = MagicMock(), MagicMock()
+        free_ref.id = "FREEAA"
+        transaction = MagicMock()
+        transaction.get_all.return_value = [
+            _code_snapshot(taken_ref, True),
+            _code_snapshot(free_ref, False),
+        ]
+        self.assertEqual(
+            _reserve_codes.to_wrap(transaction, [taken_ref, free_ref]), ["FREEAA"]
+        )
+        transaction.create.assert_called_once_with(
+            free_ref,
+            {"owner": None, "reserved_at": referral_pool.firestore.SERVER_TIMESTAMP},
+        )
+
+    @patch("app.rewards.referral_pool.firestore_db")
+    def test_release_unowned_code(self, firebase_mock):
+        code_ref, transaction = MagicMock(), MagicMock()
+        code_ref.get.return_value = _code_snapshot(code_ref, True)
+        code_ref.get.return_value.to_dict.return_value = {"owner": None}
+        self.assertTrue(_release_code.to_wrap(transaction, code_ref))
+        code_ref.get.assert_called_once_with(transaction=transaction)
+        transaction.delete.assert_called_once_with(code_ref)
+
+        # Assigned to a user in the meantime
+        transaction.reset_mock()
+        code_ref.get.return_value.to_dict.return_value = {"owner": "a@b.ca"}
+        self.assertFalse(_release_code.to_wrap(transaction, code_ref))
+        transaction.delete.assert_not_called()
+
+
+@patch("app.rewards.referral_pool.firestore_db")
+class TestReclaimStaleReservations(unittest.TestCase):
+    def test_reclaims_unowned_reservations(self, firebase_mock):
+        stale, owned, claimed = MagicMock(), MagicMock(), MagicMock()
+        stale.to_dict.return_value = {
+            "owner": None,
+            "reserved_at": datetime(2023, 1, 1),
+        }
+        owned.to_dict.return_value = {"owner": "a@b.ca"}
+        claimed.to_dict.return_value = {"owner": None}
+        # Assigned to a user after the query
+        claimed.reference.delete.side_effect = FailedPrecondition("updated")
+        query = firebase_mock().collection().where
+        query().stream.return_value = [stale, owned, claimed]
+
+        self.assertEqual(reclaim_stale_reservations(60), 1)
+        self.assertEqual(query.call_args[0][:2], ("reserved_at", "<"))
+        stale.reference.delete.assert_called_once_with(
+            option=firebase_mock().write_option.return_value
+        )
+        firebase_mock().write_option.assert_any_call(last_update_time=stale.update_time)
+        owned.reference.delete.assert_not_called()
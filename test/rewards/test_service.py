@@ -4,6 +4,13 @@ from unittest.mock import patch, Mock
 from app.rewards import service as rewards_service
 
 
+def _snapshot(exists: bool, data=None):
+    snapshot = Mock()
+    snapshot.exists = exists
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
 @patch("app.rewards.service.firestore_db")
 class TestRewardsService(unittest.TestCase):
     """Test the rewards service"""
@@ -12,19 +19,33 @@ class TestRewardsService(unittest.TestCase):
     def setUpClass(self):
         self.email = "test@sample.ca"
 
-    def test_generates_accurate_referral_code(self, firebase_mock):
-        firebase_mock().collection().document().get().exists = False
-        referral_code = rewards_service.create_unique_referral_code()
-        self.assertTrue(len(referral_code) == 6)
-
-    def test_generates_unique_referral_code(self, firebase_mock):
-        def func(code):
-            mock = Mock()
-            mock.get().exists = True if code == "ABCDEF" else False
-            return mock
-
-        with patch.object(rewards_service, "_generate_unique_code") as mock:
-            mock.side_effect = ["ABCDEF", "XYZABC"]
-            firebase_mock().collection().document.side_effect = func
-            referral_code = rewards_service.create_unique_referral_code()
-            self.assertTrue(referral_code == "XYZABC")
+    def test_referral_code_comes_from_pool(self, firebase_mock):
+        with patch("app.rewards.service.referral_code_pool") as pool_mock:
+            pool_mock().take.return_value = "XYZABC"
+            self.assertEqual(rewards_service.create_unique_referral_code(), "XYZABC")
+        firebase_mock().collection().document().get.assert_not_called()
+
+    def test_save_referral_code_stores_owner(self, firebase_mock):
+        rewards_service.save_referral_code("XYZABC", self.email)
+        firebase_mock().collection().document().set.assert_called_once_with(
+            {"owner": self.email}, merge=False
+        )
+
+    def test_find_referral_code_owner(self, firebase_mock):
+        code_ref = firebase_mock().collection().document()
+        code_ref.get.return_value = _snapshot(True, {"owner": self.email})
+        self.assertEqual(rewards_service.find_referral_code_owner("XYZABC"), self.email)
+        firebase_mock().collection().where.assert_not_called()
+
+        # Reserved by a pool, not assigned yet
+        code_ref.get.return_value = _snapshot(True, {"owner": None})
+        self.assertIsNone(rewards_service.find_referral_code_owner("XYZABC"))
+        code_ref.get.return_value = _snapshot(False)
+        self.assertIsNone(rewards_service.find_referral_code_owner("XYZABC"))
+
+    def test_find_legacy_referral_code_owner(self, firebase_mock):
+        firebase_mock().collection().document().get.return_value = _snapshot(True, {})
+        user_doc = Mock()
+        user_doc.id = self.email
+        firebase_mock().collection().where().limit().get.return_value = [user_doc]
+        self.assertEqual(rewards_service.find_referral_code_owner("XYZABC"), self.email)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from app.asgi import AsgiApp
+
+
+async def _request(application, method, path, query=""):
+    """Run a request through the ASGI application, return (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode("latin-1"),
+        "headers": [(b"authorization", b"Bearer token")],
+        "server": ("localhost", 5000),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    response_headers = {
+        name.decode("latin-1").lower(): value.decode("latin-1")
+        for name, value in sent[0]["headers"]
+    }
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return sent[0]["status"], response_headers, body
+
+
+def _call(application, method, path, query=""):
+    return asyncio.run(_request(application, method, path, query))
+
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        self.wsgi_app = Mock(
+            side_effect=lambda environ, start_response: start_response(
+                "200 OK", [("Content-Type", "text/plain")]
+            )
+            or [b"wsgi"]
+        )
+        self.application = AsgiApp(self.wsgi_app)
+
+    def test_requests_are_served_by_the_wsgi_app(self):
+        status, headers, body = _call(
+            self.application, "GET", "/api/places/list", "latitude=43.2"
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "text/plain")
+        self.assertEqual(body, b"wsgi")
+        environ = self.wsgi_app.call_args[0][0]
+        self.assertEqual(environ["PATH_INFO"], "/api/places/list")
+        self.assertEqual(environ["QUERY_STRING"], "latitude=43.2")
+        self.assertEqual(environ["HTTP_AUTHORIZATION"], "Bearer token")
+
+    def test_requests_are_served_concurrently(self):
+        threads = set()
+
+        def slow_app(environ, start_response):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.2)
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"slow"]
+
+        application = AsgiApp(slow_app, threads=4)
+
+        async def serve_all():
+            await asyncio.gather(
+                *[_request(application, "GET", "/api/places/list") for _ in range(4)]
+            )
+
+        start = time.monotonic()
+        asyncio.run(serve_all())
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(len(threads), 4)
+
+    def test_lifespan(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(self.application({"type": "lifespan"}, receive, send))
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.wsgi_app.assert_not_called()
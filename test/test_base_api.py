@@ -1,4 +1,7 @@
 import unittest
+from unittest.mock import patch
+from setup import start_server
+from app.health import get_server_stats
 from test.mixins.flask_client_mixin import FlaskTestClientMixin
 
 
@@ -13,3 +16,16 @@ class TestBaseApi(unittest.TestCase, FlaskTestClientMixin):
     def test_health(self):
         response = self.client.get(f"{self.base_url}/health")
         assert response.status_code == 200
+
+    def test_stats_requires_authentication(self):
+        response = self.client.get(f"{self.base_url}/health/stats")
+        assert response.status_code == 401
+
+    @patch("app.health.poi_catalog")
+    def test_stats(self, catalog_mock):
+        catalog_mock().stats.return_value = {"size": 3}
+        with start_server("TestFlaskApp").app.app_context():
+            stats = get_server_stats().get_json()
+        assert stats["poi_catalog"] == {"size": 3}
+        assert "hits" in stats["user_cache"]
+        assert "written" in stats["event_writer"]
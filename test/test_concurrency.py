@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from app.base_api_error import UpstreamTimeoutError
+from app import concurrency
+from app.concurrency import run_concurrently
+from app.locations.errors import POINotFoundError
+
+
+class TestRunConcurrently(unittest.TestCase):
+    def test_results_in_order(self):
+        self.assertEqual(
+            run_concurrently(lambda: 1, lambda: 2, lambda: 3),
+            [1, 2, 3],
+        )
+
+    def test_runs_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+        # Would raise BrokenBarrierError if the calls ran one after another
+        results = run_concurrently(barrier.wait, barrier.wait, barrier.wait, timeout=5)
+        self.assertEqual(sorted(results), [0, 1, 2])
+
+    def test_first_error_in_argument_order(self):
+        def not_found():
+            time.sleep(0.05)
+            raise POINotFoundError("missing")
+
+        def value_error():
+            raise ValueError("bad")
+
+        with self.assertRaises(POINotFoundError):
+            run_concurrently(not_found, value_error)
+
+    def test_timeout(self):
+        with self.assertRaises(UpstreamTimeoutError) as context:
+            run_concurrently(lambda: time.sleep(1), lambda: 1, timeout=0.05)
+        self.assertEqual(context.exception.error_code, 504)
+
+    def test_timeout_is_a_single_deadline(self):
+        # Each call finishes less than the timeout after the previous one
+        calls = [lambda i=i: time.sleep(0.1 * i) for i in range(1, 5)]
+        start = time.monotonic()
+        with self.assertRaises(UpstreamTimeoutError):
+            run_concurrently(*calls, timeout=0.15)
+        self.assertLess(time.monotonic() - start, 0.35)
+
+    def test_running_calls_are_accounted_for_after_a_timeout(self):
+        release = threading.Event()
+        before = concurrency.stats()
+        with self.assertRaises(UpstreamTimeoutError):
+            run_concurrently(release.wait, release.wait, timeout=0.05)
+        stats = concurrency.stats()
+        self.assertEqual(stats["timeouts"], before["timeouts"] + 1)
+        self.assertEqual(stats["abandoned"], before["abandoned"] + 2)
+        self.assertEqual(stats["abandoned_running"], before["abandoned_running"] + 2)
+
+        release.set()
+        for _ in range(100):
+            if concurrency.stats()["abandoned_running"] == before["abandoned_running"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(
+            concurrency.stats()["abandoned_running"], before["abandoned_running"]
+        )
+
+    def test_nested_calls_run_inline(self):
+        def nested():
+            return run_concurrently(lambda: "a", lambda: "b")
+
+        self.assertEqual(run_concurrently(nested, nested), [["a", "b"], ["a", "b"]])
@@ -0,0 +1,20 @@
+import unittest
+
+from app.base_api_error import InvalidCursorError
+from app.cursor import encode_cursor, decode_cursor
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor("distance", [12.5, "tim_hortons_musc"])
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor, "distance"), [12.5, "tim_hortons_musc"])
+
+    def test_invalid_cursor(self):
+        cursor = encode_cursor("distance", [12.5, "tim_hortons_musc"])
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor(cursor, "estimate")
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor("not a cursor", "distance")
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor(encode_cursor("", []), "distance")
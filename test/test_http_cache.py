@@ -0,0 +1,77 @@
+import unittest
+
+from flask import Flask, jsonify, request
+
+from app.http_cache import with_conditional_get
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        self.version = "1"
+        self.calls = 0
+        app = Flask("TestConditionalGet")
+
+        @app.route("/resource")
+        @with_conditional_get(lambda: 120, lambda: self.version)
+        def resource():
+            self.calls += 1
+            cursor = request.args.get("next")
+            return (
+                jsonify({"version": self.version, "query": request.args}),
+                200,
+                {"X-Next-Cursor": cursor} if cursor else {},
+            )
+
+        @app.route("/missing")
+        @with_conditional_get(lambda: 120, lambda: self.version)
+        def missing():
+            return jsonify({"error": "missing"}), 404
+
+        self.client = app.test_client()
+
+    def test_etag_and_cache_control(self):
+        response = self.client.get("/resource?latitude=1")
+        self.assertEqual(response.status_code, 200)
+        etag, weak = response.get_etag()
+        self.assertTrue(weak)
+        self.assertEqual(response.cache_control.max_age, 120)
+        self.assertTrue(response.cache_control.private)
+
+        # The ETag depends on the revision and the URL
+        self.assertEqual(self.client.get("/resource?latitude=1").get_etag()[0], etag)
+        other_etag, _ = self.client.get("/resource?latitude=2").get_etag()
+        self.assertNotEqual(etag, other_etag)
+
+    def test_not_modified(self):
+        etag = self.client.get("/resource").headers["ETag"]
+        response = self.client.get("/resource", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.cache_control.max_age, 120)
+        self.assertEqual(response.data, b"")
+        # The endpoint does not run for a 304
+        self.assertEqual(self.calls, 1)
+
+    def test_not_modified_keeps_the_next_cursor(self):
+        response = self.client.get("/resource?next=abc")
+        self.assertEqual(response.headers["X-Next-Cursor"], "abc")
+        response = self.client.get(
+            "/resource?next=abc", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["X-Next-Cursor"], "abc")
+        self.assertEqual(self.calls, 1)
+
+    def test_modified(self):
+        etag = self.client.get("/resource").headers["ETag"]
+        self.version = "2"
+        response = self.client.get("/resource", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.calls, 2)
+
+    def test_errors_are_not_cached(self):
+        response = self.client.get("/missing")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
+        self.assertIsNone(response.cache_control.max_age)
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from google.cloud.firestore import Increment
+
+from app.sharded_counter import CounterCache, ShardedCounter
+from app.unit_of_work import unit_of_work
+
+
+def _shard(data):
+    shard = MagicMock()
+    shard.to_dict.return_value = data
+    return shard
+
+
+class TestShardedCounter(unittest.TestCase):
+    def setUp(self):
+        self.cache = CounterCache()
+        self.patcher = patch(
+            "app.sharded_counter.counter_cache", return_value=self.cache
+        )
+        self.patcher.start()
+        self.counter_ref = MagicMock()
+        self.counter_ref.path = "current_estimate/centro/submission_stats/hour"
+        self.counter = ShardedCounter(self.counter_ref, num_shards=4)
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_increment_random_shard(self):
+        with patch("app.sharded_counter.random.randrange", return_value=2):
+            self.counter.increment({"count": 1, "sum": 9})
+        self.counter_ref.collection().document.assert_called_with("2")
+        self.counter_ref.collection().document().set.assert_called_once_with(
+            {"count": Increment(1), "sum": Increment(9)}, merge=True
+        )
+
+    def test_totals_are_summed_and_cached(self):
+        self.counter_ref.collection().stream.return_value = [
+            _shard({"count": 2, "sum": 12}),
+            _shard({"count": 1, "sum": 9}),
+            _shard(None),
+        ]
+        self.assertDictEqual(self.counter.totals(), {"count": 3, "sum": 21})
+        self.counter.totals()
+        self.counter_ref.collection().stream.assert_called_once()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+        # Local increments are added to the cached totals once committed
+        self.counter.increment({"count": 1, "sum": 3})
+        self.assertDictEqual(self.counter.totals(), {"count": 4, "sum": 24})
+        self.counter.totals(fresh=True)
+        self.assertEqual(self.counter_ref.collection().stream.call_count, 2)
+
+    @patch("app.unit_of_work.firestore_db")
+    def test_increment_in_unit_of_work(self, firebase_mock):
+        self.counter_ref.collection().stream.return_value = [_shard({"count": 1})]
+        self.counter.totals()
+        with unit_of_work():
+            self.counter.increment({"count": 1})
+            self.assertDictEqual(self.counter.totals(), {"count": 1})
+        firebase_mock().batch().set.assert_called_once()
+        self.assertDictEqual(self.counter.totals(), {"count": 2})
+
+    def test_read_before_increment_is_not_cached(self):
+        version = self.cache.version(self.counter_ref.path)
+        self.counter.increment({"count": 1})
+        self.cache.put(self.counter_ref.path, {"count": 0}, version)
+        self.assertIsNone(self.cache.get(self.counter_ref.path))
+
+    def test_delete(self):
+        self.counter_ref.collection().stream.return_value = [_shard({"count": 1})]
+        self.counter.totals()
+        self.counter.delete()
+        self.assertEqual(self.counter_ref.collection().document().delete.call_count, 4)
+        self.assertIsNone(self.cache.get(self.counter_ref.path))
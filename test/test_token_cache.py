@@ -0,0 +1,57 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from app.auth import validate_token
+from app.token_cache import IdTokenCache
+
+
+def _claims(uid: str = "uid", expires_in: float = 3600):
+    return {"uid": uid, "exp": int(time.time() + expires_in)}
+
+
+class TestIdTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = IdTokenCache(max_size=2)
+
+    def test_hit_until_expiry(self):
+        self.cache.put("token", _claims())
+        self.assertEqual(self.cache.get("token")["uid"], "uid")
+        self.cache.put("expired", _claims(expires_in=-1))
+        self.assertIsNone(self.cache.get("expired"))
+        self.assertIsNone(self.cache.get("unknown"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put("a", _claims("a"))
+        self.cache.put("b", _claims("b"))
+        self.cache.get("a")
+        self.cache.put("c", _claims("c"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    @patch("app.token_cache._certificate_request")
+    def test_refresh_certificates(self, request_mock):
+        request_mock.return_value.return_value.status = 200
+        self.cache.refresh_certificates()
+        self.assertEqual(
+            request_mock.return_value.call_args[1]["headers"],
+            {"Cache-Control": "no-cache"},
+        )
+        request_mock.return_value.side_effect = Exception("unavailable")
+        self.cache.refresh_certificates()
+        stats = self.cache.stats()
+        self.assertEqual(
+            (stats["cert_refreshes"], stats["cert_refresh_failures"]), (1, 1)
+        )
+
+    @patch("app.auth.auth.verify_id_token")
+    def test_validate_token(self, verify_id_token_mock):
+        verify_id_token_mock.return_value = _claims()
+        with patch("app.auth.id_token_cache", return_value=self.cache):
+            self.assertEqual(validate_token("token")["uid"], "uid")
+            self.assertEqual(validate_token("token")["uid"], "uid")
+        verify_id_token_mock.assert_called_once_with("token")
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import patch, MagicMock, Mock
+
+from app.unit_of_work import (
+    unit_of_work,
+    with_unit_of_work,
+    set_document,
+    add_document,
+    delete_document,
+    after_commit,
+    on_failure,
+    MAX_BATCH_WRITES,
+)
+from app.events import service as event_service
+from app.user.user import User
+
+
+def _batch():
+    batch = MagicMock()
+    writes = []
+    batch.set.side_effect = lambda *args, **kwargs: writes.append(args)
+    batch.delete.side_effect = lambda *args: writes.append(args)
+    batch.__len__.side_effect = lambda: len(writes)
+    return batch
+
+
+@patch("app.unit_of_work.firestore_db")
+class TestUnitOfWork(unittest.TestCase):
+    def test_writes_without_unit_of_work(self, firebase_mock):
+        document_ref, collection_ref = Mock(), Mock()
+        set_document(document_ref, {"a": 1}, merge=True)
+        add_document(collection_ref, {"b": 2})
+        delete_document(document_ref)
+        document_ref.set.assert_called_once_with({"a": 1}, merge=True)
+        collection_ref.add.assert_called_once_with({"b": 2})
+        document_ref.delete.assert_called_once()
+        firebase_mock().batch.assert_not_called()
+
+    def test_writes_are_committed_once(self, firebase_mock):
+        batch = _batch()
+        firebase_mock().batch.return_value = batch
+        document_ref, collection_ref = Mock(), Mock()
+        with unit_of_work():
+            set_document(document_ref, {"a": 1}, merge=True)
+            add_document(collection_ref, {"b": 2})
+            delete_document(document_ref)
+            # Nested units of work join the enclosing one
+            with unit_of_work():
+                set_document(document_ref, {"c": 3})
+            batch.commit.assert_not_called()
+
+        document_ref.set.assert_not_called()
+        collection_ref.add.assert_not_called()
+        batch.set.assert_any_call(document_ref, {"a": 1}, merge=True)
+        batch.set.assert_any_call(collection_ref.document(), {"b": 2})
+        batch.delete.assert_called_once_with(document_ref)
+        batch.commit.assert_called_once()
+
+        # The unit of work is over, writes are sent immediately
+        set_document(document_ref, {"d": 4})
+        document_ref.set.assert_called_once_with({"d": 4}, merge=False)
+
+    def test_writes_are_discarded_on_error(self, firebase_mock):
+        batch = _batch()
+        firebase_mock().batch.return_value = batch
+
+        @with_unit_of_work
+        def endpoint():
+            set_document(Mock(), {"a": 1})
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            endpoint()
+        batch.commit.assert_not_called()
+
+    def test_on_failure(self, firebase_mock):
+        batch = _batch()
+        firebase_mock().batch.return_value = batch
+        committed, failed = Mock(), Mock()
+        with unit_of_work():
+            set_document(Mock(), {"a": 1})
+            after_commit(committed)
+            on_failure(failed)
+        committed.assert_called_once()
+        failed.assert_not_called()
+
+        # The block raises
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                with unit_of_work():
+                    on_failure(failed)
+                raise ValueError("failed")
+        failed.assert_called_once()
+
+        # The commit fails
+        batch.commit.side_effect = Exception("unavailable")
+        with self.assertRaises(Exception):
+            with unit_of_work():
+                set_document(Mock(), {"a": 1})
+                after_commit(committed)
+                on_failure(failed)
+        self.assertEqual(failed.call_count, 2)
+        committed.assert_called_once()
+
+        # Without a unit of work the writes are already sent
+        on_failure(failed)
+        self.assertEqual(failed.call_count, 2)
+
+    def test_empty_unit_of_work(self, firebase_mock):
+        batch = _batch()
+        firebase_mock().batch.return_value = batch
+        with unit_of_work():
+            pass
+        batch.commit.assert_not_called()
+
+    def test_batch_limit(self, firebase_mock):
+        firebase_mock().batch.return_value = _batch()
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                for _ in range(MAX_BATCH_WRITES + 1):
+                    set_document(Mock(), {})
+
+    @patch("app.rewards.ledger.firestore_db")
+    @patch("app.events.service.firestore_db")
+    def test_service_writes(
+        self, events_firebase_mock, ledger_firebase_mock, firebase_mock
+    ):
+        batch = _batch()
+        firebase_mock().batch.return_value = batch
+        ledger_firebase_mock().collection().document().get().exists = False
+        user = User("test@sample.ca", "XJFEKDG", 0)
+        with unit_of_work():
+            event_service.generate_referral_event(
+                user, User("other@sample.ca", "ABCDEF", 0), 25
+            )
+        events_firebase_mock().collection().add.assert_not_called()
+        # The two reward events and the ledger updates of both users
+        self.assertEqual(batch.set.call_count, 4)
+        batch.commit.assert_called_once()
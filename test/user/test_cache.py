@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from firebase_admin import auth
+from app.auth import with_auth_user
+from app.user.cache import UserCache, EvictionPolicy
+from app.user.service import update_user
+from app.user.user import User
+
+
+def _change(email: str, data=None, type_name: str = "MODIFIED"):
+    change = MagicMock()
+    change.type.name = type_name
+    change.document.id = email
+    change.document.to_dict.return_value = data
+    return change
+
+
+class TestUserCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = UserCache(max_size=2)
+        self.user = User("test@sample.ca", "ABCDEF", 25)
+
+    def _put(self, user: User):
+        self.cache.put(user, self.cache.version(user.email))
+
+    def test_get_returns_a_copy(self):
+        self._put(self.user)
+        cached = self.cache.get(self.user.email)
+        self.assertEqual(cached.reward_point_balance, 25)
+        cached.reward_point_balance += 200
+        self.assertEqual(self.cache.get(self.user.email).reward_point_balance, 25)
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_expiry(self):
+        self.cache.ttl_seconds = 0
+        self._put(self.user)
+        self.assertIsNone(self.cache.get(self.user.email))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_eviction_policies(self):
+        for eviction, evicted in (
+            (EvictionPolicy.LRU, "b@sample.ca"),
+            (EvictionPolicy.FIFO, "a@sample.ca"),
+        ):
+            cache = UserCache(max_size=2, eviction=eviction)
+            cache.put(User("a@sample.ca"), 0)
+            cache.put(User("b@sample.ca"), 0)
+            cache.get("a@sample.ca")
+            cache.put(User("c@sample.ca"), 0)
+            self.assertIsNone(cache.get(evicted))
+            self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_write_through(self):
+        self.cache.write(self.user.email, {**self.user.to_dict(), "updated_at": 0})
+        self.assertEqual(self.cache.get(self.user.email).reward_point_balance, 25)
+
+    def test_read_before_write_is_not_cached(self):
+        version = self.cache.version(self.user.email)
+        self.cache.write(self.user.email, User(self.user.email, "ABCDEF", 50).to_dict())
+        self.cache.put(self.user, version)
+        self.assertEqual(self.cache.get(self.user.email).reward_point_balance, 50)
+
+        version = self.cache.version(self.user.email)
+        self.cache.invalidate(self.user.email)
+        self.cache.put(self.user, version)
+        self.assertIsNone(self.cache.get(self.user.email))
+
+    def test_listener_invalidation(self):
+        self._put(self.user)
+        own_write = {**self.user.to_dict(), "updated_at": 0}
+        self.cache._on_snapshot([], [_change(self.user.email, own_write)], None)
+        self.assertIsNotNone(self.cache.get(self.user.email))
+
+        other_write = {**User(self.user.email, "ABCDEF", 0).to_dict(), "updated_at": 1}
+        self.cache._on_snapshot([], [_change(self.user.email, other_write)], None)
+        self.assertIsNone(self.cache.get(self.user.email))
+
+        self._put(self.user)
+        self.cache._on_snapshot(
+            [], [_change(self.user.email, type_name="REMOVED")], None
+        )
+        self.assertIsNone(self.cache.get(self.user.email))
+        self.assertEqual(self.cache.stats()["remote_invalidations"], 2)
+
+    def test_deleted_user_invalidation(self):
+        # A user deleted by another process, seen through its deletion job
+        self._put(self.user)
+        self.cache._on_deletions_snapshot(
+            [], [_change(self.user.email, {"stage": "events"}, "ADDED")], None
+        )
+        self.assertIsNone(self.cache.get(self.user.email))
+        self.assertEqual(self.cache.stats()["remote_invalidations"], 1)
+
+        # The checkpoints of the job do not drop the user cached again
+        self._put(self.user)
+        self.cache._on_deletions_snapshot(
+            [], [_change(self.user.email, {"stage": "location"})], None
+        )
+        self.assertIsNotNone(self.cache.get(self.user.email))
+
+    @patch("app.user.cache.firestore_db")
+    def test_listeners(self, firebase_mock):
+        self.cache.listener_window_seconds = 60
+        self.cache.start()
+        self.assertTrue(self.cache.is_listening())
+        users_watch = firebase_mock().collection().where().on_snapshot()
+        deletions_watch = firebase_mock().collection().on_snapshot()
+        self.cache.stop()
+        users_watch.unsubscribe.assert_called_once()
+        deletions_watch.unsubscribe.assert_called_once()
+        self.assertFalse(self.cache.is_listening())
+
+    @patch("app.user.service.users_collection")
+    def test_update_user_writes_through(self, user_collection_mock):
+        with patch("app.user.service.user_cache", return_value=self.cache):
+            update_user(User(self.user.email, "ABCDEF", 100))
+        data = user_collection_mock().document().set.call_args[0][0]
+        self.assertIn("updated_at", data)
+        self.assertEqual(self.cache.get(self.user.email).reward_point_balance, 100)
+
+
+@patch("app.auth.find_user")
+@patch("app.auth.auth.get_user")
+class TestAuthUser(unittest.TestCase):
+    def setUp(self):
+        self.cache = UserCache()
+        self.patcher = patch("app.auth.user_cache", return_value=self.cache)
+        self.patcher.start()
+
+        @with_auth_user
+        def endpoint(user: User, **kwargs):
+            return user.email, 200
+
+        self.endpoint = endpoint
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_email_from_firebase_auth(self, get_user_mock, find_user_mock):
+        get_user_mock.return_value.email = "test@sample.ca"
+        find_user_mock.return_value = User("test@sample.ca")
+        token_info = {"uid": "uid", "email": "test@sample.ca"}
+        for _ in range(2):
+            self.assertEqual(
+                self.endpoint(token_info=token_info), ("test@sample.ca", 200)
+            )
+        # Firebase Auth is checked once within the TTL, even with an email claim
+        get_user_mock.assert_called_once_with("uid")
+        find_user_mock.assert_called_with("test@sample.ca")
+
+    def test_firebase_auth_user_is_checked_again(self, get_user_mock, find_user_mock):
+        self.cache.ttl_seconds = 0
+        get_user_mock.return_value.email = "test@sample.ca"
+        find_user_mock.return_value = User("test@sample.ca")
+        token_info = {"uid": "uid", "email": "test@sample.ca"}
+        self.assertEqual(self.endpoint(token_info=token_info), ("test@sample.ca", 200))
+
+        get_user_mock.side_effect = auth.UserNotFoundError("deleted")
+        _, status = self.endpoint(token_info=token_info)
+        self.assertEqual(status, 404)
+        self.assertEqual(get_user_mock.call_count, 2)
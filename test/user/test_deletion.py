@@ -0,0 +1,111 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from app.events.event import EventType
+from app.user.deletion import (
+    AccountDeletionWorker,
+    DeletionJob,
+    schedule_account_deletion,
+)
+
+REQUESTED_AT = datetime(2023, 3, 5, 18, 25, tzinfo=timezone.utc)
+
+
+def _doc(id: str, data=None):
+    doc = MagicMock()
+    doc.id = id
+    doc.reference = f"ref:{id}"
+    doc.exists = data is not None
+    doc.to_dict.return_value = data
+    return doc
+
+
+@patch("app.user.deletion.firestore_db")
+class TestAccountDeletion(unittest.TestCase):
+    """Test the cascading deletion of the data of deleted accounts"""
+
+    email = "test@sample.ca"
+
+    def setUp(self):
+        self.worker = AccountDeletionWorker(parallel_batches=2)
+
+    def _job(self, **kwargs) -> DeletionJob:
+        return DeletionJob(self.email, ["aid"], REQUESTED_AT, **kwargs)
+
+    def _with_job(self, firebase_mock, job: DeletionJob):
+        firebase_mock().collection().document().get.return_value = _doc(
+            self.email, job.to_dict()
+        )
+
+    def test_schedule_runs_job_when_worker_is_stopped(self, firebase_mock):
+        with patch("app.user.deletion.account_deletion_worker") as worker_mock:
+            schedule_account_deletion(self.email, "aid")
+        (job,) = firebase_mock().collection().document().set.call_args[0]
+        self.assertEqual((job["aids"], job["stage"]), (["aid"], "events"))
+        worker_mock().submit.assert_called_once_with(self.email)
+
+    @patch("app.user.deletion.MAX_BATCH_WRITES", 2)
+    def test_run_job(self, firebase_mock):
+        self._with_job(firebase_mock, self._job())
+        query = firebase_mock().collection().where().order_by().select()
+        events = [
+            _doc(
+                "a", {"type": EventType.ACCOUNT_SIGNUP.value, "created": REQUESTED_AT}
+            ),
+            _doc("b", {"type": EventType.ACCOUNT_DELETION.value}),
+            _doc("c", {"type": EventType.REWARD_POINTS_ADD.value}),
+            _doc(
+                "d",
+                {
+                    "type": EventType.ACCOUNT_SIGNUP.value,
+                    "created": REQUESTED_AT + timedelta(minutes=1),
+                },
+            ),
+        ]
+        proposals = [_doc("p", {"submission_time": REQUESTED_AT})]
+        # First page of each stage, then the page after its last document
+        query.limit().stream.side_effect = [events, proposals]
+        query.start_after().limit().stream.side_effect = [[], []]
+
+        self.assertTrue(self.worker.run_job(self.email))
+        deleted = [
+            delete_call[0][0]
+            for delete_call in firebase_mock().batch().delete.call_args_list
+        ]
+        # The account deletion event and the events of a later account are kept
+        self.assertCountEqual(deleted[:3], ["ref:a", "ref:c", "ref:p"])
+        self.assertEqual(len(deleted), 4)  # And the location document
+        self.assertEqual(firebase_mock().batch().commit.call_count, 3)
+        query.limit.assert_called_with(4)
+        firebase_mock().collection().document().delete.assert_called_once()
+        self.assertEqual(self.worker.stats()["jobs_completed"], 1)
+
+        checkpoint = firebase_mock().collection().document().set.call_args_list[0]
+        self.assertEqual(checkpoint[0][0]["after"], "d")
+        self.assertEqual(checkpoint[0][0]["deleted"], {"events": 2})
+
+    def test_resume_from_checkpoint(self, firebase_mock):
+        self._with_job(firebase_mock, self._job(stage="POI_proposal", after="p"))
+        query = firebase_mock().collection().where().order_by().select()
+        query.start_after().limit().stream.return_value = []
+
+        self.assertTrue(self.worker.run_job(self.email))
+        query.start_after.assert_called_with({"__name__": "p"})
+        firebase_mock().collection().where.assert_called_with(
+            "submitted_by", "==", self.email
+        )
+        firebase_mock().batch().delete.assert_called_once()
+
+    def test_stopped_job_is_kept(self, firebase_mock):
+        self._with_job(firebase_mock, self._job())
+        self.worker._stopping.set()
+        self.assertFalse(self.worker.run_job(self.email))
+        firebase_mock().collection().document().delete.assert_not_called()
+
+    def test_start_resumes_pending_jobs(self, firebase_mock):
+        firebase_mock().collection().select().stream.return_value = [_doc(self.email)]
+        firebase_mock().collection().document().get.return_value = _doc(self.email)
+        self.worker.start()
+        self.worker.stop()
+        self.assertFalse(self.worker.is_running())
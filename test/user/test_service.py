@@ -1,9 +1,20 @@
 import unittest
 from unittest.mock import patch, MagicMock
 
+from google.cloud.firestore import Increment
+
 from app.user.user import User
+from app.user.cache import user_cache
 from app.user.errors import UserNotFoundError
-from app.user.service import find_user, delete_user, update_user, create_user
+from app.sharded_counter import counter_cache
+from app.unit_of_work import unit_of_work
+from app.user.service import (
+    find_user,
+    find_user_by_referral_code,
+    delete_user,
+    update_user,
+    create_user,
+)
 
 
 @patch("app.user.service.users_collection")
@@ -33,6 +44,10 @@ class TestUserService(unittest.TestCase):
             hasUsedReferralCode=False,
         )
 
+    def setUp(self):
+        user_cache().clear()
+        counter_cache().clear()
+
     def test_find_user(self, user_collection_mock):
         user_collection_mock().document().get().to_dict = MagicMock(
             return_value=self.sample_user_dict
@@ -41,13 +56,22 @@ class TestUserService(unittest.TestCase):
         user_collection_mock().document().get().exists = False
         self.assertRaises(UserNotFoundError, find_user, "test@nonexistent.com")
 
+    @patch("app.user.service.schedule_account_deletion")
     @patch("app.user.service.generate_account_delete_event")
+    @patch("app.user.service.delete_ledger")
     @patch("app.user.service.delete_referral_code")
     def test_delete_user(
-        self, generate_account_delete_event, delete_referral_code, user_collection_mock
+        self,
+        delete_referral_code,
+        delete_ledger,
+        generate_account_delete_event,
+        schedule_account_deletion,
+        user_collection_mock,
     ):
-        delete_user(self.sample_user)
+        delete_user(self.sample_user, "aid")
         user_collection_mock().document().delete.assert_called_once()
+        delete_ledger.assert_called_once_with(self.sample_user.email)
+        schedule_account_deletion.assert_called_once_with(self.sample_user.email, "aid")
         user_collection_mock().document().get().exists = False
         self.assertRaises(
             UserNotFoundError,
@@ -56,21 +80,80 @@ class TestUserService(unittest.TestCase):
         )
 
     @patch("app.user.service.generate_account_signup_event")
+    @patch("app.user.service.create_ledger")
     @patch("app.user.service.create_unique_referral_code")
     @patch("app.user.service.save_referral_code")
     def test_create_user(
         self,
-        generate_account_signup_event,
-        create_unique_referral_code,
         save_referral_code,
+        create_unique_referral_code,
+        create_ledger,
+        generate_account_signup_event,
         user_collection_mock,
     ):
         user_collection_mock().document().get().exists = False
         create_unique_referral_code.return_value = "ABCDEF"
         new_user = create_user("test@test.com")
         self.assertEqual(new_user.referral_code, "ABCDEF")
+        save_referral_code.assert_called_once_with("ABCDEF", "test@test.com")
         user_collection_mock().document().set.assert_called_once()
+        create_ledger.assert_called_once_with("test@test.com")
+
+    @patch("app.user.service.release_referral_code")
+    @patch("app.user.service.generate_account_signup_event")
+    @patch("app.user.service.create_ledger")
+    @patch("app.user.service.create_unique_referral_code")
+    @patch("app.user.service.save_referral_code")
+    def test_create_user_failure_releases_code(
+        self,
+        save_referral_code,
+        create_unique_referral_code,
+        create_ledger,
+        generate_account_signup_event,
+        release_referral_code,
+        user_collection_mock,
+    ):
+        user_collection_mock().document().get().exists = False
+        create_unique_referral_code.return_value = "ABCDEF"
+        create_ledger.side_effect = Exception("unavailable")
+        with self.assertRaises(Exception):
+            create_user("test@test.com")
+        release_referral_code.assert_called_once_with("ABCDEF")
+
+        # The unit of work of the signup fails to commit
+        release_referral_code.reset_mock()
+        create_ledger.side_effect = None
+        with patch("app.unit_of_work.firestore_db") as firebase_mock:
+            firebase_mock().batch().__len__.return_value = 1
+            firebase_mock().batch().commit.side_effect = Exception("unavailable")
+            with self.assertRaises(Exception):
+                with unit_of_work():
+                    create_user("test@test.com")
+                    release_referral_code.assert_not_called()
+        release_referral_code.assert_called_once_with("ABCDEF")
+
+    @patch("app.user.service.find_referral_code_owner")
+    def test_find_user_by_referral_code(self, find_owner, user_collection_mock):
+        user_collection_mock().document().get().to_dict = MagicMock(
+            return_value=self.sample_user_dict
+        )
+        find_owner.return_value = "test@test.com"
+        self.assertEqual(find_user_by_referral_code("ABCDEF"), self.sample_user)
+        user_collection_mock().where.assert_not_called()
+        find_owner.return_value = None
+        self.assertRaises(UserNotFoundError, find_user_by_referral_code, "NOTFND")
 
     def test_update_user(self, user_collection_mock):
         update_user(self.sample_user)
         user_collection_mock().document().set.assert_called_once()
+
+    def test_update_user_sends_changes(self, user_collection_mock):
+        user = User.from_dict("test@test.com", self.sample_user_dict)
+        update_user(user)
+        user_collection_mock().document().set.assert_not_called()
+
+        user.reward_point_balance += 25
+        update_user(user)
+        (data,) = user_collection_mock().document().set.call_args[0]
+        self.assertEqual(data["reward_point_balance"], Increment(25))
+        self.assertEqual(set(data), {"reward_point_balance", "updated_at"})
@@ -1,5 +1,7 @@
 import unittest
 
+from google.cloud.firestore import DELETE_FIELD, Increment
+
 from app.user.user import User
 
 
@@ -33,3 +35,35 @@ class TestUser(unittest.TestCase):
             self.sample_user.to_json(),
             User.from_dict("test@test.com", self.sample_user_dict).to_json(),
         )
+
+    def test_new_user_changes(self):
+        self.assertEqual(
+            User("test@test.com").changes(),
+            {"email": "test@test.com", **self.sample_user_dict},
+        )
+
+    def test_changes(self):
+        user = User.from_dict(
+            "test@test.com",
+            {**self.sample_user_dict, "poi_frequency": {"a": 1, "b": 2, "c": 3}},
+        )
+        self.assertEqual(user.changes(), {})
+
+        user.reward_point_balance += 25
+        user.notification_setting = True
+        user.poi_frequency = {"a": 2, "b": 2, "d": 1}
+        self.assertEqual(
+            user.changes(),
+            {
+                "reward_point_balance": Increment(25),
+                "notification_setting": True,
+                "poi_frequency": {
+                    "a": Increment(1),
+                    "c": DELETE_FIELD,
+                    "d": Increment(1),
+                },
+            },
+        )
+
+        user.mark_saved()
+        self.assertEqual(user.changes(), {})
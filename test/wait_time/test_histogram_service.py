@@ -7,7 +7,8 @@ from app.locations.service import (
     histogram_collection,
     histogram_for_POI,
     generate_histogram_for_POI,
-    fetch_latest_estimated_value,
+    _hourly_estimates,
+    _apply_peak_adjustment,
 )
 
 centro_base = {"poi_name": "centro", "class": "occupancy"}
@@ -116,26 +117,33 @@ class TestWaitTimeComputation(unittest.TestCase, FirebaseTestMixin):
             self.sample_generate_histogram_for_POI_occupancy,
         )
 
-    def test_fetch_latest_estimated_value_queue(self):
+    def _estimate(self, poi_id: str, classification: str, current_minute: int):
+        return _apply_peak_adjustment(
+            _hourly_estimates([poi_id], "Sunday", 1)[poi_id],
+            classification,
+            current_minute,
+        )
+
+    def test_estimate_queue(self):
         self.assertEqual(
-            fetch_latest_estimated_value(self.poi_id, "queue", "Sunday", 1, 10),
+            self._estimate(self.poi_id, "queue", 10),
             self.sample_wait_time_estimate,
         )
 
-    def test_fetch_latest_estimated_value_peak_queur(self):
+    def test_estimate_peak_queue(self):
         self.assertEqual(
-            fetch_latest_estimated_value(self.poi_id, "queue", "Sunday", 1, 25),
+            self._estimate(self.poi_id, "queue", 25),
             self.sample_wait_time_estimate_peak,
         )
 
-    def test_fetch_latest_estimated_value_occupancy(self):
+    def test_estimate_occupancy(self):
         self.assertEqual(
-            fetch_latest_estimated_value(self.poi_id_occ, "occupancy", "Sunday", 1, 10),
+            self._estimate(self.poi_id_occ, "occupancy", 10),
             self.sample_wait_time_estimate_occ,
         )
 
-    def test_fetch_latest_estimated_value_peak_occupancy(self):
+    def test_estimate_peak_occupancy(self):
         self.assertEqual(
-            fetch_latest_estimated_value(self.poi_id_occ, "occupancy", "Sunday", 1, 25),
+            self._estimate(self.poi_id_occ, "occupancy", 25),
             self.sample_wait_time_estimate_peak_occ,
         )
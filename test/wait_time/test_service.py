@@ -48,13 +48,19 @@ class TestWaitTimeService(unittest.TestCase):
         wait_time_service.update_location(self.test_location)
         mock_location_collection().document().set.assert_called_once()
 
+    @patch("app.wait_time.service.record_wait_time_submission")
     @patch("app.wait_time.service.generate_waittime_submit_event")
     @patch("app.wait_time.service.get_details_for_POI")
     def test_add_wait_time_suggestion(
-        self, mock_get_poi_func, mock_waittime_submit_func, mock_location_collection
+        self,
+        mock_get_poi_func,
+        mock_waittime_submit_func,
+        mock_record_submission_func,
+        mock_location_collection,
     ):
         mock_get_poi_func.return_value = self.sample_poi
         wait_time_service.add_wait_time_suggestion(
             self.test_user, "tim_hortons_musc", 5
         )
         mock_waittime_submit_func.assert_called_once()
+        mock_record_submission_func.assert_called_once_with("tim_hortons_musc", 5)